@@ -23,6 +23,8 @@ def get_args():
     parser = argparse.ArgumentParser(description="")
     parser.add_argument("-d", "--debug", action="store_true")
     parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("-w", "--workers", default=1, type=int)
+    parser.add_argument("-ss", "--shard_size", default=100, type=int)
     return parser.parse_args()
 
 
@@ -64,59 +66,30 @@ def main():
 
     manual = json.load(open("{}/{}".format(DIR, EXTR_MANUAL)))
     extr = json.load(open("{}/{}".format(DIR, EXTR_BEFORE)))
-    total, skipped = 0, 0
-    extractions = {}
-
-    for key in manual:
-        for case in manual[key]:
-            total += 1
-            sentence = case["sent"]
-            sen_idx = case["id"]
-            skip = False
-
-            # text parsing for new sentence
-            text_to_graph = hitl.extractor.get_graphs(sentence, doc_id=str(sen_idx))
-            if len(text_to_graph) > 1:
-                logging.error(f"sentence split into two")
-                logging.error(f"{sen_idx=}, {text_to_graph=}")
-                logging.error("skipping")
-                skipped += 1
-                skip = True
-                logging.error(f"{skipped=}, {total=}")
-
-            logging.debug(f"{sentence=}, {text_to_graph=}")
-
-            # generating triplets after conjunction decomposition (information_extraction)
-            if not skip:
-                try:
-                    # rare problems with sentence modifications need this check
-                    graph = text_to_graph[sentence]["main_edge"]
-                except KeyError:
-                    logging.error(f"sentence not found after parsing")
-                    logging.error(f"{sen_idx=}, {sentence=}")
-                    logging.error("skipping")
-                    skipped += 1
-                    logging.error(f"{skipped=}, {total=}")
-                else:
-                    atom2word = text_to_graph[sentence]["atom2word"]
-                    logging.info("-" * 100)
-                    logging.info(f"START of information extraction for {sen_idx=}:")
-                    logging.info(f"{sen_idx=}, {sentence=}")
-                    logging.info(f"{graph=}")
-                    information_extraction(
-                        extractions,
-                        graph,
-                        sen_idx,
-                        atom2word,
-                        hitl.extractor.patterns,
-                        max_extr=3,
-                    )
+    sentences = (
+        (case["id"], case["sent"], None) for key in manual for case in manual[key]
+    )
+    results = hitl.extractor.extract_sentences(
+        sentences,
+        max_extr=3,
+        n_workers=args.workers,
+        shard_size=args.shard_size,
+        extract_fn=information_extraction,
+    )
 
     # take biggest set of overlapping matches per sentence and
-    # add predictions to the results of the other OIE systems
-    for k, v in extractions.items():
-        newv = combine_triplets(v)
-        extr[k].append(newv[0])
+    # add predictions to the results of the other OIE systems,
+    # in the order of the sentences whatever the number of workers
+    total, skipped = 0, 0
+    for sen_idx, sentence, _, extractions, _ in results:
+        total += 1
+        if extractions is None:
+            skipped += 1
+            logging.error(f"{skipped=}, {total=}")
+            continue
+        for k, v in extractions.items():
+            newv = combine_triplets(v)
+            extr[k].append(newv[0])
 
     # save predictions to json file
     with open("{}/{}".format(DIR, EXTR_AFTER), "w", encoding="utf-8") as f:
@@ -0,0 +1,308 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import networkx as nx
+import numpy as np
+from stanza.models.common.doc import Sentence
+from tuw_nlp.graph.ud_graph import UDGraph
+
+# column layout of CompactUDGraph.data
+TOKEN, LEMMA, ASCII, UPOS, DEPREL, HEAD, START, END = range(8)
+N_COLUMNS = 8
+
+# columns holding ids of VOCAB
+STRING_COLUMNS = [TOKEN, LEMMA, ASCII, UPOS, DEPREL]
+
+# node id of the artificial root node in UDGraph
+ROOT_ID = -1
+
+# head value of nodes that have no incoming edge
+NO_HEAD = -2
+
+# number of networkx-backed UDGraphs kept around for legacy code paths
+MAX_MATERIALIZED = 64
+
+
+class Vocab:
+    """A class to intern strings as integer ids.
+
+    Id -1 is reserved for None.
+    """
+
+    def __init__(self):
+        self.str_to_id = {}
+        self.id_to_str = []
+
+    def __len__(self):
+        return len(self.id_to_str)
+
+    def get_id(self, string: Optional[str]) -> int:
+        if string is None:
+            return -1
+        i = self.str_to_id.get(string)
+        if i is None:
+            i = len(self.id_to_str)
+            self.str_to_id[string] = i
+            self.id_to_str.append(string)
+        return i
+
+    def get_str(self, i: int) -> Optional[str]:
+        return None if i < 0 else self.id_to_str[i]
+
+    def get_strs(self, ids) -> List[Optional[str]]:
+        return [self.get_str(i) for i in ids.tolist()]
+
+
+# shared by all compact graphs, so every distinct string is stored once
+VOCAB = Vocab()
+
+_materialized = OrderedDict()
+
+
+class CompactUDGraph:
+    """A class to store a UD-parsed sentence as a single numpy array.
+
+    Each row of `data` is a word of the sentence, node i of the corresponding
+    UDGraph. Columns hold the interned surface form, lemma, ascii name, upos
+    and incoming deprel of the word, the node id of its head (ROOT_ID for
+    the root of the sentence) and its character offsets in the text.
+    The networkx-backed UDGraph is only built when a legacy code path asks for
+    it (e.g. for pattern matching or subgraphs), and only the most recently
+    used ones are kept around.
+
+    Slim graphs do not keep the stanza Sentence of the parse. For legacy code
+    that needs one, `stanza_sen` returns a minimal Sentence rebuilt from the
+    array, without xpos, feats and misc fields.
+
+    Pickled graphs carry the strings they use, so that they can be unpickled in
+    processes with a different VOCAB (e.g. spawned worker processes).
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        text: Optional[str] = None,
+        stanza_sen: Optional[Any] = None,
+    ):
+        self.data = data
+        self.text = text
+        self._stanza_sen = stanza_sen
+
+    @staticmethod
+    def from_ud_graph(graph: UDGraph, slim: bool = False):
+        """
+        Build a compact graph from a networkx-backed UDGraph.
+
+        Args:
+            graph (UDGraph): the graph to convert
+            slim (bool): whether to release the stanza Sentence of the parse
+
+        Returns:
+            CompactUDGraph: the compact graph
+        """
+        n = len(graph.tokens)
+        data = np.full((n, N_COLUMNS), -1, dtype=np.int32)
+        data[:, HEAD] = NO_HEAD
+        for i, tok in enumerate(graph.tokens):
+            data[i, TOKEN] = VOCAB.get_id(tok)
+
+        for node, attrs in graph.G.nodes(data=True):
+            if node == ROOT_ID:
+                continue
+            data[node, LEMMA] = VOCAB.get_id(attrs.get("name"))
+            data[node, ASCII] = VOCAB.get_id(attrs.get("asciiname"))
+            data[node, UPOS] = VOCAB.get_id(attrs.get("upos"))
+
+        for head, dep, attrs in graph.G.edges(data=True):
+            data[dep, HEAD] = head
+            data[dep, DEPREL] = VOCAB.get_id(attrs.get("color"))
+
+        if graph.stanza_sen is not None:
+            words = [w for w in graph.stanza_sen.words if w.id - 1 < n]
+            for word in words:
+                if word.start_char is not None:
+                    data[word.id - 1, START] = word.start_char
+                    data[word.id - 1, END] = word.end_char
+
+        stanza_sen = None if slim else graph.stanza_sen
+        return CompactUDGraph(data, text=graph.text, stanza_sen=stanza_sen)
+
+    @staticmethod
+    def from_json(data: Dict[str, Any], slim: bool = False):
+        return CompactUDGraph.from_ud_graph(UDGraph.from_json(data), slim=slim)
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Serialize in the same format as UDGraph.to_json, so that saved
+        extractors can be loaded as either representation.
+        """
+        return {
+            "graph": nx.adjacency_data(self.to_networkx()),
+            "text": self.text,
+            "tokens": self.tokens,
+            "stanza_sen": (
+                self._stanza_sen.to_dict()
+                if self._stanza_sen is not None
+                else self._word_dicts()
+            ),
+        }
+
+    def _word_dicts(self) -> List[Dict[str, Any]]:
+        words = []
+        for i, row in enumerate(self.data.tolist()):
+            color = VOCAB.get_str(row[DEPREL])
+            word = {
+                "id": i + 1,
+                "text": VOCAB.get_str(row[TOKEN]),
+                "lemma": VOCAB.get_str(row[LEMMA]),
+                "upos": VOCAB.get_str(row[UPOS]),
+                "head": 0 if row[HEAD] == ROOT_ID else row[HEAD] + 1,
+                # inverse of tuw_nlp's preprocess_edge_alto
+                "deprel": color.lower().replace("_", ":") if color else None,
+            }
+            if row[START] >= 0:
+                word["start_char"], word["end_char"] = row[START], row[END]
+            words.append(word)
+
+        return words
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        ids = self.data[:, STRING_COLUMNS]
+        used = np.unique(ids[ids >= 0])
+        data = self.data.copy()
+        # ids of the graph's own list of strings
+        data[:, STRING_COLUMNS] = np.where(ids >= 0, np.searchsorted(used, ids), -1)
+        state["data"] = data
+        state["strings"] = [VOCAB.get_str(i) for i in used.tolist()]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        state = dict(state)
+        strings = state.pop("strings")
+        # the last entry maps -1 (None) to itself
+        to_vocab = np.array([VOCAB.get_id(s) for s in strings] + [-1], dtype=np.int32)
+        data = state["data"]
+        data[:, STRING_COLUMNS] = to_vocab[data[:, STRING_COLUMNS]]
+        self.__dict__.update(state)
+
+    @property
+    def slim(self) -> bool:
+        return self._stanza_sen is None
+
+    @property
+    def stanza_sen(self) -> Sentence:
+        if self._stanza_sen is not None:
+            return self._stanza_sen
+        return Sentence(self._word_dicts())
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"CompactUDGraph({self.text!r})"
+
+    @property
+    def tokens(self) -> List[str]:
+        return VOCAB.get_strs(self.data[:, TOKEN])
+
+    @property
+    def lemmas(self) -> List[str]:
+        return VOCAB.get_strs(self.data[:, LEMMA])
+
+    @property
+    def upos(self) -> List[str]:
+        return VOCAB.get_strs(self.data[:, UPOS])
+
+    @property
+    def deprels(self) -> List[str]:
+        return VOCAB.get_strs(self.data[:, DEPREL])
+
+    @property
+    def heads(self) -> np.ndarray:
+        return self.data[:, HEAD]
+
+    @property
+    def start_chars(self) -> List[Optional[int]]:
+        return [None if c < 0 else c for c in self.data[:, START].tolist()]
+
+    @property
+    def end_chars(self) -> List[Optional[int]]:
+        return [None if c < 0 else c for c in self.data[:, END].tolist()]
+
+    @property
+    def root(self) -> Optional[int]:
+        roots = np.flatnonzero(self.data[:, HEAD] == ROOT_ID)
+        return int(roots[0]) if len(roots) > 0 else None
+
+    def to_networkx(self) -> nx.DiGraph:
+        """
+        Build the networkx graph that UDGraph would hold for this sentence.
+        """
+        tokens = self.tokens
+        G = nx.DiGraph(tokens=tokens, text=self.text, type="ud")
+        rows = self.data.tolist()
+        for i, row in enumerate(rows):
+            attrs = {
+                "name": VOCAB.get_str(row[LEMMA]),
+                "token_id": i + 1,
+                "upos": VOCAB.get_str(row[UPOS]),
+            }
+            if row[ASCII] >= 0:
+                attrs["asciiname"] = VOCAB.get_str(row[ASCII])
+            G.add_node(i, **attrs)
+            if row[HEAD] == ROOT_ID and ROOT_ID not in G:
+                G.add_node(ROOT_ID, name="root", upos="ROOT")
+
+        for i, row in enumerate(rows):
+            if row[HEAD] != NO_HEAD:
+                G.add_edge(row[HEAD], i, color=VOCAB.get_str(row[DEPREL]))
+
+        return G
+
+    def to_ud_graph(self) -> UDGraph:
+        """
+        Get the networkx-backed UDGraph for this sentence, building it if it is
+        not among the most recently used ones.
+
+        Returns:
+            UDGraph: the legacy graph
+        """
+        graph = _materialized.get(self)
+        if graph is not None:
+            _materialized.move_to_end(self)
+            return graph
+
+        logging.debug(f"materializing UDGraph for {self.text=}")
+        graph = UDGraph.from_json(self.to_json())
+        _materialized[self] = graph
+        if len(_materialized) > MAX_MATERIALIZED:
+            _materialized.popitem(last=False)
+
+        return graph
+
+    @property
+    def G(self) -> nx.DiGraph:
+        return self.to_ud_graph().G
+
+    def subgraph(self, nodes, **kwargs) -> UDGraph:
+        return self.to_ud_graph().subgraph(nodes, **kwargs)
+
+    def nodes_by_lextop(self, *args, **kwargs):
+        return self.to_ud_graph().nodes_by_lextop(*args, **kwargs)
+
+    def to_dot(self, *args, **kwargs):
+        return self.to_ud_graph().to_dot(*args, **kwargs)
+
+    def to_penman(self, *args, **kwargs):
+        return self.to_ud_graph().to_penman(*args, **kwargs)
+
+
+def get_ud_graph(graph) -> UDGraph:
+    """
+    Return the networkx-backed UDGraph for either representation.
+    """
+    if isinstance(graph, CompactUDGraph):
+        return graph.to_ud_graph()
+    return graph
@@ -60,7 +60,6 @@ def load_and_map_fd(input_file, extractor, which_rel):
             continue
 
         sen, graph = text_to_graph[0]
-        stanza_sen = graph.stanza_sen
 
         if which_rel == "CAUSE" and not is_cause:
             # no triplets to add
@@ -73,8 +72,8 @@ def load_and_map_fd(input_file, extractor, which_rel):
 
         try:
             args = [
-                get_toks_from_txt(untokenize(food_entity), stanza_sen),
-                get_toks_from_txt(untokenize(disease_entity), stanza_sen),
+                get_toks_from_txt(untokenize(food_entity), graph),
+                get_toks_from_txt(untokenize(disease_entity), graph),
             ]
         except AnnotatedWordsNotFoundError:
             logging.warning(
@@ -1,6 +1,7 @@
 import logging
+from collections import defaultdict
 from functools import total_ordering
-from typing import List, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 
 from tuw_nlp.graph.graph import Graph
 from tuw_nlp.graph.ud_graph import UDGraph
@@ -121,6 +122,51 @@ class GraphMappedTriplet(Triplet):
         }
 
 
+class SentenceFeatures:
+    """A class to hold token-level features of a parsed sentence.
+
+    Computed once when the sentence is parsed, so that extractor helpers do not
+    have to rebuild them from the graph on every call. The lists are shared,
+    callers must not modify them.
+    """
+
+    def __init__(self, tokens: List[str], lemmas: Optional[List[str]] = None):
+        self.tokens = list(tokens)
+        self.lowered = [tok.lower() for tok in self.tokens]
+        self.lemmas = list(lemmas) if lemmas is not None else None
+        self.words_to_i = self._get_words_to_i(self.lowered)
+        self._key = tuple(self.tokens)
+        self._other_words_to_i = {}
+
+    @staticmethod
+    def _get_words_to_i(lowered: List[str]) -> Dict[str, Set[int]]:
+        words_to_i = defaultdict(set)
+        for i, word in enumerate(lowered):
+            words_to_i[word].add(i)
+        return dict(words_to_i)
+
+    def get_words_to_i(self, toks: List[str]) -> Dict[str, Set[int]]:
+        """
+        Return the mapping from lowercased words to token indices for a
+        tokenization of the sentence. Annotations (e.g. LSOIE) may come with
+        their own tokens, the mapping for these is cached as well.
+
+        Args:
+            toks (List[str]): the tokens of the sentence
+
+        Returns:
+            Dict[str, Set[int]]: the indices of each lowercased word
+        """
+        key = tuple(toks)
+        if key == self._key:
+            return self.words_to_i
+        if key not in self._other_words_to_i:
+            self._other_words_to_i[key] = self._get_words_to_i(
+                [tok.lower() for tok in key]
+            )
+        return self._other_words_to_i[key]
+
+
 def triplets_to_str(triplets: List[Triplet]) -> List[str]:
     """
     Returns human-readable versions of triplets for a sentence
@@ -0,0 +1,91 @@
+import os
+from typing import Any, Dict, Iterable
+
+from newpotato.timing import StageTimer
+
+
+def clear_caches():
+    """
+    Clear the in-process caches of pattern compilation, pattern operations and
+    triplet combination, so that the next run starts cold.
+    """
+    from newpotato.extractors import graphbrain_extractor_PC
+    from newpotato.modifications import pattern_compiler, pattern_ops
+
+    for module in (graphbrain_extractor_PC, pattern_compiler, pattern_ops):
+        for obj in vars(module).values():
+            if callable(getattr(obj, "cache_clear", None)):
+                obj.cache_clear()
+
+
+def benchmark_extraction(
+    extractor, input: str, max_extr: int, n_warm_runs: int = 0, **kwargs
+) -> Dict[str, Any]:
+    """
+    Benchmark GraphbrainExtractor.generate_triplets_and_gold_data on an LSOIE file.
+
+    The first run starts with empty caches (cold), the following n_warm_runs reuse
+    the caches and the compiled pattern cascade of the previous runs (warm). With
+    more than one worker (see kwargs), each run starts new worker processes, so
+    only the caches of the main process are warm. If the gold data does not exist
+    yet, it is created by an untimed run first, so that all timed runs process the
+    sentences of the gold data.
+
+    Args:
+        extractor (GraphbrainExtractor): the extractor with the patterns to use
+        input (str): path to the LSOIE file
+        max_extr (int): the maximum number of extractions per sentence
+        n_warm_runs (int): the number of runs after the cold one
+        kwargs: further arguments of generate_triplets_and_gold_data
+
+    Returns:
+        Dict[str, Any]: the summaries of the cold and warm runs, with the rates
+            reported by generate_triplets_and_gold_data for the cold run
+    """
+    if not os.path.exists(input.split(".")[0] + "_gold.jsonl"):
+        extractor.generate_triplets_and_gold_data(input, max_extr, **kwargs)
+
+    clear_caches()
+    extractor.cascade_index = None
+    cold = StageTimer()
+    raw_rate, evaluated_rate, avg_latency = extractor.generate_triplets_and_gold_data(
+        input, max_extr, timer=cold, **kwargs
+    )
+
+    warm = StageTimer()
+    for _ in range(n_warm_runs):
+        extractor.generate_triplets_and_gold_data(input, max_extr, timer=warm, **kwargs)
+
+    report = {
+        "input": input,
+        "max_extr": max_extr,
+        "n_patterns": extractor.get_n_rules(),
+        "raw_rate": raw_rate,
+        "evaluated_rate": evaluated_rate,
+        "avg_latency": avg_latency,
+        "cold": cold.summary(),
+    }
+    if n_warm_runs > 0:
+        report["warm"] = warm.summary()
+        report["warm"]["runs"] = n_warm_runs
+
+    return report
+
+
+def benchmark_max_extr(
+    extractor, input: str, max_extrs: Iterable[int], n_warm_runs: int = 1, **kwargs
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Benchmark the extraction for each maximum number of extractions (see
+    benchmark_extraction), e.g. to check how much the match stage gains from
+    stopping the pattern cascade early.
+
+    Returns:
+        Dict[int, Dict[str, Any]]: the benchmark of each maximum number of extractions
+    """
+    return {
+        max_extr: benchmark_extraction(
+            extractor, input, max_extr, n_warm_runs=n_warm_runs, **kwargs
+        )
+        for max_extr in sorted(max_extrs)
+    }
@@ -1,7 +1,9 @@
 import argparse
 import logging
 import os
+import statistics
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 from rich.console import Console
 from tuw_nlp.common.utils import ensure_dir
@@ -14,8 +16,8 @@ from newpotato.hitl import HITLManager
 
 
 class ExtractorEvaluator(Evaluator):
-    def __init__(self, extractor, gold_data):
-        super(ExtractorEvaluator, self).__init__()
+    def __init__(self, extractor, gold_data, **kwargs):
+        super(ExtractorEvaluator, self).__init__(**kwargs)
         self.extractor = extractor
         self.gold_data = gold_data
 
@@ -35,6 +37,87 @@ def split_data(gold_dict, test_size=None):
     return dict(train_items), dict(val_items)
 
 
+def kfold_splits(gold_dict, k):
+    """
+    Split the gold data into k folds of consecutive sentences and return the train
+    and validation data of each fold, the validation data of fold i being the i-th
+    fold.
+    """
+    gold_items = list(gold_dict.items())
+    bounds = [len(gold_items) * i // k for i in range(k + 1)]
+    return [
+        (
+            dict(gold_items[: bounds[i]] + gold_items[bounds[i + 1] :]),
+            dict(gold_items[bounds[i] : bounds[i + 1]]),
+        )
+        for i in range(k)
+    ]
+
+
+_worker_state = {}
+
+
+def init_fold_worker(extractor, gold_data, k, events_dir):
+    """
+    Set up a worker process of run_folds. With the fork start method, the parsed
+    graphs of the extractor are shared with the main process and not copied until
+    they are modified.
+    """
+    _worker_state["extractor"] = extractor
+    _worker_state["splits"] = kfold_splits(gold_data, k)
+    _worker_state["events_dir"] = events_dir
+
+
+def run_fold(i):
+    """
+    Train the extractor on the training data of fold i and evaluate it on its
+    validation data, in a worker process set up by init_fold_worker.
+    """
+    extractor = _worker_state["extractor"]
+    train_data, val_data = _worker_state["splits"][i]
+    logging.warning(f"fold {i}: {len(train_data)=}, {len(val_data)=}")
+    extractor.get_rules(train_data)
+
+    evaluator = ExtractorEvaluator(extractor, val_data, keep_events=False)
+    events_dir = _worker_state["events_dir"]
+    if events_dir is not None:
+        evaluator.write_events_to_file(os.path.join(events_dir, f"events_{i}.tsv"))
+    return dict(evaluator.get_results())
+
+
+def run_folds(extractor, gold_data, k, n_workers=1, events_dir=None):
+    """
+    Run k-fold cross-validation on gold data that has been parsed and mapped once,
+    with the folds trained and evaluated by n_workers processes.
+
+    Returns:
+        List[Dict[str, Any]]: the results of each fold
+    """
+    init_args = (extractor, gold_data, k, events_dir)
+    if n_workers <= 1:
+        init_fold_worker(*init_args)
+        return [run_fold(i) for i in range(k)]
+
+    with ProcessPoolExecutor(
+        max_workers=min(n_workers, k),
+        initializer=init_fold_worker,
+        initargs=init_args,
+    ) as executor:
+        return list(executor.map(run_fold, range(k)))
+
+
+def summarize_folds(fold_results, keys=("precision", "recall", "f")):
+    """
+    Get the mean and (sample) variance of some results across folds.
+    """
+    summary = {}
+    for key in keys:
+        values = [res.get(key, 0) for res in fold_results]
+        summary[f"{key}_mean"] = statistics.mean(values)
+        summary[f"{key}_var"] = statistics.variance(values) if len(values) > 1 else 0.0
+    return summary
+
+
 def get_args():
     parser = argparse.ArgumentParser(description="")
     parser.add_argument("-t", "--data_type", default=None, type=str)
@@ -45,6 +128,9 @@ def get_args():
     parser.add_argument("-v", "--verbose", action="store_true")
     parser.add_argument("-o", "--output_dir", default=None, type=str)
     parser.add_argument("-r", "--which_rel", default=None, type=str)
+    parser.add_argument("-w", "--workers", default=1, type=int)
+    parser.add_argument("-cs", "--chunk_size", default=100, type=int)
+    parser.add_argument("-k", "--folds", default=None, type=int)
     return parser.parse_args()
 
 
@@ -86,6 +172,28 @@ def main():
         extractor = hitl.extractor
         gold_data = hitl.text_to_triplets
 
+    if args.folds is not None:
+        # the gold data is parsed and mapped once and shared by all folds
+        logging.warning(f"running {args.folds}-fold cross-validation...")
+        fold_results = run_folds(
+            extractor,
+            gold_data,
+            args.folds,
+            n_workers=args.workers,
+            events_dir=args.output_dir,
+        )
+        results_file = os.path.join(args.output_dir, "results.txt")
+        logging.warning(f"writing results to {results_file}")
+        with open(results_file, "w") as rf:
+            for i, results in enumerate(fold_results):
+                for key, value in results.items():
+                    rf.write(f"fold {i} {key}: {value}\n")
+            for key, value in summarize_folds(fold_results).items():
+                line = f"{key}: {value}"
+                print(line)
+                rf.write(f"{line}\n")
+        return
+
     train_data, val_data = split_data(gold_data, args.test_size)
     logging.warning(f"{len(train_data)=}, {len(val_data)=}")
     # training
@@ -97,7 +205,18 @@ def main():
 
     # evaluation
     logging.warning("evaluating...")
-    evaluator = ExtractorEvaluator(extractor, val_data)
+    evaluator = ExtractorEvaluator(
+        extractor,
+        val_data,
+        n_workers=args.workers,
+        chunk_size=args.chunk_size,
+        keep_events=False,
+    )
+
+    # events are written as they are produced, counts are updated in the same pass
+    events_file = os.path.join(args.output_dir, "events.tsv")
+    logging.warning(f"writing events to {events_file}")
+    evaluator.write_events_to_file(events_file)
 
     results = evaluator.get_results()
 
@@ -109,10 +228,6 @@ def main():
             print(line)
             rf.write(f"{line}\n")
 
-    events_file = os.path.join(args.output_dir, "events.tsv")
-    logging.warning(f"writing events to {events_file}")
-    evaluator.write_events_to_file(events_file)
-
     patterns_file = os.path.join(args.output_dir, "patterns.json")
     logging.warning(f"writing patterns to {patterns_file}")
     extractor.save_patterns(patterns_file)
@@ -7,8 +7,8 @@ from newpotato.hitl import HITLManager
 
 
 class HITLEvaluator(Evaluator):
-    def __init__(self, hitl):
-        super(HITLEvaluator, self).__init__()
+    def __init__(self, hitl, **kwargs):
+        super(HITLEvaluator, self).__init__(**kwargs)
         self.hitl = hitl
 
     def infer_triplets(self, sen):
@@ -27,6 +27,8 @@ def get_args():
     parser.add_argument("-r", "--relearn", action="store_true")
     parser.add_argument("hitl_state_file")
     parser.add_argument("-e", "--events_file", default=None, type=str)
+    parser.add_argument("-w", "--workers", default=1, type=int)
+    parser.add_argument("-cs", "--chunk_size", default=100, type=int)
     return parser.parse_args()
 
 
@@ -43,17 +45,20 @@ def main():
     hitl = HITLManager.load(args.hitl_state_file)
     if args.relearn:
         hitl.get_rules(learn=False)
-    evaluator = HITLEvaluator(hitl)
-    results = evaluator.get_results()
-    for key, value in results.items():
-        print(f"{key}: {value}")
-
+    evaluator = HITLEvaluator(
+        hitl, n_workers=args.workers, chunk_size=args.chunk_size, keep_events=False
+    )
+    # events are written as they are produced, counts are updated in the same pass
     if args.events_file is not None:
         if args.events_file == "-":
             evaluator.write_events(sys.stdout)
         else:
             evaluator.write_events_to_file(args.events_file)
 
+    results = evaluator.get_results()
+    for key, value in results.items():
+        print(f"{key}: {value}")
+
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,53 @@
 import logging
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
 from tqdm import tqdm
 
 from newpotato.datatypes import triplets_to_str
 
+_worker_state = {}
+
+
+def init_evaluation_worker(evaluator):
+    """
+    Set up a worker process of Evaluator, so that the evaluator (and its extractor)
+    is passed only once per process.
+    """
+    _worker_state["evaluator"] = evaluator
+
+
+def infer_chunk(sens):
+    """
+    Infer the triplets of a chunk of sentences in a worker process set up by
+    init_evaluation_worker.
+    """
+    evaluator = _worker_state["evaluator"]
+    return [list(evaluator.infer_triplets(sen)) for sen in sens]
+
 
 class Evaluator:
-    def __init__(self):
+    """Abstract class for evaluators that compare inferred triplets with gold triplets.
+
+    Events, i.e. the gold and predicted triplets of each sentence, are generated in a
+    single pass that updates the counts as it goes and can write each event to a
+    stream. With more than one worker, triplets are inferred by worker processes in
+    chunks of sentences, and events are still produced in the order of the gold data.
+    Whatever infer_triplets stores in a worker process (e.g. parses of new
+    sentences) is not kept.
+
+    Attributes:
+        n_workers (int): the number of processes that infer triplets
+        chunk_size (int): the number of sentences sent to a worker at once
+        keep_events (bool): whether to keep the events in memory, so that they can
+            be written or replayed later without inferring the triplets again
+    """
+
+    def __init__(self, n_workers=1, chunk_size=100, keep_events=True):
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.keep_events = keep_events
         self.reset()
 
     def reset(self):
@@ -21,17 +61,23 @@ class Evaluator:
     def gen_texts_with_gold_triplets(self):
         raise NotImplementedError
 
+    def _count_event(self, c, golds, preds):
+        c["docs"] += 1
+        c["gold"] += len(golds)
+        c["pred"] += len(preds)
+        c["tp"] += len(golds & preds)
+        c["fn"] += len(golds - preds)
+        c["fp"] += len(preds - golds)
+        if golds == preds:
+            c["docs_corr"] += 1
+
     def _get_counts(self):
+        if self.events is None:
+            self.evaluate()
+            return
         c = Counter()
-        for sen, gold_set, pred_set in self.get_events():
-            c["docs"] += 1
-            c["gold"] += len(gold_set)
-            c["pred"] += len(pred_set)
-            c["tp"] += len(gold_set & pred_set)
-            c["fn"] += len(gold_set - pred_set)
-            c["fp"] += len(pred_set - gold_set)
-            if gold_set == pred_set:
-                c["docs_corr"] += 1
+        for sen, gold_set, pred_set in self.events:
+            self._count_event(c, gold_set, pred_set)
         self.counts = c
         self.results = None
 
@@ -40,17 +86,80 @@ class Evaluator:
             self._get_counts()
         return self.counts
 
+    def _infer_in_parallel(self, texts):
+        texts = iter(texts)
+        pending = deque()
+        with ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=init_evaluation_worker,
+            initargs=(self,),
+        ) as executor:
+            while True:
+                chunk = list(islice(texts, self.chunk_size))
+                if chunk:
+                    sens = [sen for sen, _ in chunk]
+                    pending.append((chunk, executor.submit(infer_chunk, sens)))
+                if not pending:
+                    break
+                # keep a bounded number of chunks in flight, consume them in order
+                if chunk and len(pending) < 2 * self.n_workers:
+                    continue
+                done, future = pending.popleft()
+                for (sen, gold_list), preds in zip(done, future.result()):
+                    yield sen, gold_list, preds
+
+    def gen_events(self):
+        """
+        Infer the triplets of each gold sentence and yield its event, i.e. the
+        sentence and the sets of gold and predicted triplets.
+        """
+        texts = self.gen_texts_with_gold_triplets()
+        if self.n_workers > 1:
+            inferred = self._infer_in_parallel(texts)
+        else:
+            inferred = (
+                (sen, gold_list, self.infer_triplets(sen)) for sen, gold_list in texts
+            )
+        for sen, gold_list, preds in tqdm(inferred):
+            yield sen, set(gold_list), set(preds)
+
+    def evaluate(self, stream=None):
+        """
+        Generate the events in a single pass, counting them and writing each of them
+        to stream as soon as it is produced if a stream is given. The events are only
+        kept if keep_events is True.
+        """
+        c = Counter()
+        events = [] if self.keep_events else None
+        for sen, golds, preds in self.gen_events():
+            self._count_event(c, golds, preds)
+            if stream is not None:
+                self.write_event(stream, sen, golds, preds)
+            if events is not None:
+                events.append((sen, golds, preds))
+
+        self.events = events
+        self.counts = c
+        self.results = None
+
     def _get_events(self):
-        self.events = []
-        for sen, gold_list in tqdm(self.gen_texts_with_gold_triplets()):
-            golds = set(gold_list)
-            preds = set(self.infer_triplets(sen))
-            self.events.append((sen, golds, preds))
+        self.evaluate()
 
     def get_events(self):
+        """
+        Get the events, generating and counting them first if necessary.
+
+        Raises:
+            ValueError: if the events are not kept, they would have to be inferred
+                again (see evaluate and write_events)
+        """
         if self.events is None:
+            if not self.keep_events:
+                raise ValueError(
+                    "events are not kept, write them while they are counted"
+                )
             self._get_events()
-        yield from self.events
+        return iter(self.events)
 
     def get_event_type(self, golds, preds):
         fn = len(golds - preds)
@@ -63,16 +172,33 @@ class Evaluator:
             return "FN"
         return "B"
 
+    def write_event(self, stream, sen, golds, preds):
+        e_type = self.get_event_type(golds, preds)
+        logging.debug("golds: " + ", ".join(f"{(t.pred, t.args)}" for t in golds))
+        logging.debug("preds: " + ", ".join(f"{(t.pred, t.args)}" for t in preds))
+        golds_txt = " ".join(triplets_to_str(golds))
+        preds_txt = " ".join(triplets_to_str(preds))
+        stream.write(f"{e_type}\t{sen}\t{golds_txt}\t{preds_txt}\n")
+
     def write_events(self, stream):
-        for sen, golds, preds in self.get_events():
-            e_type = self.get_event_type(golds, preds)
-            logging.debug(
-                "golds: " + ", ".join(f"{(t.pred, t.args)}" for t in golds)
-            )
-            logging.debug("preds: " + ", ".join(f"{(t.pred, t.args)}" for t in preds))
-            golds_txt = " ".join(triplets_to_str(golds))
-            preds_txt = " ".join(triplets_to_str(preds))
-            stream.write(f"{e_type}\t{sen}\t{golds_txt}\t{preds_txt}\n")
+        """
+        Write the events to stream. If they are not available yet, they are
+        generated and counted while they are written (see evaluate).
+
+        Raises:
+            ValueError: if the events were counted without keeping them, they would
+                have to be inferred again
+        """
+        if self.events is None:
+            if self.counts is not None:
+                raise ValueError(
+                    "events were counted without keeping them, write them while "
+                    "they are counted"
+                )
+            self.evaluate(stream)
+            return
+        for sen, golds, preds in self.events:
+            self.write_event(stream, sen, golds, preds)
 
     def write_events_to_file(self, fn):
         with open(fn, "w") as f:
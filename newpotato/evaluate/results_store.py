@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterable, List, Optional
+
+RESULTS_DB = "evaluation_results.db"
+# results file of earlier versions, imported once into a new store
+RESULTS_JSON = "evaluation_results.json"
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        dataset TEXT NOT NULL,
+        nr_of_patterns INTEGER,
+        max_nr_of_extractions INTEGER,
+        entry TEXT NOT NULL
+    )""",
+    """CREATE INDEX IF NOT EXISTS results_config
+        ON results (dataset, nr_of_patterns, max_nr_of_extractions)""",
+]
+
+
+class ResultsStore:
+    """A class to store evaluation results in an SQLite database, so that results are
+    appended without rewriting earlier ones and can be queried by dataset, number of
+    patterns and maximum number of extractions.
+
+    Each result is the dict that NPTerminalClient.evaluate or sweep creates, stored
+    as JSON next to its indexed configuration. Appends are atomic and the database
+    uses write-ahead logging, so that runs in parallel processes can record their
+    results safely while others read them.
+
+    Attributes:
+        path (str): path to the database file
+        timeout (float): seconds to wait for the write lock of another process
+    """
+
+    def __init__(
+        self,
+        path: str = RESULTS_DB,
+        legacy_json: Optional[str] = RESULTS_JSON,
+        timeout: float = 60.0,
+    ):
+        """
+        Open the store and create it if it does not exist yet. A new store imports
+        the results of legacy_json, a results file of the format of earlier versions
+        ({dataset: [result, ...]}), if it exists.
+
+        Raises:
+            ValueError: if legacy_json cannot be read, the store is not created
+                until the file is fixed or moved, so that its results are not lost
+        """
+        self.path = path
+        self.timeout = timeout
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            (version,) = conn.execute("PRAGMA user_version").fetchone()
+            if version == 0:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                if legacy_json is not None and os.path.exists(legacy_json):
+                    with open(legacy_json, "r") as f:
+                        try:
+                            legacy = json.load(f)
+                        except json.JSONDecodeError as err:
+                            raise ValueError(
+                                f"cannot import the results of {legacy_json}: {err}"
+                            ) from err
+                    for dataset, entries in legacy.items():
+                        self._insert(conn, dataset, entries)
+                conn.execute("PRAGMA user_version = 1")
+
+    @contextmanager
+    def _transaction(self):
+        # commits are issued explicitly, BEGIN IMMEDIATE takes the write lock at the
+        # start so that concurrent writers wait for each other instead of failing
+        with closing(
+            sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        ) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path, timeout=self.timeout))
+
+    @staticmethod
+    def _insert(conn, dataset: str, entries: Iterable[Dict[str, Any]]):
+        conn.executemany(
+            "INSERT INTO results (dataset, nr_of_patterns, max_nr_of_extractions,"
+            " entry) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    dataset,
+                    entry.get("nr_of_patterns"),
+                    entry.get("max_nr_of_extractions"),
+                    json.dumps(entry),
+                )
+                for entry in entries
+            ],
+        )
+
+    def append(self, dataset: str, entries: Iterable[Dict[str, Any]]):
+        """
+        Append results for a dataset, all of them or none.
+        """
+        with self._transaction() as conn:
+            self._insert(conn, dataset, entries)
+
+    @staticmethod
+    def _where(
+        dataset: Optional[str],
+        nr_of_patterns: Optional[int],
+        max_nr_of_extractions: Optional[int],
+    ):
+        conditions, params = [], []
+        for column, value in (
+            ("dataset", dataset),
+            ("nr_of_patterns", nr_of_patterns),
+            ("max_nr_of_extractions", max_nr_of_extractions),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, params
+
+    def query(
+        self,
+        dataset: Optional[str] = None,
+        nr_of_patterns: Optional[int] = None,
+        max_nr_of_extractions: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the results of a dataset and/or configuration, in the order in which
+        they were stored. Arguments that are None match all results.
+        """
+        where, params = self._where(dataset, nr_of_patterns, max_nr_of_extractions)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT entry FROM results{where} ORDER BY id", params
+            ).fetchall()
+        return [json.loads(entry) for (entry,) in rows]
+
+    def count(
+        self,
+        dataset: Optional[str] = None,
+        nr_of_patterns: Optional[int] = None,
+        max_nr_of_extractions: Optional[int] = None,
+    ) -> int:
+        """
+        Count the results of a dataset and/or configuration (see query).
+        """
+        where, params = self._where(dataset, nr_of_patterns, max_nr_of_extractions)
+        with self._connect() as conn:
+            (n,) = conn.execute(
+                f"SELECT COUNT(*) FROM results{where}", params
+            ).fetchone()
+        return n
+
+    def datasets(self) -> List[str]:
+        """
+        Get the datasets with results, in the order of their first result.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT dataset FROM results GROUP BY dataset ORDER BY MIN(id)"
+            ).fetchall()
+        return [dataset for (dataset,) in rows]
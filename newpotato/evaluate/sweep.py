@@ -0,0 +1,67 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from newpotato.extractors.graphbrain_extractor_PC import combine_triplets
+
+
+def select_extractions(
+    entries: List[Dict[str, Any]], n_patterns: int, max_extr: int
+) -> List[Dict[str, Any]]:
+    """
+    Select the extractions of a sentence that a run with the top n_patterns patterns
+    and max_extr produces: the first max_extr extractions of each edge by the
+    patterns with a rank below n_patterns, in the order of the cascade. Their ranks
+    and edges are removed.
+
+    Args:
+        entries (List[Dict[str, Any]]): the ranked extractions of the sentence by
+            edge, then in the order of the cascade, as written by
+            generate_triplets_and_gold_data with ranked=True
+        n_patterns (int): the number of patterns, by support
+        max_extr (int): the maximum number of extractions per edge
+    """
+    per_edge = Counter()
+    selected = []
+    for entry in entries:
+        if entry["rank"] < n_patterns and per_edge[entry["edge"]] < max_extr:
+            per_edge[entry["edge"]] += 1
+            selected.append(
+                {k: v for k, v in entry.items() if k not in ("rank", "edge")}
+            )
+    return selected
+
+
+def sweep_predictions(
+    ranked: Dict[str, List[Dict[str, Any]]],
+    pattern_counts: Iterable[int],
+    max_extrs: Iterable[int],
+) -> Iterator[Tuple[Tuple[int, int], Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Derive the predictions for every combination of the number of patterns and the
+    maximum number of extractions from the ranked extractions of a single pass with
+    the largest pattern set, instead of matching the patterns again for each one.
+
+    The extraction pass limits the extractions per edge for each pattern, so that
+    it has to run with the largest max_extr. The predictions of a combination are
+    those of a run with the top n_patterns patterns and max_extr (see
+    select_extractions).
+
+    Args:
+        ranked (Dict[str, List[Dict[str, Any]]]): the ranked extractions of each
+            sentence (see load_tuples)
+        pattern_counts (Iterable[int]): the numbers of patterns
+        max_extrs (Iterable[int]): the maximum numbers of extractions
+
+    Yields:
+        Tuple[Tuple[int, int], Dict[str, List[Dict[str, Any]]]]: the number of
+            patterns and the maximum number of extractions, and the combined
+            predictions of each sentence, as in <input>_pred.jsonl
+    """
+    for n_patterns in sorted(pattern_counts):
+        for max_extr in sorted(max_extrs):
+            predictions = {}
+            for sen_id, entries in ranked.items():
+                selected = select_extractions(entries, n_patterns, max_extr)
+                if selected:
+                    predictions[sen_id] = combine_triplets(selected)
+            yield (n_patterns, max_extr), predictions
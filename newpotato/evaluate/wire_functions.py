@@ -6,11 +6,28 @@
 # - Deal with prepositions possibly being the first token of an arg, especially for arg2.
 #   > It's fully ok for "any" prep to be last word of ref_rel or first_word of pred_arg
 
+import json
 import logging
 
+import numpy as np
+
 # Create a logger for this module
 logger = logging.getLogger(__name__)
 
+# the parts of a tuple besides the arg3+ arguments
+MAIN_PARTS = ["arg1", "rel", "arg2"]
+
+
+def load_tuples(fn):
+    """
+    Load the gold or predicted tuples of each sentence from a JSONL file with one
+    {"id": ..., "tuples": [...]} object per line, as written by
+    generate_triplets_and_gold_data.
+    """
+    with open(fn, encoding="utf-8") as f:
+        sens = (json.loads(line) for line in f if line.strip())
+        return {sen["id"]: sen["tuples"] for sen in sens}
+
 
 def eval_system(gold, predictions):
     results = {}
@@ -73,7 +90,23 @@ def f1(prec, rec):
 def sentence_match(gold, predicted):
     """For a given sentence, compute tuple-tuple matching scores, and gather them
     at the sentence level. Return scoring metrics."""
-    score, maximum_score = 0, len(gold)
+    if logger.isEnabledFor(logging.INFO):
+        exact_match_scores, scores = log_match_scores(gold, predicted)
+    else:
+        exact_match_scores, scores = match_scores(gold, predicted)
+
+    # logger.info(f"exact match scores: {exact_match_scores}")
+    # logger.info(f"partial match scores: {scores}")
+    scoring_metrics = _aggregate_scores_greedily(*scores)
+    exact_match_summary = aggregate_exact_matches(exact_match_scores)
+    scoring_metrics["exact_match_precision"] = exact_match_summary["precision"]
+    scoring_metrics["exact_match_recall"] = exact_match_summary["recall"]
+    return scoring_metrics
+
+
+def log_match_scores(gold, predicted):
+    """Same as match_scores, but matches the tuples one pair at a time with
+    tuple_match and tuple_exact_match and logs each pair."""
     exact_match_scores = [[None for _ in predicted] for __ in gold]
     scores = [[None for _ in predicted] for __ in gold]
     for i, gt in enumerate(gold):
@@ -105,54 +138,160 @@ def sentence_match(gold, predicted):
                 logger.info(f"partial match score: {scores[i][j]}")
             logger.info("-" * 30)
 
-    # logger.info(f"exact match scores: {exact_match_scores}")
-    # logger.info(f"partial match scores: {scores}")
-    scoring_metrics = aggregate_scores_greedily(scores)
-    exact_match_summary = aggregate_exact_matches(exact_match_scores)
-    scoring_metrics["exact_match_precision"] = exact_match_summary["precision"]
-    scoring_metrics["exact_match_recall"] = exact_match_summary["recall"]
-    return scoring_metrics
+    exact_match_scores = np.array(exact_match_scores, dtype=bool).reshape(
+        len(gold), len(predicted)
+    )
+    return exact_match_scores, _score_arrays(scores, len(gold), len(predicted))
+
+
+class _GoldPart:
+    """The words of a part of a gold tuple, prepared for matching."""
+
+    __slots__ = ("words", "n_words", "text", "num_realwords", "is_fully_inferred")
+
+    def __init__(self, part):
+        self.words = set(part["words"])
+        self.n_words = len(part["words"])
+        self.text = " ".join(part["words"])
+        self.num_realwords = sum(i != "inf" for i in part["words_indexes"])
+        self.is_fully_inferred = all(i == "inf" for i in part["words_indexes"])
+
+
+def _count_matching_words(predicted_words, gold_part):
+    return sum(1 for w in predicted_words if w in gold_part.words)
+
+
+def _match_counts(pred_words, pred_arg3_words, gold_parts, gold_arg3_parts):
+    """Same as tuple_match on prepared tuples, but returns the numbers of matching
+    and total words for precision and recall, or None if the tuples do not match."""
+    precision = [0, 0]  # 0 out of 0 predicted words match
+    recall = [0, 0]  # 0 out of 0 reference words match
+    for predicted_words, gold_part in zip(pred_words, gold_parts):
+        if not predicted_words:
+            if gold_part.words and not gold_part.is_fully_inferred:
+                return None
+            continue
+        matching_words = _count_matching_words(predicted_words, gold_part)
+        if matching_words == 0 and not gold_part.is_fully_inferred:
+            return None
+        precision[0] += matching_words
+        precision[1] += len(predicted_words)
+        recall[0] += matching_words
+        recall[1] += gold_part.num_realwords
+
+    for i, gold_part in enumerate(gold_arg3_parts):
+        assert gold_part.num_realwords <= gold_part.n_words
+        recall[1] += gold_part.num_realwords
+        if len(pred_arg3_words) > i:
+            matching_words = _count_matching_words(pred_arg3_words[i], gold_part)
+            precision[0] += matching_words
+            precision[1] += len(pred_arg3_words[i])
+            recall[0] += matching_words
+    return precision, recall
+
+
+def match_scores(gold, predicted):
+    """Compute the exact match and partial match scores of all pairs of gold and
+    predicted tuples of a sentence, with the same results as tuple_exact_match and
+    tuple_match. The words of each tuple are split and collected only once.
+
+    Returns:
+        Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray]]: the exact
+            matches and the precision, recall and whether the tuples match at all,
+            each of shape (len(gold), len(predicted))
+    """
+    gold_parts = [[_GoldPart(gt[part]) for part in MAIN_PARTS] for gt in gold]
+    gold_arg3_parts = [[_GoldPart(arg) for arg in gt["arg3+"]] for gt in gold]
+    pred_texts = [[t[part] for part in MAIN_PARTS] for t in predicted]
+    pred_arg3_texts = [t.get("arg3+", False) or [] for t in predicted]
+    pred_words = [[text.split() for text in texts] for texts in pred_texts]
+    pred_arg3_words = [[text.split() for text in texts] for texts in pred_arg3_texts]
+
+    exact, prec, rec, is_match = [], [], [], []
+    for parts, arg3_parts in zip(gold_parts, gold_arg3_parts):
+        # exact matches: all main parts are the same and, if the reference has
+        # arg3+ arguments, the same arg3+ arguments in the same order
+        gold_texts = [part.text for part in parts]
+        gold_arg3_texts = [part.text for part in arg3_parts]
+        exact.append(
+            [
+                texts == gold_texts and (not arg3_parts or arg3 == gold_arg3_texts)
+                for texts, arg3 in zip(pred_texts, pred_arg3_texts)
+            ]
+        )
+
+        # partial matches: if, for each part, any word is the same as a reference
+        # word
+        for words, arg3_words in zip(pred_words, pred_arg3_words):
+            counts = _match_counts(words, arg3_words, parts, arg3_parts)
+            is_match.append(counts is not None)
+            if counts is None:
+                prec.append(0.0)
+                rec.append(0.0)
+            else:
+                (prec_num, prec_denom), (rec_num, rec_denom) = counts
+                prec.append(prec_num / prec_denom)
+                rec.append(rec_num / rec_denom)
+
+    shape = (len(gold), len(predicted))
+    scores = (
+        np.array(prec, dtype=float).reshape(shape),
+        np.array(rec, dtype=float).reshape(shape),
+        np.array(is_match, dtype=bool).reshape(shape),
+    )
+    return np.array(exact, dtype=bool).reshape(shape), scores
+
+
+def _score_arrays(scores, n_gold, n_pred):
+    """Convert a matrix of [prec, rec] pairs or False to arrays."""
+    shape = (n_gold, n_pred)
+    prec, rec = np.zeros(shape), np.zeros(shape)
+    is_match = np.zeros(shape, dtype=bool)
+    for i, gold_ss in enumerate(scores):
+        for j, pred_s in enumerate(gold_ss):
+            if pred_s:
+                prec[i, j], rec[i, j] = pred_s
+                is_match[i, j] = True
+    return prec, rec, is_match
 
 
 def aggregate_scores_greedily(scores):
     # Greedy match: pick the prediction/gold match with the best f1 and exclude
     # them both, until nothing left matches. Each input square is a [prec, rec]
     # pair. Returns precision and recall as score-and-denominator pairs.
+    return _aggregate_scores_greedily(
+        *_score_arrays(scores, len(scores), len(scores[0]))
+    )
+
+
+def _aggregate_scores_greedily(prec, rec, is_match):
+    # The candidates are sorted by descending f1 and then by position, so taking
+    # each candidate whose row and column are still free picks the same matches
+    # as rescanning the matrix for the best free pair after every pick.
+    denom = prec + rec
+    f1_scores = np.divide(
+        2 * prec * rec, denom, out=np.zeros_like(prec), where=is_match & (denom > 0)
+    )
+    rows, cols = np.nonzero(f1_scores > 0)
+    order = np.lexsort((cols, rows, -f1_scores[rows, cols]))
+
     matches = []
-    logger.debug(f"{scores=}")
-    while True:
-        max_s = 0
-        gold, pred = None, None
-        for i, gold_ss in enumerate(scores):
-            logger.debug(f"{i=}, {gold_ss=}")
-            if i in [m[0] for m in matches]:
-                logger.debug(f"row already taken")
-                # Those are already taken rows
-                continue
-            for j, pred_s in enumerate(scores[i]):
-                logger.debug(f"{j=}, {pred_s=}")
-                if j in [m[1] for m in matches]:
-                    logger.debug(f"col already taken")
-                    # Those are used columns
-                    continue
-                if pred_s and f1(*pred_s) > max_s:
-                    max_s = f1(*pred_s)
-                    gold = i
-                    pred = j
-                    logger.debug(f"new best score: {max_s}")
-                    logger.debug(f"best gold: {i}, best pred: {j}")
-        if max_s == 0:
-            break
+    gold_taken = np.zeros(prec.shape[0], dtype=bool)
+    pred_taken = np.zeros(prec.shape[1], dtype=bool)
+    for i, j in zip(rows[order].tolist(), cols[order].tolist()):
+        if gold_taken[i] or pred_taken[j]:
+            continue
+        gold_taken[i] = pred_taken[j] = True
         # save indices of best match for this sentence e.g. [[2, 4]]
-        matches.append([gold, pred])
+        matches.append([i, j])
     # Now that matches are determined, compute final scores.
-    prec_scores = [scores[i][j][0] for i, j in matches]
-    rec_scores = [scores[i][j][1] for i, j in matches]
+    prec_scores = [prec[i, j].item() for i, j in matches]
+    rec_scores = [rec[i, j].item() for i, j in matches]
     total_prec = sum(prec_scores)
     total_rec = sum(rec_scores)
     scoring_metrics = {
-        "precision": [total_prec, len(scores[0])],
-        "recall": [total_rec, len(scores)],
+        "precision": [total_prec, prec.shape[1]],
+        "recall": [total_rec, prec.shape[0]],
         "precision_of_matches": prec_scores,
         "recall_of_matches": rec_scores,
     }
@@ -162,24 +301,13 @@ def aggregate_scores_greedily(scores):
 def aggregate_exact_matches(match_matrix):
     # For this aggregation task, no predicted tuple can exact-match two gold
     # ones, so it's easy, look at lines and columns looking for OR-total booleans.
-    recall = [
-        sum([any(gold_matches) for gold_matches in match_matrix], 0),
-        len(match_matrix),
-    ]
+    match_matrix = np.asarray(match_matrix, dtype=bool)
+    recall = [int(match_matrix.any(axis=1).sum()), match_matrix.shape[0]]
     # ^ this is [3,5] for "3 out of 5", to be lumped together later.
-    if len(match_matrix[0]) == 0:
+    if match_matrix.shape[1] == 0:
         precision = [0, 0]  # N/A
     else:
-        precision = [
-            sum(
-                [
-                    any([g[i] for g in match_matrix])
-                    for i in range(len(match_matrix[0]))
-                ],
-                0,
-            ),
-            len(match_matrix[0]),
-        ]
+        precision = [int(match_matrix.any(axis=0).sum()), match_matrix.shape[1]]
     # f1 = 2 * precision * recall / (precision + recall)
     metrics = {"precision": precision, "recall": recall}
     return metrics
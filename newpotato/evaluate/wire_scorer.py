@@ -0,0 +1,266 @@
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from newpotato.evaluate.wire_functions import sentence_match
+
+# the id, gold tuples and predicted tuples (of all systems) of a sentence
+SentencePair = Tuple[Any, List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+def iter_tuples(fn: str) -> Iterator[Tuple[Any, List[Dict[str, Any]]]]:
+    """
+    Stream the gold or predicted tuples of each sentence from a JSONL file with one
+    {"id": ..., "tuples": [...]} object per line (see load_tuples).
+
+    JSON files are loaded at once, either in the WiRe57 reference format (a dict of
+    documents, each a list of sentences with an "id" and "tuples") or as a dict of
+    predicted tuples by sentence id.
+    """
+    with open(fn, encoding="utf-8") as f:
+        if not fn.endswith(".json"):
+            for line in f:
+                if line.strip():
+                    sen = json.loads(line)
+                    yield sen["id"], sen["tuples"]
+            return
+        data = json.load(f)
+
+    for key, value in data.items():
+        if value and isinstance(value[0], dict) and "tuples" in value[0]:
+            for sen in value:
+                yield sen["id"], sen["tuples"]
+        else:
+            yield key, value
+
+
+def iter_sentence_pairs(gold_fn: str, pred_fn: str) -> Iterator[SentencePair]:
+    """
+    Stream the gold and predicted tuples of each gold sentence, in the order of the
+    gold file. Predictions of sentences without gold tuples are skipped and gold
+    sentences without predictions get an empty list.
+
+    Predictions in a JSON file are loaded at once anyway (see iter_tuples) and are
+    joined with the gold sentences by id, in any order. Otherwise, only the sentence
+    ids of the gold file are kept in memory and the predictions are read once, so
+    they must be in the order of the gold data, as written by
+    generate_triplets_and_gold_data.
+
+    Raises:
+        ValueError: if the predictions of a sentence in a JSONL file come after it
+            was scored
+    """
+    if pred_fn.endswith(".json"):
+        predictions = dict(iter_tuples(pred_fn))
+        for sen_id, gold_tuples in iter_tuples(gold_fn):
+            yield sen_id, gold_tuples, predictions.get(sen_id, [])
+        return
+
+    positions = {sen_id: i for i, (sen_id, _) in enumerate(iter_tuples(gold_fn))}
+    predictions = (
+        (positions[sen_id], sen_id, tuples)
+        for sen_id, tuples in iter_tuples(pred_fn)
+        if sen_id in positions
+    )
+    # the next predictions, of the current or a later gold sentence
+    next_pred = next(predictions, None)
+    for i, (sen_id, gold_tuples) in enumerate(iter_tuples(gold_fn)):
+        if next_pred is None or next_pred[0] > i:
+            yield sen_id, gold_tuples, []
+            continue
+        if next_pred[0] < i:
+            break
+        yield sen_id, gold_tuples, next_pred[2]
+        next_pred = next(predictions, None)
+
+    if next_pred is not None:
+        raise ValueError(
+            f"predictions of sentence {next_pred[1]} are not in the order of the "
+            f"gold data: {pred_fn}"
+        )
+
+
+def score_sentence(
+    gold_tuples: List[Dict[str, Any]], predicted_tuples: List[Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Match the predictions of each system with the gold tuples of a sentence.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: the results of sentence_match by system
+    """
+    predictions_by_OIE = {}
+    for t in predicted_tuples:
+        predictions_by_OIE.setdefault(t["extractor"], []).append(t)
+    return {
+        e: sentence_match(gold_tuples, predictions)
+        for e, predictions in predictions_by_OIE.items()
+    }
+
+
+def score_shard(shard: List[SentencePair]) -> List[Dict[str, Dict[str, Any]]]:
+    return [
+        score_sentence(gold_tuples, predicted) for _, gold_tuples, predicted in shard
+    ]
+
+
+class SystemScores:
+    """A class to sum up the sentence scores of a system, as eval_system does, without
+    keeping the results of each sentence.
+
+    Attributes:
+        prec (List[float]): numerator and denominator of the precision
+        rec (List[float]): numerator and denominator of the recall
+        exact_prec (List[int]): numerator and denominator of the exact-match precision
+        exact_rec (List[int]): numerator and denominator of the exact-match recall
+        tot_prec_of_matches (float): sum of the precision scores of all matches
+        tot_rec_of_matches (float): sum of the recall scores of all matches
+        matches (int): the number of matches
+        raw_match_scores (Optional[List[List[float]]]): the precision and recall
+            scores of all matches, if they are kept
+    """
+
+    def __init__(self, keep_raw_scores: bool = False):
+        self.prec, self.rec = [0, 0], [0, 0]
+        self.exact_prec, self.exact_rec = [0, 0], [0, 0]
+        self.tot_prec_of_matches, self.tot_rec_of_matches = 0, 0
+        self.matches = 0
+        self.raw_match_scores = [[], []] if keep_raw_scores else None
+
+    def add(self, s: Dict[str, Any]):
+        """
+        Add the result of sentence_match for a sentence.
+        """
+        for total, part in (
+            (self.prec, s["precision"]),
+            (self.rec, s["recall"]),
+            (self.exact_prec, s["exact_match_precision"]),
+            (self.exact_rec, s["exact_match_recall"]),
+        ):
+            total[0] += part[0]
+            total[1] += part[1]
+        self.tot_prec_of_matches += sum(s["precision_of_matches"])
+        self.tot_rec_of_matches += sum(s["recall_of_matches"])
+        self.matches += len(s["precision_of_matches"])
+        if self.raw_match_scores is not None:
+            self.raw_match_scores[0] += s["precision_of_matches"]
+            self.raw_match_scores[1] += s["recall_of_matches"]
+
+    def add_unpredicted(self, n_gold: int):
+        """
+        Add a sentence with n_gold gold tuples and no predictions of the system.
+        """
+        self.rec[1] += n_gold
+        self.exact_rec[1] += n_gold
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get the metrics in the format of eval_system.
+        """
+        return {
+            "precision": self.prec[0] / self.prec[1],
+            "recall": self.rec[0] / self.rec[1],
+            "non-matches": self.exact_prec[1] - self.matches,
+            "matches": self.matches,
+            "precision_of_matches": self.tot_prec_of_matches / self.matches,
+            "recall_of_matches": self.tot_rec_of_matches / self.matches,
+            "exactmatches_precision": list(self.exact_prec),
+            "exactmatches_recall": list(self.exact_rec),
+        }
+
+
+def _score_in_parallel(
+    shards: Iterator[List[SentencePair]], n_workers: int
+) -> Iterator[Tuple[List[SentencePair], List[Dict[str, Dict[str, Any]]]]]:
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while True:
+            shard = next(shards, None)
+            if shard:
+                pending.append((shard, executor.submit(score_shard, shard)))
+            if not pending:
+                break
+            # keep a bounded number of shards in flight, consume them in order
+            if shard and len(pending) < 2 * n_workers:
+                continue
+            done, future = pending.popleft()
+            yield done, future.result()
+
+
+def score_predictions(
+    pairs: Iterable[SentencePair],
+    n_workers: int = 1,
+    shard_size: int = 1000,
+    keep_raw_scores: bool = False,
+) -> Dict[str, Tuple[Dict[str, Any], Optional[List[List[float]]]]]:
+    """
+    Score the predictions of each system with the WiRe57 scorer, with the same
+    results as split_tuples_by_extractor and eval_system, but without loading all
+    sentences: the sentences are matched in shards of shard_size sentences by
+    n_workers processes and only the sums of the scores are kept. The sums are
+    added in the order of the sentences, so the results do not depend on the
+    number of workers.
+
+    Args:
+        pairs (Iterable[SentencePair]): the sentence id, gold tuples and predicted
+            tuples of each sentence, e.g. from iter_sentence_pairs
+        n_workers (int): the number of worker processes
+        shard_size (int): the number of sentences sent to a worker at once
+        keep_raw_scores (bool): whether to keep the precision and recall scores of
+            all matches
+
+    Returns:
+        Dict[str, Tuple[Dict[str, Any], Optional[List[List[float]]]]]: the metrics
+            and raw match scores (or None) of each system, as returned by
+            eval_system
+    """
+    pairs = iter(pairs)
+    shards = iter(lambda: list(islice(pairs, shard_size)), [])
+    if n_workers > 1:
+        results = _score_in_parallel(shards, n_workers)
+    else:
+        results = ((shard, score_shard(shard)) for shard in shards)
+
+    scores = {}
+    n_unpredicted = {}
+    n_gold_total = 0
+    for shard, shard_results in results:
+        for (_, gold_tuples, _), sen_results in zip(shard, shard_results):
+            n_gold = len(gold_tuples)
+            for e, s in sen_results.items():
+                if e not in scores:
+                    scores[e] = SystemScores(keep_raw_scores)
+                    # gold tuples of the earlier sentences without predictions
+                    n_unpredicted[e] = n_gold_total
+                scores[e].add(s)
+            for e in scores.keys() - sen_results.keys():
+                n_unpredicted[e] += n_gold
+            n_gold_total += n_gold
+
+    for e, system_scores in scores.items():
+        system_scores.add_unpredicted(n_unpredicted[e])
+
+    return {
+        e: (scores[e].get_metrics(), scores[e].raw_match_scores) for e in sorted(scores)
+    }
+
+
+def score_files(
+    gold_fn: str,
+    pred_fn: str,
+    n_workers: int = 1,
+    shard_size: int = 1000,
+    keep_raw_scores: bool = False,
+) -> Dict[str, Tuple[Dict[str, Any], Optional[List[List[float]]]]]:
+    """
+    Score a file of predictions against a file of gold tuples (see
+    iter_sentence_pairs and score_predictions).
+    """
+    return score_predictions(
+        iter_sentence_pairs(gold_fn, pred_fn),
+        n_workers=n_workers,
+        shard_size=shard_size,
+        keep_raw_scores=keep_raw_scores,
+    )
@@ -1,7 +1,8 @@
+import logging
 from collections import defaultdict
-from typing import Any, Dict, List
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
 
-from newpotato.datatypes import Triplet
+from newpotato.datatypes import SentenceFeatures, Triplet
 
 
 def get_extractor_cls(e_type):
@@ -27,6 +28,10 @@ class Extractor:
 
     def __init__(self):
         self.parsed_graphs = {}
+        self.sen_features = {}
+        self.feature_index = defaultdict(set)
+        self.indexed_sens = set()
+        self._reset_view()
         self.doc_ids = defaultdict(set)
         self._is_trained = False
 
@@ -39,6 +44,191 @@ class Extractor:
     def get_tokens(self, sen) -> List[str]:
         raise NotImplementedError
 
+    def _get_features(self, graph) -> Optional[SentenceFeatures]:
+        """
+        Get the token-level features of a graph, or None if the extractor does not
+        provide them.
+        """
+        return None
+
+    def get_features(self, sen) -> SentenceFeatures:
+        """
+        Get the features of a parsed sentence, computing them if necessary
+        (e.g. for graphs loaded from a saved state).
+
+        Args:
+            sen (str): the sentence to get the features for
+        Returns:
+            SentenceFeatures: tokens, lowercased tokens, word indices and lemmas
+        """
+        if sen not in self.sen_features:
+            features = self._get_features(self.parsed_graphs[sen])
+            if features is None:
+                raise NotImplementedError(
+                    f"{type(self).__name__} does not provide sentence features"
+                )
+            self.sen_features[sen] = features
+        return self.sen_features[sen]
+
+    def _get_index_features(self, graph) -> Iterable[Hashable]:
+        """
+        Get the features of a graph that are stored in the inverted index. Without
+        them, candidate_sentences returns all parsed sentences.
+        """
+        return ()
+
+    def _get_pattern_features(self, pattern, **kwargs) -> Optional[Set[Hashable]]:
+        """
+        Get the features that a graph must have for the pattern to match it, or None
+        if nothing can be said about the pattern.
+        """
+        return None
+
+    def _index_sentence(self, sen, graph):
+        for feature in self._get_index_features(graph):
+            self.feature_index[feature].add(sen)
+        self.indexed_sens.add(sen)
+
+    def _update_index(self):
+        """
+        Index graphs that were not added via _store_graph (e.g. loaded from a saved state).
+        """
+        if len(self.indexed_sens) == len(self.parsed_graphs):
+            return
+        for sen, graph in self.parsed_graphs.items():
+            if sen not in self.indexed_sens:
+                self._index_sentence(sen, graph)
+
+    def candidate_sentences(self, pattern, **kwargs) -> Set:
+        """
+        Get the parsed sentences that a pattern can match, based on the inverted index
+        from graph features (e.g. lemmas, POS tags, dependency labels) to sentences.
+        The result is a superset of the sentences the pattern actually matches.
+
+        Args:
+            pattern: the pattern, in the format of the extractor's rules
+            kwargs: passed to _get_pattern_features
+        Returns:
+            Set: the sentences that contain all features required by the pattern
+        """
+        self._update_index()
+        required = self._get_pattern_features(pattern, **kwargs)
+        if not required:
+            return set(self.parsed_graphs)
+
+        postings = sorted(
+            (self.feature_index.get(feature, set()) for feature in required), key=len
+        )
+        return set(postings[0]).intersection(*postings[1:])
+
+    def _match_rule(self, pattern, graph, **kwargs) -> List[Any]:
+        raise NotImplementedError
+
+    def preview_rule(self, pattern, **kwargs) -> Dict[Any, List[Any]]:
+        """
+        Find the stored sentences that a (new or changed) rule matches. Only the
+        candidate sentences returned by the inverted index are matched.
+
+        Args:
+            pattern: the rule, in the format of the extractor's rules
+            kwargs: passed to candidate_sentences and _match_rule
+        Returns:
+            Dict[Any, List[Any]]: the matches of the rule, by sentence
+        """
+        matches_by_sen = {}
+        for sen in self.candidate_sentences(pattern, **kwargs):
+            matches = self._match_rule(pattern, self.parsed_graphs[sen], **kwargs)
+            if len(matches) > 0:
+                matches_by_sen[sen] = matches
+        return matches_by_sen
+
+    def _reset_view(self, version=None):
+        # sentence -> rule -> results of the rule on the sentence (non-empty only)
+        self.view = defaultdict(dict)
+        self.view_sens = set()
+        self.view_rules = set()
+        self.rule_to_view_sens = defaultdict(set)
+        self.view_version = version
+
+    def get_rule_keys(self) -> List[Hashable]:
+        """
+        Get the keys of the current rules, in the order in which they are applied.
+        """
+        raise NotImplementedError
+
+    def _get_view_version(self) -> Hashable:
+        """
+        Get the state (other than the set of rules) that results in the view depend on,
+        a change of it invalidates the whole view.
+        """
+        return None
+
+    def _eval_rule(self, rule, sen, graph) -> Any:
+        """
+        Get the results of a single rule on a sentence, a falsy value if there are none.
+        """
+        raise NotImplementedError
+
+    def _add_rule_to_view(self, rule, sen):
+        results = self._eval_rule(rule, sen, self.parsed_graphs[sen])
+        if results:
+            self.view[sen][rule] = results
+            self.rule_to_view_sens[rule].add(sen)
+
+    def update_view(self):
+        """
+        Bring the materialized view up to date with the current rules. Only rules
+        that were added since the last update are run, and only on the sentences
+        that the inverted index returns for them.
+        """
+        version = self._get_view_version()
+        if version != self.view_version:
+            logging.info("rules changed, resetting materialized view")
+            self._reset_view(version)
+
+        rules = set(self.get_rule_keys())
+        for rule in self.view_rules - rules:
+            for sen in self.rule_to_view_sens.pop(rule, ()):
+                del self.view[sen][rule]
+
+        added_rules = rules - self.view_rules
+        if len(added_rules) > 0:
+            logging.info(f"adding {len(added_rules)} rules to materialized view")
+        for rule in added_rules:
+            for sen in self.candidate_sentences(rule) & self.view_sens:
+                self._add_rule_to_view(rule, sen)
+
+        self.view_rules = rules
+
+    def materialize_view(self, sens: Optional[Iterable] = None):
+        """
+        Add sentences to the materialized view, by default all parsed sentences.
+        """
+        self.update_view()
+        for sen in self.parsed_graphs if sens is None else sens:
+            if sen in self.view_sens:
+                continue
+            for rule in self.view_rules:
+                self._add_rule_to_view(rule, sen)
+            self.view_sens.add(sen)
+
+    def get_view(self, sen) -> List[Tuple[Hashable, Any]]:
+        """
+        Get the results of the current rules on a parsed sentence from the
+        materialized view, computing them if necessary.
+
+        Args:
+            sen (str): the sentence
+        Returns:
+            List[Tuple[Hashable, Any]]: the rules with results and their results,
+                in the order in which rules are applied
+        """
+        self.materialize_view([sen])
+        results = self.view.get(sen, {})
+        return [
+            (rule, results[rule]) for rule in self.get_rule_keys() if rule in results
+        ]
+
     def get_sentences(self, text: str) -> List[str]:
         return [sen for sen, _ in self.get_graphs(text)]
 
@@ -60,18 +250,29 @@ class Extractor:
     def _parse_sen_tuple(self, sen_tuple, **kwargs):
         raise NotImplementedError
 
+    def _store_graph(self, sen, graph):
+        """
+        Store a freshly parsed graph along with the features of its sentence, if the
+        extractor provides them.
+        """
+        self.parsed_graphs[sen] = graph
+        features = self._get_features(graph)
+        if features is not None:
+            self.sen_features[sen] = features
+        self._index_sentence(sen, graph)
+
     def parse_text(self, text, **kwargs):
         if text in self.parsed_graphs:
             yield text, self.parsed_graphs[text]
         else:
             for sen, graph in self._parse_text(text):
-                self.parsed_graphs[sen] = graph
+                self._store_graph(sen, graph)
                 yield sen, graph
 
     def _parse_pretokenized(self, sen_tuple):
         if sen_tuple not in self.parsed_graphs:
             sen_tuple, graph = self._parse_sen_tuple(sen_tuple)
-            self.parsed_graphs[sen_tuple] = graph
+            self._store_graph(sen_tuple, graph)
 
         return sen_tuple, self.parsed_graphs[sen_tuple]
 
@@ -1,9 +1,10 @@
 import json
 import logging
+import re
 import traceback
 from collections import Counter, defaultdict
 from itertools import chain
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
 
 import networkx as nx
 from tuw_nlp.graph.graph import Graph
@@ -11,11 +12,26 @@ from tuw_nlp.graph.ud_graph import UDGraph
 from tuw_nlp.graph.utils import GraphFormulaPatternMatcher
 from tuw_nlp.text.utils import tuple_if_list
 
-from newpotato.datatypes import GraphMappedTriplet, Triplet
+from newpotato.compact_graph import CompactUDGraph, get_ud_graph
+from newpotato.datatypes import GraphMappedTriplet, SentenceFeatures, Triplet
 from newpotato.extractors.extractor import Extractor
 from newpotato.extractors.graph_parser_client import GraphParserClient
 
 
+def _index_key(label: Optional[str]) -> Optional[str]:
+    """
+    Map a node or edge label to the key under which it is indexed.
+    GraphFormulaPatternMatcher matches a label L of a pattern to a label M of a
+    sentence graph if re.match(rf"\b({L})\b", M, re.IGNORECASE) succeeds. For
+    labels L consisting of word characters only, this holds iff the leading
+    word characters of M are L (ignoring case), so this is the key that is used.
+    """
+    if label is None:
+        return None
+    m = re.match(r"\w+", label.lower())
+    return m.group() if m else None
+
+
 class GraphBasedExtractor(Extractor):
     @staticmethod
     def from_json(data: Dict[str, Any]):
@@ -23,7 +39,9 @@ class GraphBasedExtractor(Extractor):
         extractor.text_parser.check_params(data["parser_params"])
 
         extractor.parsed_graphs = {
-            tuple_if_list(item["text"]): UDGraph.from_json(item["graph"])
+            tuple_if_list(item["text"]): extractor._store_format(
+                UDGraph.from_json(item["graph"])
+            )
             for item in data["parsed_graphs"]
         }
 
@@ -130,12 +148,26 @@ class GraphBasedExtractor(Extractor):
         self,
         parser_url: Optional[str] = "http://localhost:7277",
         default_relation: Optional[str] = None,
+        compact_graphs: bool = True,
+        slim_graphs: bool = True,
     ):
         super(GraphBasedExtractor, self).__init__()
         self.text_parser = GraphParserClient(parser_url)
         self.default_relation = default_relation
+        self.compact_graphs = compact_graphs
+        self.slim_graphs = slim_graphs
         self.n_rules = 0
 
+    def _store_format(self, graph: UDGraph):
+        """
+        Convert a freshly parsed graph to the representation kept in parsed_graphs.
+        In slim mode only lemmas, upos and char offsets are kept from the stanza
+        Sentence, which is released after parsing.
+        """
+        if self.compact_graphs:
+            return CompactUDGraph.from_ud_graph(graph, slim=self.slim_graphs)
+        return graph
+
     def _parse_sen_tuple(self, sen_tuple: Tuple):
         """
         Parse pretokenized sentence.
@@ -147,7 +179,7 @@ class GraphBasedExtractor(Extractor):
             TODO
         """
         graph = self.text_parser.parse_pretokenized(sen_tuple)
-        return sen_tuple, graph
+        return sen_tuple, self._store_format(graph)
 
     def _parse_text(self, text: str):
         """
@@ -161,19 +193,82 @@ class GraphBasedExtractor(Extractor):
         """
         graphs = self.text_parser.parse(text)
         for graph in graphs:
-            yield graph.text, graph
+            yield graph.text, self._store_format(graph)
+
+    def _get_features(self, graph) -> SentenceFeatures:
+        if isinstance(graph, CompactUDGraph):
+            lemmas = graph.lemmas
+        else:
+            lemmas = [w.lemma for w in graph.stanza_sen.words]
+        return SentenceFeatures(graph.tokens, lemmas)
+
+    def _get_index_features(self, graph) -> Set[Hashable]:
+        if isinstance(graph, CompactUDGraph):
+            labels = {
+                "name": graph.lemmas + ["root"],
+                "upos": graph.upos + ["ROOT"],
+                "color": graph.deprels,
+            }
+        else:
+            labels = {
+                attr: [data.get(attr) for _, data in graph.G.nodes(data=True)]
+                for attr in ("name", "upos")
+            }
+            labels["color"] = [
+                data.get("color") for *_, data in graph.G.edges(data=True)
+            ]
+
+        return {
+            (attr, key)
+            for attr, values in labels.items()
+            for key in map(_index_key, values)
+            if key is not None
+        }
+
+    def _get_pattern_features(
+        self, pattern, attrs=("upos",), **kwargs
+    ) -> Set[Hashable]:
+        """
+        Get the labels that a sentence must contain for the pattern to match it.
+        Labels that are regular expressions rather than plain words are ignored.
+
+        Args:
+            pattern: a pattern graph or a triplet pattern (graph, arg roots, inferred nodes)
+            attrs (Tuple[str]): the node attributes used for matching, None for names
+        """
+        graph = pattern if isinstance(pattern, Graph) else pattern[0]
+        node_attrs = ("name",) if attrs is None else attrs
+        labels = [
+            (attr, data.get(attr))
+            for _, data in graph.G.nodes(data=True)
+            for attr in node_attrs
+        ]
+        labels += [
+            ("color", data.get("color")) for *_, data in graph.G.edges(data=True)
+        ]
+        return {
+            (attr, label.lower())
+            for attr, label in labels
+            if isinstance(label, str) and re.fullmatch(r"\w+", label)
+        }
+
+    def _match_rule(self, pattern, graph, attrs=("upos",), **kwargs) -> List[Tuple]:
+        matcher = self._get_matcher_from_graphs(
+            Counter({pattern: 1}), label="PREVIEW", threshold=1
+        )
+        return list(self._match(matcher, get_ud_graph(graph), attrs=attrs))
 
     def get_tokens(self, sen) -> List[str]:
         """
         Get the tokens of the given text.
         """
-        return self.parsed_graphs[sen].tokens
+        return self.get_features(sen).tokens
 
     def get_lemmas(self, sen) -> List[str]:
         """
         Get the lemmas of the given text.
         """
-        return [w.lemma for w in self.parsed_graphs[sen].stanza_sen.words]
+        return self.get_features(sen).lemmas
 
     def _get_patterns(self, text_to_triplets):
         patterns_to_sens = defaultdict(set)
@@ -185,7 +280,7 @@ class GraphBasedExtractor(Extractor):
         for text, triplets in text_to_triplets.items():
             # toks = self.get_tokens(text)
             logging.debug(f"{text=}")
-            graph = self.parsed_graphs[text]
+            graph = get_ud_graph(self.parsed_graphs[text])
             logging.debug(graph.to_dot())
             lemmas = self.get_lemmas(text)
             for triplet, positive in triplets:
@@ -312,6 +407,16 @@ class GraphBasedExtractor(Extractor):
         )
         self.triplet_matchers = self._get_triplet_matchers()
         self.triplet_matchers_by_pred = self._get_triplet_matchers_by_pred()
+        # matchers by (graph, arg_root_indices, inferred_node_indices)
+        self.triplet_matchers_by_key = {
+            (key[3], key[1], key[2]): key for key in self.triplet_matchers
+        }
+        # candidate predicates and arguments, and therefore every entry of the
+        # materialized view, depend on these patterns and their order
+        self.cand_patterns = (
+            tuple(graph for graph, _ in self.pred_graphs.most_common()),
+            tuple(graph for graph, _ in self.all_arg_graphs.most_common()),
+        )
         self.n_rules = len(self.pred_matcher.patts)
 
     def get_rules(self, text_to_triplets, **kwargs):
@@ -332,25 +437,100 @@ class GraphBasedExtractor(Extractor):
     def get_n_rules(self):
         return self.n_rules
 
+    def _reset_view(self, version=None):
+        super(GraphBasedExtractor, self)._reset_view(version)
+        # pred and arg candidates by sentence, valid as long as the view is
+        self.cands_cache = {}
+
+    def get_rule_keys(self) -> List[Tuple]:
+        if not hasattr(self, "triplet_matchers"):
+            return []
+        return [
+            (graph, arg_root_indices, inferred_node_indices)
+            for (
+                _,
+                arg_root_indices,
+                inferred_node_indices,
+                graph,
+            ), __ in self.triplet_matchers.most_common()
+        ]
+
+    def _get_view_version(self):
+        return getattr(self, "cand_patterns", None)
+
+    def _get_cands(self, sen, sen_graph):
+        if sen not in self.cands_cache:
+            # only the indices are needed, subgraphs are not kept
+            pred_cands = tuple(
+                indices
+                for indices, _ in self._match(self.pred_matcher, sen_graph, attrs=None)
+            )
+            arg_roots_to_arg_cands = {
+                root: (indices, None)
+                for root, (indices, _) in self._get_arg_cands(sen_graph).items()
+            }
+            self.cands_cache[sen] = (
+                tuple(dict.fromkeys(pred_cands)),
+                arg_roots_to_arg_cands,
+            )
+        return self.cands_cache[sen]
+
+    def _eval_rule(self, rule, sen, graph) -> Optional[Tuple[List, bool]]:
+        sen_graph = get_ud_graph(graph)
+        pred_cands, arg_roots_to_arg_cands = self._get_cands(sen, sen_graph)
+        gen = self._gen_pattern_triplets(
+            sen,
+            sen_graph,
+            pred_cands,
+            arg_roots_to_arg_cands,
+            False,
+            *self.triplet_matchers_by_key[rule],
+        )
+        triplets = []
+        while True:
+            try:
+                triplets.append(next(gen)[1])
+            except StopIteration as stop:
+                stopped = stop.value
+                break
+
+        if len(triplets) == 0 and not stopped:
+            return None
+        return triplets, stopped
+
+    def _infer_triplets_from_view(self, text: str):
+        """
+        Same as _infer_triplets with default arguments, but reads the results of
+        sentences that were seen before from the materialized view.
+        """
+        for sen, _ in self.parse_text(text):
+            for rule, (triplets, stopped) in self.get_view(sen):
+                for triplet in triplets:
+                    yield sen, rule, triplet
+                if stopped:
+                    break
+
     def extract_triplets_from_text(self, text, **kwargs):
         matches_by_text = {}
-        for sen, triplets_and_subgraphs in self._infer_triplets(text):
+        for sen, _ in self.parse_text(text):
             matches_by_text[sen] = {
                 "matches": [],
                 "rules_triggered": [],
                 "triplets": [],
             }
-            for triplet, subgraph in triplets_and_subgraphs:
-                matches_by_text[sen]["rules_triggered"].append(subgraph)
-                matches_by_text[sen]["triplets"].append(triplet)
-                matches_by_text[sen]["matches"].append(
-                    {"REL": None, "ARG0": None, "ARG1": None}
-                )
+        for sen, rule, triplet in self._infer_triplets_from_view(text):
+            matches_by_text[sen]["rules_triggered"].append(
+                rule[0].to_penman(name_attr="name|upos")
+            )
+            matches_by_text[sen]["triplets"].append(triplet)
+            matches_by_text[sen]["matches"].append(
+                {"REL": None, "ARG0": None, "ARG1": None}
+            )
 
         return matches_by_text
 
     def map_triplet(self, triplet, sentence, **kwargs):
-        graph = self.parsed_graphs[sentence]
+        graph = get_ud_graph(self.parsed_graphs[sentence])
         logging.debug(f"mapping triplet to {graph=}")
         pred_subgraph = (
             graph.subgraph(triplet.pred, handle_unconnected="shortest_path")
@@ -409,58 +589,79 @@ class GraphBasedExtractor(Extractor):
         if triplet_matchers is None:
             triplet_matchers = self.triplet_matchers
 
-        for (
-            triplet_matcher,
-            arg_root_indices,
-            inferred_node_indices,
-            patt_graph,
-        ), freq in triplet_matchers.most_common():
-
-            triplet_cands = set(
-                indices
-                for indices in self._match(triplet_matcher, sen_graph, attrs=("upos",))
+        for matcher_key, freq in triplet_matchers.most_common():
+            stopped = yield from self._gen_pattern_triplets(
+                sen,
+                sen_graph,
+                pred_cands,
+                arg_roots_to_arg_cands,
+                include_partial,
+                *matcher_key,
             )
-            for triplet_cand, triplet_graph in triplet_cands:
-                inferred_nodes = set(
-                    triplet_graph.nodes_by_lextop(inferred_node_indices)
-                )
-                arg_roots = triplet_graph.nodes_by_lextop(arg_root_indices)
-                logging.debug("==========================")
-                logging.debug(f"{triplet_cand=}")
-                logging.debug(f"{triplet_graph=}")
-                logging.debug(f"{inferred_nodes=}")
-                logging.debug(f"{arg_roots=}")
-                for pred_cand in pred_cands:
-                    if not pred_cand.issubset(triplet_cand):
-                        return
-                    covered_args = triplet_cand - pred_cand - inferred_nodes
-                    args = [
-                        sorted(arg_roots_to_arg_cands[arg_root][0])
-                        if arg_root in covered_args
-                        else None
-                        for arg_root in arg_roots
-                    ]
-                    partial = any(arg is None for arg in args)
-                    if partial and not include_partial:
-                        continue
-                    triplet = Triplet(pred_cand, args, toks=sen_graph.tokens)
-                    try:
-                        mapped_triplet = self.map_triplet(triplet, sen)
-                        logging.info(f"inferring this triplet: {triplet}")
-                        logging.info(
-                            f"based on this pattern: {patt_graph.to_penman(name_attr='name|upos')}"
-                        )
-                        logging.info(
-                            f"sentences with this pattern: {self.patterns_to_sens[patt_graph]}"
-                        )
-                        yield sen, mapped_triplet
-                    except (
-                        KeyError,
-                        nx.exception.NetworkXPointlessConcept,
-                    ):
-                        logging.error(f"error mapping triplet: {triplet=}, {sen=}")
-                        logging.error(traceback.format_exc())
-                        logging.error("skipping")
+            if stopped:
+                return
+
+    def _gen_pattern_triplets(
+        self,
+        sen,
+        sen_graph,
+        pred_cands,
+        arg_roots_to_arg_cands,
+        include_partial,
+        triplet_matcher,
+        arg_root_indices,
+        inferred_node_indices,
+        patt_graph,
+    ):
+        """
+        Generate the triplets inferred by a single triplet pattern. Returns True if
+        inference must stop for the sentence, i.e. no later patterns are applied.
+        """
+        triplet_cands = set(
+            indices
+            for indices in self._match(triplet_matcher, sen_graph, attrs=("upos",))
+        )
+        for triplet_cand, triplet_graph in triplet_cands:
+            inferred_nodes = set(triplet_graph.nodes_by_lextop(inferred_node_indices))
+            arg_roots = triplet_graph.nodes_by_lextop(arg_root_indices)
+            logging.debug("==========================")
+            logging.debug(f"{triplet_cand=}")
+            logging.debug(f"{triplet_graph=}")
+            logging.debug(f"{inferred_nodes=}")
+            logging.debug(f"{arg_roots=}")
+            for pred_cand in pred_cands:
+                if not pred_cand.issubset(triplet_cand):
+                    return True
+                covered_args = triplet_cand - pred_cand - inferred_nodes
+                args = [
+                    sorted(arg_roots_to_arg_cands[arg_root][0])
+                    if arg_root in covered_args
+                    else None
+                    for arg_root in arg_roots
+                ]
+                partial = any(arg is None for arg in args)
+                if partial and not include_partial:
+                    continue
+                triplet = Triplet(pred_cand, args, toks=sen_graph.tokens)
+                try:
+                    mapped_triplet = self.map_triplet(triplet, sen)
+                    logging.info(f"inferring this triplet: {triplet}")
+                    logging.info(
+                        f"based on this pattern: {patt_graph.to_penman(name_attr='name|upos')}"
+                    )
+                    logging.info(
+                        f"sentences with this pattern: {self.patterns_to_sens[patt_graph]}"
+                    )
+                    yield sen, mapped_triplet
+                except (
+                    KeyError,
+                    nx.exception.NetworkXPointlessConcept,
+                ):
+                    logging.error(f"error mapping triplet: {triplet=}, {sen=}")
+                    logging.error(traceback.format_exc())
+                    logging.error("skipping")
+
+        return False
 
     def _gen_raw_triplets_lexical(
         self, sen, sen_graph, pred_cands, arg_roots_to_arg_cands, include_partial
@@ -506,7 +707,9 @@ class GraphBasedExtractor(Extractor):
             )
 
     def _infer_triplets(self, text: str, lexical=False, include_partial=False):
-        for sen, sen_graph in self.parse_text(text):
+        for sen, graph in self.parse_text(text):
+            # matching needs the networkx graph, build it once per sentence
+            sen_graph = get_ud_graph(graph)
             logging.debug("==========================")
             logging.debug("==========================")
             logging.debug(f"{sen=}")
@@ -531,7 +734,9 @@ class GraphBasedExtractor(Extractor):
             )
 
     def infer_triplets(self, text: str, **kwargs) -> List[Triplet]:
-        triplets = sorted(set(triplet for sen, triplet in self._infer_triplets(text)))
+        triplets = sorted(
+            set(triplet for sen, _, triplet in self._infer_triplets_from_view(text))
+        )
         return triplets
 
 
@@ -1,4 +1,3 @@
-import itertools
 import logging
 from collections import defaultdict
 from typing import Any, Dict, List, Optional, Set, Tuple
@@ -11,7 +10,12 @@ from graphbrain.learner.rule import Rule
 from newpotato.constants import NON_ATOM_WORDS, NON_WORD_ATOMS
 from newpotato.datatypes import Triplet
 from newpotato.extractors.extractor import Extractor
-from newpotato.extractors.graphbrain_parser import GraphbrainParserClient, GraphParse
+from newpotato.extractors.graphbrain_parser import (
+    GraphbrainParserClient,
+    GraphParse,
+    get_atom_index,
+    get_shortest_span,
+)
 
 
 def edge2toks(edge: Hyperedge, graph: Dict[str, Any]):
@@ -31,35 +35,27 @@ def edge2toks(edge: Hyperedge, graph: Dict[str, Any]):
     logging.debug(f"edge2toks\n{edge=}\n{graph=}")
 
     toks = set()
-    strs_to_atoms = defaultdict(list)
-    for atom, word in graph["atom2word"].items():
-        strs_to_atoms[atom.to_str()].append(atom)
+    atom_index = get_atom_index(graph)
 
     to_disambiguate = []
     for atom in edge.all_atoms():
         atom_str = atom.to_str()
-        if atom_str not in strs_to_atoms:
+        if atom_str not in atom_index:
             assert (
                 str(atom) in NON_WORD_ATOMS
-            ), f"no token corresponding to {atom=} in {strs_to_atoms=}"
+            ), f"no token corresponding to {atom=} in {atom_index=}"
         else:
-            cands = strs_to_atoms[atom_str]
+            cands = atom_index[atom_str]
             if len(cands) == 1:
-                toks.add(graph["atom2word"][cands[0]][1])
+                toks.add(cands[0])
             else:
-                to_disambiguate.append([graph["atom2word"][cand][1] for cand in cands])
+                to_disambiguate.append(cands)
 
     if len(to_disambiguate) > 0:
         logging.debug(f"edge2toks disambiguation needed: {toks=}, {to_disambiguate=}")
-        hyp_sets = []
-        for cand in itertools.product(*to_disambiguate):
-            hyp_toks = sorted(toks | set(cand))
-            hyp_length = hyp_toks[-1] - hyp_toks[0]
-            hyp_sets.append((hyp_length, hyp_toks))
-
-        shortest_hyp = sorted(hyp_sets)[0][1]
+        shortest_hyp = get_shortest_span(toks, to_disambiguate)
         logging.debug(f"{shortest_hyp=}")
-        return set(shortest_hyp)
+        return shortest_hyp
 
     return tuple(sorted(toks))
 
@@ -1,30 +1,62 @@
 import json
 import logging
+import math
 import os
-import re
 import time
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict
 from difflib import SequenceMatcher
-from itertools import islice, product
-from typing import Any, Dict, List, Optional, Set, Tuple
+from functools import lru_cache
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
-from graphbrain.hyperedge import Hyperedge, hedge
+from graphbrain.hyperedge import Atom, Hyperedge, hedge
+from graphbrain.patterns.properties import is_fun_pattern, is_wildcard
 
 # from graphbrain.patterns.oie_evaluation import information_extraction
 from tqdm import tqdm
 from tuw_nlp.text.utils import gen_tsv_sens
 
 from newpotato.constants import NON_ATOM_WORDS, NON_WORD_ATOMS
-from newpotato.datatypes import Triplet
+from newpotato.datatypes import SentenceFeatures, Triplet
 from newpotato.extractors.extractor import Extractor
-from newpotato.extractors.graphbrain_parser import GraphbrainParserClient, GraphParse
+from newpotato.extractors.graphbrain_parser import (
+    GraphbrainParserClient,
+    GraphParse,
+    get_atom_index,
+    get_shortest_span,
+)
 from newpotato.modifications.oie_evaluation import (
     apply_curly_brackets,
     apply_variables,
     information_extraction,
 )
-from newpotato.modifications.pattern_ops import all_variables, contains_variable
+from newpotato.modifications.pattern_index import (
+    PatternIndex,
+    PatternStats,
+    could_match,
+    order_by_precision,
+)
+from newpotato.modifications.pattern_ops import (
+    all_variables,
+    contains_variable,
+    is_variable,
+)
 from newpotato.modifications.patterns import match_pattern
+from newpotato.timing import StageTimer
 
 # from graphbrain.patterns import (
 #     all_variables,
@@ -51,48 +83,27 @@ def edge2toks(edge: Hyperedge, graph: Dict[str, Any]):
     logging.debug(f"edge2toks\n{edge=}\n{graph=}")
 
     toks = set()
-    strs_to_atoms = defaultdict(list)
-    for atom, word in graph["atom2word"].items():
-        strs_to_atoms[atom.to_str()].append(atom)
+    atom_index = get_atom_index(graph)
 
     to_disambiguate = []
     for atom in edge.all_atoms():
         atom_str = atom.to_str()
-        if atom_str not in strs_to_atoms:
+        if atom_str not in atom_index:
             assert (
                 str(atom) in NON_WORD_ATOMS
-            ), f"no token corresponding to {atom=} in {strs_to_atoms=}"
+            ), f"no token corresponding to {atom=} in {atom_index=}"
         else:
-            cands = strs_to_atoms[atom_str]
+            cands = atom_index[atom_str]
             if len(cands) == 1:
-                toks.add(graph["atom2word"][cands[0]][1])
+                toks.add(cands[0])
             else:
-                to_disambiguate.append([graph["atom2word"][cand][1] for cand in cands])
+                to_disambiguate.append(cands)
 
-    # added solution for CPU memory issue with sorting (too many combinations)
     if len(to_disambiguate) > 0:
         logging.debug(f"edge2toks disambiguation needed: {toks=}, {to_disambiguate=}")
-        # check number of combinations
-        total_combinations = 1
-        for lst in to_disambiguate:
-            total_combinations *= len(lst)
-
-        # skip computation if combinations exceed threshold
-        COMBINATIONS_THRESHOLD = 10_000_000
-        if total_combinations > COMBINATIONS_THRESHOLD:
-            logging.error(f"too many combinations: {total_combinations}")
-            logging.error("skipping")
-            return set()
-
-        hyp_sets = []
-        for cand in product(*to_disambiguate):
-            hyp_toks = sorted(toks | set(cand))
-            hyp_length = hyp_toks[-1] - hyp_toks[0]
-            hyp_sets.append((hyp_length, hyp_toks))
-
-        shortest_hyp = sorted(hyp_sets)[0][1]
+        shortest_hyp = get_shortest_span(toks, to_disambiguate)
         logging.debug(f"{shortest_hyp=}")
-        return set(shortest_hyp)
+        return shortest_hyp
 
     return tuple(sorted(toks))
 
@@ -128,44 +139,93 @@ class UnmappableTripletError(Exception):
     pass
 
 
+class EdgeCoverage:
+    """A class to hold the tokens covered by each subedge of a sentence's main edge.
+
+    Built in one bottom-up pass per sentence and tokenization, so that toks2subedge
+    can find the subedges covering a set of tokens with bitset operations instead of
+    recursing into every subedge. Atom labels are resolved to words only once, including
+    the lookup of hyphenated tokens.
+
+    Subedges are identified by object id, the main edge is kept so that ids stay valid.
+    """
+
+    def __init__(self, edge: Hyperedge, words_to_i: Dict[str, Set[int]]):
+        self.edge = edge
+        self.words_to_i = words_to_i
+        self.words = {}
+        self.bits = {}
+        self.atom_toks = {}
+        self.get_bits(edge)
+
+    def _get_word(self, label: str) -> Optional[str]:
+        if label not in self.words:
+            lowered_word = label.lower()
+            # added this if clause to handle hyphenated tokens
+            if lowered_word not in self.words_to_i:
+                cands = [key for key in self.words_to_i if lowered_word in key]
+                if len(cands) == 1:
+                    lowered_word = cands[0]
+                else:
+                    logging.debug(
+                        f"no token corresponding to edge label {lowered_word} and it is not listed as a non-word atom"
+                    )
+                    lowered_word = None
+            self.words[label] = lowered_word
+        return self.words[label]
+
+    def get_bits(self, edge: Hyperedge) -> int:
+        """
+        Get the tokens covered by a subedge as a bitset.
+        """
+        bits = self.bits.get(id(edge))
+        if bits is None:
+            bits = 0
+            if edge.atom:
+                word = self._get_word(edge.label())
+                toks = set() if word is None else self.words_to_i[word]
+                self.atom_toks[id(edge)] = (word, toks)
+                for tok in toks:
+                    bits |= 1 << tok
+            else:
+                for subedge in edge:
+                    bits |= self.get_bits(subedge)
+            self.bits[id(edge)] = bits
+        return bits
+
+    def get_atom_toks(self, atom: Hyperedge) -> Tuple[Optional[str], Set[int]]:
+        """
+        Get the word of an atom and the tokens of the word.
+        """
+        self.get_bits(atom)
+        return self.atom_toks[id(atom)]
+
+
 def _toks2subedge(
     edge: Hyperedge,
-    toks_to_cover: Tuple[int],
-    all_toks: Tuple[int],
-    words_to_i: Dict[str, Set[int]],
-) -> Tuple[Hyperedge, Set[str], Set]:
+    toks_to_cover: Set[int],
+    cover_bits: int,
+    coverage: EdgeCoverage,
+) -> Tuple[Hyperedge, Set[int], Set[int]]:
     """
     recursive helper function of toks2subedge
 
     Args:
         edge (Hyperedge): the Graphbrain Hyperedge in which to look for the subedge
-        words (tuple): the tokens to be covered by the subedge
-        all_toks (tuple): all tokens in the sentence
-        words_to_i (dict): words mapped to token indices
+        toks_to_cover (set): the tokens to be covered by the subedge
+        cover_bits (int): the same tokens as a bitset
+        coverage (EdgeCoverage): the tokens covered by each subedge of the sentence
 
     Returns:
         Hyperedge: the best matching subedge
         set: tokens covered by the matching hyperedge
         set: additional tokens in the matching hyperedge
     """
-    words_to_cover = [all_toks[i] for i in toks_to_cover]
-    logging.debug(f"_toks2subedge got: {edge=}, {words_to_cover=}")
     if edge.is_atom():
-        lowered_word = edge.label().lower()
-        # added this if clause to handle hyphenated tokens
-        if lowered_word not in words_to_i:
-            logging.debug(f"{lowered_word=}, {words_to_i=}")
-            cands = [key for key in words_to_i if lowered_word in key]
-            if len(cands) == 1:
-                lowered_word = cands[0]
-            else:
-                logging.debug(
-                    f"no token corresponding to edge label {lowered_word} and it is not listed as a non-word atom"
-                )
-                logging.debug(f"return empty sets")
-                return edge, set(), set()
+        lowered_word, toks = coverage.get_atom_toks(edge)
+        if lowered_word is None:
+            return edge, set(), set()
 
-        toks = words_to_i[lowered_word]
         relevant_toks = toks & toks_to_cover
         if len(relevant_toks) > 0:
             return edge, relevant_toks, set()
@@ -175,37 +235,33 @@ def _toks2subedge(
             else:
                 return edge, set(), toks
 
+    for subedge in edge:
+        if coverage.get_bits(subedge) & cover_bits == cover_bits:
+            # a subedge covering everything, search can stop
+            return _toks2subedge(subedge, toks_to_cover, cover_bits, coverage)
+
     relevant_toks, irrelevant_toks = set(), set()
     subedges_to_keep = []
     for i, subedge in enumerate(edge):
-        s_edge, subedge_relevant_toks, subedge_irrelevant_toks = _toks2subedge(
-            subedge, toks_to_cover, all_toks, words_to_i
-        )
-        if subedge_relevant_toks == toks_to_cover:
-            # a subedge covering everything, search can stop
-            logging.debug(
-                f"_toks2subedge: subedge covers everything, returning {s_edge=}, {subedge_relevant_toks=}, {subedge_irrelevant_toks=}"
-            )
-            return s_edge, subedge_relevant_toks, subedge_irrelevant_toks
-
-        if len(subedge_relevant_toks) > 0 or (i == 0 and subedge.atom):
+        if coverage.get_bits(subedge) & cover_bits or (i == 0 and subedge.atom):
             # the first subedge must be kept, to connect the rest (unless it is not atomic)
+            s_edge, subedge_relevant_toks, subedge_irrelevant_toks = _toks2subedge(
+                subedge, toks_to_cover, cover_bits, coverage
+            )
             subedges_to_keep.append(s_edge)
             relevant_toks |= subedge_relevant_toks
             irrelevant_toks |= subedge_irrelevant_toks
 
     if len(relevant_toks) == 0:
         # no words covered
-        logging.debug(
-            f"_toks2subedge: no words covered, returning {edge=}, {relevant_toks=}, {irrelevant_toks=}"
-        )
+        return edge, relevant_toks, irrelevant_toks
+    elif len(subedges_to_keep) == len(edge) and all(
+        s_edge is subedge for s_edge, subedge in zip(subedges_to_keep, edge)
+    ):
+        # nothing pruned
         return edge, relevant_toks, irrelevant_toks
     else:
-        pruned_edge = hedge(subedges_to_keep)
-        logging.debug(
-            f"_toks2subedge: returning {pruned_edge=}, {relevant_toks=}, {irrelevant_toks=}"
-        )
-        return pruned_edge, relevant_toks, irrelevant_toks
+        return hedge(subedges_to_keep), relevant_toks, irrelevant_toks
 
 
 def toks2subedge(
@@ -213,6 +269,7 @@ def toks2subedge(
     toks: Tuple[int],
     all_toks: Tuple[int],
     words_to_i: Dict[str, Set[int]],
+    coverage: Optional[EdgeCoverage] = None,
 ) -> Hyperedge:
     """
     find subedge in edge corresponding to the phrase in text.
@@ -224,6 +281,8 @@ def toks2subedge(
     Args:
         edge (Hyperedge): the Graphbrain Hyperedge in which to look for the subedge
         words (set): the words to be covered by the subedge
+        coverage (EdgeCoverage): the tokens covered by the subedges of edge, pass it
+            when mapping more than one set of tokens in the same sentence
 
     Returns:
         Hyperedge: the best matching hyperedge
@@ -236,8 +295,13 @@ def toks2subedge(
     except IndexError:
         logging.warning(f"some token IDs out of range: {toks=}, {all_toks=}")
         raise UnmappableTripletError()
+    if coverage is None:
+        coverage = EdgeCoverage(edge, words_to_i)
+    cover_bits = 0
+    for tok in toks_to_cover:
+        cover_bits |= 1 << tok
     subedge, relevant_toks, irrelevant_toks = _toks2subedge(
-        edge, toks_to_cover, all_toks, words_to_i
+        edge, toks_to_cover, cover_bits, coverage
     )
     logging.debug(f"toks2subedge: {subedge=}, {relevant_toks=}, {irrelevant_toks=}")
 
@@ -263,6 +327,101 @@ def flatten_and_join_list(value):
     return value  # return non-list value as-is
 
 
+def annotate_edge(
+    main_edge: Hyperedge, triplet_variables: List[Dict[str, Any]]
+) -> Tuple[List[Hyperedge], int]:
+    """
+    Apply the variables of each annotated triplet to the main edge of a sentence.
+
+    Returns:
+        Tuple[List[Hyperedge], int]: the annotated hyperedges and the number of
+            triplets whose variables could not be applied
+    """
+    cases, skipped = [], 0
+    for triplet_vars in triplet_variables:
+        variables = {
+            key: hedge(flatten_and_join_list(value))
+            for key, value in triplet_vars.items()
+        }
+        logging.debug(f"{main_edge=}")
+        vedge = apply_variables(main_edge, variables)
+        logging.debug(f"{vedge=}")
+        if vedge is None:
+            logging.debug("failed to add annotations.")
+            logging.debug(f"{variables=}")
+            skipped += 1
+        else:
+            cases.append(vedge)
+
+    return cases, skipped
+
+
+def count_subpatterns(annotated_graphs: List[Hyperedge]) -> Counter:
+    """
+    Count the generalized subpatterns of the annotated hyperedges, before converting
+    them to patterns with curly brackets.
+    """
+    subpattern_counts = Counter()
+    for hyperedge in annotated_graphs:
+        logging.debug(f"{hyperedge=}")
+        vars = all_variables(hyperedge)
+        all_levels = get_levels(hyperedge, expand=False)
+        for level in all_levels:
+            logging.debug(f"{level=}")
+            pattern = generalize_edge(level)
+            if pattern is None:
+                logging.debug("skipping - no pattern")
+                continue
+            atoms = pattern.atoms()
+            roots = {atom.root() for atom in atoms if atom.root() != "*"}
+            # skip patterns with only two variables, e.g. (REL/P.{p} ARG0/C)
+            if len(roots) < 3:
+                logging.debug("skipping - not enough annotations")
+                continue
+            logging.debug(f"{pattern=}")
+            subpatterns = [subp for subp in pattern]
+            subpatterns.append(pattern)
+            for subp in subpatterns:
+                logging.debug(f"Pattern subedge: {subp}")
+                skip = check_pattern(subp, vars)
+                if not skip:
+                    # uncomment the next line for patterns without subtypes, argroles and namespaces
+                    # subp = subp.simplify(namespaces=False)
+                    logging.debug(f"count: {subp}")
+                    subpattern_counts[subp] += 1
+
+    return subpattern_counts
+
+
+def mine_shard(
+    cases: List[Tuple[Hyperedge, List[Dict[str, Any]]]],
+) -> Tuple[Counter, int, int]:
+    """
+    Count the subpatterns of a shard of annotated sentences, each given by its main
+    edge and the variables of its triplets. Runs in the worker processes of
+    GraphbrainExtractor.extract_rules.
+
+    Returns:
+        Tuple[Counter, int, int]: the partial counts of subpatterns, the number of
+            skipped triplets and the total number of triplets in the shard
+    """
+    annotated_graphs, skipped, total = [], 0, 0
+    for main_edge, triplet_variables in cases:
+        vedges, n_skipped = annotate_edge(main_edge, triplet_variables)
+        annotated_graphs += vedges
+        skipped += n_skipped
+        total += len(triplet_variables)
+
+    return count_subpatterns(annotated_graphs), skipped, total
+
+
+def get_stats_fn(patterns_fn: str) -> str:
+    """
+    Get the path of the pattern statistics saved along with a patterns file.
+    """
+    return os.path.splitext(patterns_fn)[0] + "_stats.json"
+
+
 class GraphbrainMappedTriplet(Triplet):
     def __init__(
         self, mapped_pred, mapped_args, toks=None, variables=None, sen_graph=None
@@ -304,6 +463,10 @@ class GraphbrainExtractor(Extractor):
         self.text_parser = GraphbrainParserClient(parser_url)
         self.spacy_vocab = self.text_parser.get_vocab()
         self.patterns = None
+        self.pattern_index = None
+        self.pattern_stats = {}
+        self.cascade_index = None
+        self.edge_coverages = {}
 
     @staticmethod
     def from_json(data: Dict[str, Any]):
@@ -327,20 +490,66 @@ class GraphbrainExtractor(Extractor):
         return data
 
     def save_patterns(self, fn: str):
+        """
+        Save the patterns to fn, one per line, and their statistics (see
+        update_pattern_stats) to <fn without extension>_stats.json if there are any.
+        """
         assert self.patterns is not None, "no rules available"
         with open(fn, "w") as f:
             for line in self.patterns:
                 f.write(f"{line}\n")
 
+        if self.pattern_stats:
+            with open(get_stats_fn(fn), "w") as f:
+                json.dump(
+                    [
+                        dict(
+                            pattern=str(pattern), **asdict(self.pattern_stats[pattern])
+                        )
+                        for pattern in self.patterns
+                        if pattern in self.pattern_stats
+                    ],
+                    f,
+                    indent=4,
+                )
+
+    def set_patterns(self, patterns: List[Any]):
+        """
+        Set the patterns of the extractor, parsing them into Hyperedges and indexing
+        them by their head only once. The statistics of earlier patterns are
+        cleared.
+        """
+        self.pattern_index = PatternIndex(patterns)
+        self.patterns = self.pattern_index.patterns
+        self.pattern_stats = {}
+        self.cascade_index = None
+
     def load_patterns(self, fn: str, N: int = 20):
+        """
+        Load the first N patterns of fn along with their statistics, if they were
+        saved by save_patterns. Without statistics, the cascade keeps the order of
+        the file.
+        """
         with open(fn, "r") as f:
-            self.patterns = list(islice(f, N))
+            self.set_patterns(islice(f, N))
 
         if len(self.patterns) < N:
             raise ValueError(
                 f"The file {fn} contains only {len(self.patterns)} patterns, but {N} were requested."
             )
 
+        stats_fn = get_stats_fn(fn)
+        if not os.path.exists(stats_fn):
+            logging.warning(f"no pattern statistics found in {stats_fn}")
+            return
+
+        patterns = set(self.patterns)
+        with open(stats_fn, "r") as f:
+            for entry in json.load(f):
+                pattern = hedge(entry.pop("pattern"))
+                if pattern in patterns:
+                    self.pattern_stats[pattern] = PatternStats(**entry)
+
     def _parse_text(self, text: str) -> List[GraphParse]:
         """
         Parse the given text.
@@ -363,52 +572,137 @@ class GraphbrainExtractor(Extractor):
             return 0
         return len(self.patterns)
 
-    def get_rules(self, text_to_triplets=None, top_n=20) -> List[Tuple]:
+    def get_rules(
+        self,
+        text_to_triplets=None,
+        top_n=20,
+        n_workers: int = 1,
+        chunk_size: Optional[int] = None,
+    ) -> List[Tuple]:
         """
         Get the top N rules.
         """
-        pc = self.extract_rules(text_to_triplets)
-        self.patterns = [key for key, _ in pc.most_common(top_n)]
+        pc = self.extract_rules(
+            text_to_triplets, n_workers=n_workers, chunk_size=chunk_size
+        )
+        self.set_patterns(key for key, _ in pc.most_common(top_n))
+        self.update_pattern_stats(text_to_triplets, support=pc)
         return [(key, cnt) for key, cnt in pc.most_common(top_n)]
 
-    def extract_rules(self, text_to_triplets=None) -> Counter:
+    def update_pattern_stats(
+        self,
+        text_to_triplets: Dict[str, List[Tuple[Triplet, bool]]],
+        support: Optional[Counter] = None,
+    ):
+        """
+        Match the patterns on annotated sentences, e.g. the training data or a dev
+        split, and count how many of their matches are positive annotated triplets.
+        The statistics determine the order of the pattern cascade (see get_cascade).
+
+        Args:
+            text_to_triplets (Dict[str, List[Tuple]]): The texts and corresponding triplets.
+            support (Optional[Counter]): The counts of the patterns during learning.
+        """
+        assert self.patterns is not None, "no rules available"
+        gold = {
+            text: [
+                {
+                    key: hedge(flatten_and_join_list(value))
+                    for key, value in triplet.variables.items()
+                }
+                for triplet, positive in triplets
+                if positive and triplet.variables is not None
+            ]
+            for text, triplets in text_to_triplets.items()
+        }
+
+        self.pattern_stats = {}
+        for pattern in self.patterns:
+            stats = PatternStats(support=0 if support is None else support[pattern])
+            for text in self.candidate_sentences(pattern) & gold.keys():
+                for match in self._eval_rule(pattern, text, self.parsed_graphs[text]):
+                    stats.n_matches += 1
+                    stats.n_correct += match in gold[text]
+            self.pattern_stats[pattern] = stats
+        self.cascade_index = None
+
+    def get_cascade(self) -> List[Hyperedge]:
+        """
+        Get the patterns in the order in which they are matched when the number of
+        extractions is limited: by descending expected precision, then support.
+        """
+        assert self.patterns is not None, "no rules available"
+        if self.cascade_index is None:
+            self.cascade_index = PatternIndex(
+                order_by_precision(self.patterns, self.pattern_stats)
+            )
+        return self.cascade_index.patterns
+
+    def extract_rules(
+        self,
+        text_to_triplets=None,
+        n_workers: int = 1,
+        chunk_size: Optional[int] = None,
+    ) -> Counter:
         """
         Extract the rules from the annotated graphs.
+
+        With more than one worker, the annotated sentences are split into shards of
+        chunk_size sentences that are mined in a process pool. The partial counts are
+        merged in the order of the shards, so the result (including the order of
+        patterns with equal counts) is the same as with a single worker.
+
+        Args:
+            text_to_triplets (Dict[str, List[Tuple]]): The texts and corresponding triplets.
+            n_workers (int): The number of worker processes, 1 to mine serially.
+            chunk_size (Optional[int]): The number of sentences per shard, by default
+                the sentences are split into four shards per worker.
         """
         assert text_to_triplets is not None, "annotated sentences missing"
-        annotated_graphs = self.get_annotated_sentences(text_to_triplets)
-        patterns = Counter()
+        if n_workers > 1:
+            subpattern_counts, skipped, total = self._mine_in_parallel(
+                text_to_triplets, n_workers, chunk_size
+            )
+            print(f"{skipped=}, {total=}")
+        else:
+            annotated_graphs = self.get_annotated_sentences(text_to_triplets)
+            subpattern_counts = count_subpatterns(annotated_graphs)
 
-        for hyperedge in annotated_graphs:
-            logging.debug(f"{hyperedge=}")
-            vars = all_variables(hyperedge)
-            all_levels = get_levels(hyperedge, expand=False)
-            for level in all_levels:
-                logging.debug(f"{level=}")
-                pattern = generalize_edge(level)
-                if pattern is None:
-                    logging.debug("skipping - no pattern")
-                    continue
-                atoms = pattern.atoms()
-                roots = {atom.root() for atom in atoms if atom.root() != "*"}
-                # skip patterns with only two variables, e.g. (REL/P.{p} ARG0/C)
-                if len(roots) < 3:
-                    logging.debug("skipping - not enough annotations")
-                    continue
-                logging.debug(f"{pattern=}")
-                subpatterns = [subp for subp in pattern]
-                subpatterns.append(pattern)
-                for subp in subpatterns:
-                    logging.debug(f"Pattern subedge: {subp}")
-                    skip = check_pattern(subp, vars)
-                    if not skip:
-                        # uncomment the next line for patterns without subtypes, argroles and namespaces
-                        # subp = subp.simplify(namespaces=False)
-                        logging.debug(f"count: {subp}")
-                        patterns[hedge(apply_curly_brackets(subp))] += 1
+        # the same subpatterns come up in many cases, convert each of them only once
+        patterns = Counter()
+        for subp, count in subpattern_counts.items():
+            patterns[hedge(apply_curly_brackets(subp))] += count
 
         return patterns
 
+    def _mine_in_parallel(
+        self,
+        text_to_triplets: Dict[str, List[Triplet]],
+        n_workers: int,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[Counter, int, int]:
+        cases = [
+            (
+                self.parsed_graphs[text]["main_edge"],
+                [triplet.variables for triplet, _ in triplets],
+            )
+            for text, triplets in text_to_triplets.items()
+        ]
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(cases) / (4 * n_workers)))
+        shards = [cases[i : i + chunk_size] for i in range(0, len(cases), chunk_size)]
+
+        subpattern_counts = Counter()
+        skipped, total = 0, 0
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # map returns the partial results in the order of the shards
+            for counts, shard_skipped, shard_total in executor.map(mine_shard, shards):
+                subpattern_counts.update(counts)
+                skipped += shard_skipped
+                total += shard_total
+
+        return subpattern_counts, skipped, total
+
     def get_annotated_sentences(
         self,
         text_to_triplets: Dict[str, List[Triplet]],
@@ -426,33 +720,26 @@ class GraphbrainExtractor(Extractor):
         total, skipped = 0, 0
         for text, triplets in text_to_triplets.items():
             graph = self.parsed_graphs[text]
-            main_edge = graph["main_edge"]
-            for triplet, positive in triplets:
-                total += 1
-                variables = {
-                    key: hedge(flatten_and_join_list(value))
-                    for key, value in triplet.variables.items()
-                }
-                logging.debug(f"{main_edge=}")
-                vedge = apply_variables(main_edge, variables)
-                logging.debug(f"{vedge=}")
-                if vedge is None:
-                    logging.debug("failed to add annotations.")
-                    logging.debug(f"{variables=}")
-                    skipped += 1
-                    continue
-                else:
-                    cases.append(vedge)
+            vedges, n_skipped = annotate_edge(
+                graph["main_edge"], [triplet.variables for triplet, _ in triplets]
+            )
+            cases += vedges
+            total += len(triplets)
+            skipped += n_skipped
 
         print(f"{skipped=}, {total=}")
         return cases
 
-    def classify(self, graph: Hyperedge) -> Tuple[List[Dict[str, Any]], List[str]]:
+    def classify(
+        self, graph: Hyperedge, max_extr: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
         """
-        Classify the graph.
+        Classify the graph. Patterns are matched in the order of the cascade, so with
+        max_extr only the patterns with the highest expected precision are matched.
 
         Args:
             graph (Hyperedge): The graph to classify.
+            max_extr (Optional[int]): Stop matching after this many matches.
 
         Returns:
             Tuple[List[Dict[str, Any]], List[str]]: The matches and the rules triggered.
@@ -460,8 +747,16 @@ class GraphbrainExtractor(Extractor):
         matches = []
         rules_triggered = []
 
+        if self.patterns is None:
+            return matches, rules_triggered
+
+        self.get_cascade()
         try:
-            for pattern in self.patterns:
+            # the patterns are matched with the fork's match_pattern, not with
+            # compile_pattern, which implements upstream graphbrain's semantics
+            for pattern in self.cascade_index.get_patterns(graph):
+                if max_extr is not None and len(matches) >= max_extr:
+                    break
                 for match in match_pattern(graph, pattern):
                     if match == {}:
                         continue
@@ -469,6 +764,8 @@ class GraphbrainExtractor(Extractor):
                         matches.append(match)
                         rules_triggered.append(pattern)
                         # TODO: eventually save rule ids triggered
+                        if max_extr is not None and len(matches) >= max_extr:
+                            break
             logging.debug(f"{self.patterns=}")
             logging.debug(f"{rules_triggered=}")
         except AttributeError as err:
@@ -477,11 +774,93 @@ class GraphbrainExtractor(Extractor):
 
         return matches, rules_triggered
 
+    def _get_features(self, graph: GraphParse) -> SentenceFeatures:
+        spacy_sentence = graph["spacy_sentence"]
+        return SentenceFeatures(
+            [tok.text for tok in spacy_sentence], [tok.lemma_ for tok in spacy_sentence]
+        )
+
+    def _get_index_features(self, graph: GraphParse) -> Set[Hashable]:
+        features = set()
+        for atom in graph["main_edge"].atoms():
+            features.add(("root", atom.root()))
+            role = atom.role()
+            if len(role) > 1:
+                features.update(("argrole", argrole) for argrole in role[1])
+        return features
+
+    def _get_pattern_features(self, pattern, **kwargs) -> Set[Hashable]:
+        """
+        Get the features that the main edge of a sentence must contain for the
+        pattern to match it: the roots of all atoms that are not wildcards or
+        variables and the argument roles required by unordered argroles (e.g. the s
+        and o of REL/P.{so}). Arguments of functional patterns other than var are
+        ignored.
+        """
+        if isinstance(pattern, str):
+            pattern = hedge(pattern.strip())
+        if pattern.atom:
+            if pattern.parens:
+                return set()
+            features = set() if is_wildcard(pattern) else {("root", pattern.root())}
+            role = pattern.role()
+            if len(role) > 1 and role[0][0] in {"B", "P"} and role[1].startswith("{"):
+                posroles = role[1].split("-")[0][1:-1].split(",")[0]
+                features.update(("argrole", argrole) for argrole in posroles)
+            return features
+        if is_fun_pattern(pattern):
+            if pattern[0].root() == "var":
+                return self._get_pattern_features(pattern[1])
+            return set()
+        return set().union(*(self._get_pattern_features(item) for item in pattern))
+
+    def _match_rule(self, pattern, graph: GraphParse, **kwargs) -> List[Dict]:
+        return [
+            match for match in match_pattern(graph["main_edge"], pattern) if match != {}
+        ]
+
+    def get_rule_keys(self) -> List[str]:
+        return [] if self.patterns is None else list(self.patterns)
+
+    def _eval_rule(self, rule, sen, graph: GraphParse) -> List[Dict]:
+        if not could_match(rule, graph["main_edge"]):
+            return []
+        try:
+            return self._match_rule(rule, graph)
+        except AttributeError as err:
+            logging.error(f"Graphbrain matcher threw exception:\n{err}")
+            return []
+
+    def classify_sentence(self, sen: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Same as classify for the main edge of a parsed sentence, but reads matches from
+        the materialized view, so that only rules added since the last call are run.
+
+        Args:
+            sen (str): The sentence to classify.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], List[str]]: The matches and the rules triggered.
+        """
+        matches = []
+        rules_triggered = []
+        for pattern, pattern_matches in self.get_view(sen):
+            matches += pattern_matches
+            rules_triggered += [pattern] * len(pattern_matches)
+
+        return matches, rules_triggered
+
     def get_tokens(self, text: str) -> List[str]:
         """
         Get the tokens of the given text.
         """
-        return [tok.text for tok in self.parsed_graphs[text]["spacy_sentence"]]
+        return self.get_features(text).tokens
+
+    def get_lemmas(self, text: str) -> List[str]:
+        """
+        Get the lemmas of the given text.
+        """
+        return self.get_features(text).lemmas
 
     def add_text_to_graphs(self, text: str) -> None:
         """Add the given text to the graphs.
@@ -494,20 +873,24 @@ class GraphbrainExtractor(Extractor):
         """
         self.get_graphs(text)
 
-    def match_rules(self, text: str) -> List[Dict]:
+    def match_rules(self, text: str, max_extr: Optional[int] = None) -> List[Dict]:
         """
         match rules against sentence by passing the sentence's graph to the extractor
 
         Args:
             text (str): the sentence to be matched against
+            max_extr (Optional[int]): the maximum number of matches per sentence, if
+                given the pattern cascade is matched instead of reading the view
 
         Returns:
             List[Dict] a list of hypergraphs corresponding to the matches
         """
         all_matches = []
         for sen, graph in self.get_graphs(text).items():
-            main_graph = graph["main_edge"]
-            matches, _ = self.classify(main_graph)
+            if max_extr is None:
+                matches, _ = self.classify_sentence(sen)
+            else:
+                matches, _ = self.classify(graph["main_edge"], max_extr=max_extr)
             all_matches += matches
         return all_matches
 
@@ -527,17 +910,15 @@ class GraphbrainExtractor(Extractor):
 
         graphs = self.get_graphs(text)
         matches_by_text = {
-            graph["text"]: {"matches": [], "rules_triggered": [], "triplets": []}
-            for graph in graphs
+            sen: {"matches": [], "rules_triggered": [], "triplets": []}
+            for sen in graphs
         }
 
-        for graph in graphs:
-            matches, rules_triggered = self.classify(graph["main_edge"])
+        for sen, graph in graphs.items():
+            matches, rules_triggered = self.classify_sentence(sen)
             logging.info(f"matches: {matches}")
             triplets = matches2triplets(matches, graph)
-            mapped_triplets = [
-                self.map_triplet(triplet, graph["text"]) for triplet in triplets
-            ]
+            mapped_triplets = [self.map_triplet(triplet, sen) for triplet in triplets]
             logging.info(f"triplets: {mapped_triplets}")
 
             if convert_to_text:
@@ -545,18 +926,19 @@ class GraphbrainExtractor(Extractor):
                     {k: v.label() for k, v in match.items()} for match in matches
                 ]
 
-            matches_by_text[graph["text"]]["matches"] = matches
-            matches_by_text[graph["text"]]["rules_triggered"] = rules_triggered
-            matches_by_text[graph["text"]]["triplets"] = mapped_triplets
+            matches_by_text[sen]["matches"] = matches
+            matches_by_text[sen]["rules_triggered"] = rules_triggered
+            matches_by_text[sen]["triplets"] = mapped_triplets
 
         return matches_by_text
 
-    def infer_triplets(self, sen: str) -> List[Triplet]:
+    def infer_triplets(self, sen: str, max_extr: Optional[int] = None) -> List[Triplet]:
         """
         match rules against sentence and return triplets corresponding to the matches
 
         Args:
             sen (str): the sentence to perform inference on
+            max_extr (Optional[int]): the maximum number of matches
 
         Returns:
             List[Triple]: list of triplets inferred
@@ -566,7 +948,7 @@ class GraphbrainExtractor(Extractor):
         logging.debug(f'inferring triplets for: "{sen}"')
         graph = self.parsed_graphs[sen]
         logging.debug(f'graph: "{graph}"')
-        matches = self.match_rules(sen)
+        matches = self.match_rules(sen, max_extr=max_extr)
         logging.debug(f'matches: "{matches}"')
         triplets = matches2triplets(matches, graph)
         logging.debug(f'triplets: "{triplets}"')
@@ -576,23 +958,42 @@ class GraphbrainExtractor(Extractor):
 
         return triplets
 
-    def map_to_subgraphs(self, triplet, sen_graph, strict=True):
+    def get_edge_coverage(
+        self,
+        sentence: str,
+        edge: Hyperedge,
+        all_toks: Tuple[str, ...],
+        words_to_i: Dict[str, Set[int]],
+    ) -> EdgeCoverage:
+        """
+        Get the token coverage of the subedges of a sentence's main edge, built once
+        per sentence (and tokenization of it).
+        """
+        cached = self.edge_coverages.get(sentence)
+        if cached is None or cached[0] is not edge or cached[1] != all_toks:
+            cached = edge, all_toks, EdgeCoverage(edge, words_to_i)
+            self.edge_coverages[sentence] = cached
+        return cached[2]
+
+    def map_to_subgraphs(self, triplet, sen_graph, strict=True, sentence=None):
         """
         helper function for map_triplet
         """
         # tok.text for tok in sen_graph["spacy_sentence"]
         # misses punctuation marks -> shifted indices
         all_toks = tuple(triplet.toks)
-        words_to_i = defaultdict(set)
-        for i, word in enumerate(all_toks):
-            words_to_i[word.lower()].add(i)
+        if sentence is None:
+            sentence = sen_graph["text"]
+        # cached per sentence, LSOIE sentences are mapped once for each predicate
+        words_to_i = self.get_features(sentence).get_words_to_i(all_toks)
 
         edge = sen_graph["main_edge"]
+        coverage = self.get_edge_coverage(sentence, edge, all_toks, words_to_i)
         variables = {}
 
         if triplet.pred is not None:
             rel_edge, relevant_toks, exact_match = toks2subedge(
-                edge, triplet.pred, all_toks, words_to_i
+                edge, triplet.pred, all_toks, words_to_i, coverage
             )
             logging.debug(f"{rel_edge=}, {relevant_toks=}, {exact_match=}")
             if not exact_match and strict:
@@ -609,7 +1010,7 @@ class GraphbrainExtractor(Extractor):
         for i in range(len(triplet.args)):
             if triplet.args[i] is not None and len(triplet.args[i]) > 0:
                 arg_edge, relevant_toks, exact_match = toks2subedge(
-                    edge, triplet.args[i], all_toks, words_to_i
+                    edge, triplet.args[i], all_toks, words_to_i, coverage
                 )
                 logging.debug(f"{arg_edge=}, {relevant_toks=}, {exact_match=}")
                 if not exact_match and strict:
@@ -635,7 +1036,7 @@ class GraphbrainExtractor(Extractor):
         sen_graph = self.parsed_graphs[sentence]
         try:
             mapped_pred, mapped_args, variables = self.map_to_subgraphs(
-                triplet, sen_graph, strict=strict
+                triplet, sen_graph, strict=strict, sentence=sentence
             )
         except UnmappableTripletError:
             logging.warning(
@@ -648,217 +1049,355 @@ class GraphbrainExtractor(Extractor):
                 mapped_pred, tuple(mapped_args), toks, variables, sen_graph
             )
 
-    def generate_triplets_and_gold_data(self, input, max_extr):
-        start_time = time.time()
-        goldfile = input.split(".")[0] + "_gold.json"
-        extractions = {}
-        latencies = []
-        # skip gold data creation if gold data already available (and no parsing errors can occur)
-        if os.path.exists(goldfile):
-            with open(goldfile, "r") as gfile:
-                gold = json.load(gfile)
-
-                # loop through sentences
-                for key in gold.keys():
-                    for entry in gold[key]:
-                        sent_start_time = time.time()
-                        sentence, sen_idx = entry["sent"], entry["id"]
-                        text_to_graph = self.get_graphs(sentence, doc_id=str(sen_idx))
-                        graph = text_to_graph[sentence]["main_edge"]
-                        atom2word = text_to_graph[sentence]["atom2word"]
-                        logging.info("-" * 100)
-                        logging.info(f"START of information extraction for {sen_idx=}:")
-                        logging.info(f"{sen_idx=}, {sentence=}")
-                        logging.info(f"{graph=}")
-                        information_extraction(
-                            extractions,
-                            graph,
-                            sen_idx,
-                            atom2word,
-                            self.patterns,
-                            max_extr,
-                        )
-                        latency = time.time() - sent_start_time
-                        latencies.append(latency)
+    def extract_sentences(
+        self,
+        sentences: Iterable[Tuple[Any, str, Any]],
+        max_extr,
+        n_workers: int = 1,
+        shard_size: int = 100,
+        n_parse_workers: int = 8,
+        max_in_flight: Optional[int] = None,
+        ranked: bool = False,
+        extract_fn: Callable = information_extraction,
+    ) -> Iterator[Tuple[Any, str, Any, Optional[Dict], Dict[str, int]]]:
+        """
+        Parse sentences and run information extraction on them with the pattern
+        cascade, without storing the parses.
 
-        else:
-            # create dictionary with correctly ordered and named keys
-            name_mapping = {
-                "A0": "arg1",
-                "P": "rel",
-                "A1": "arg2",
-                "A2": "arg3",
-                "A3": "arg4",
-                "A4": "arg5",
-                "A5": "arg6",
-                "A6": "arg7",
-            }
+        With more than one worker, the sentences are split into shards of shard_size
+        consecutive sentences that are parsed and extracted in a process pool, each
+        worker with its own parser client. The results are returned in the order of
+        the sentences either way, so the output does not depend on n_workers.
 
-            with open(input) as stream:
-                total, skipped = 0, 0
-                last_sent = ""
-                sent_cnt = 0
-                rm_sen_idx = set()
-                gold_list = list()
-                no_obj_cnt = 0
-                start_time = time.time()
-                for sen_idx, sen in tqdm(enumerate(gen_tsv_sens(stream))):
-                    total += 1
-                    words = [t[1] for t in sen]
-                    sentence = " ".join(words)
-
-                    # prediction: infer triplets for new sentences
-
-                    # case 1: known sentence
-                    # save id for gold data creation -> add triplet to previous sentence ID
-                    # avoid double parsing/new entry in extractions for same sentence
-                    # remark: sen_idx skipped -> from 0 to xy with gaps
-                    if sentence == last_sent:
-                        sen_idx = last_id
-                    # case 2: new sentence
-                    else:
-                        last_sent = sentence
-                        last_id = sen_idx
-                        sent_cnt += 1
-                        skip = False
-
-                        # Step 1: add gold_dict to gold_list for previous sentence (but skip the very first)
-                        if total > 1:
-                            gold_dict = combine_args(gold_dict)
-                            gold_list.append(gold_dict)
-
-                        # Step 2: create new gold_dict for new sentence
-                        gold_dict = {
-                            "id": str(sen_idx),
-                            "sent": sentence,
-                            "tokens": words,
-                            "tuples": list(),
-                        }
-
-                        # Step 3: text parsing for new sentence (only if needed)
-                        text_to_graph = self.get_graphs(sentence, doc_id=str(sen_idx))
-                        if len(text_to_graph) > 1:
-                            logging.error(f"sentence split into two: {words}")
-                            logging.error(f"{sen_idx=}, {text_to_graph=}")
-                            logging.error("skipping")
-                            skipped += 1
-                            skip = True
-                            logging.error(f"{skipped=}, {total=}")
-                            # remove gold triplets for sentence as well
-                            rm_sen_idx.add(str(sen_idx))
-
-                        logging.debug(f"{sentence=}, {text_to_graph=}")
-
-                        # Step 4: generating triplets after conjunction decomposition (information_extraction)
-                        if not skip:
-                            sent_start_time = time.time()
-                            try:
-                                # rare problems with sentence modifications need this check
-                                graph = text_to_graph[sentence]["main_edge"]
-                            except KeyError:
-                                logging.error(f"sentence not found after parsing")
-                                logging.error(f"{sen_idx=}, {sentence=}")
-                                logging.error("skipping")
-                                skipped += 1
-                                logging.error(f"{skipped=}, {total=}")
-                                # remove gold triplets for sentence as well
-                                rm_sen_idx.add(str(sen_idx))
-                            else:
-                                atom2word = text_to_graph[sentence]["atom2word"]
-                                logging.info("-" * 100)
-                                logging.info(
-                                    f"START of information extraction for {sen_idx=}:"
-                                )
-                                logging.info(f"{sen_idx=}, {sentence=}")
-                                logging.info(f"{graph=}")
-                                information_extraction(
-                                    extractions,
-                                    graph,
-                                    sen_idx,
-                                    atom2word,
-                                    self.patterns,
-                                    max_extr,
-                                )
-                            latency = time.time() - sent_start_time
-                            latencies.append(latency)
-
-                    # Step 5: gold data creation
-                    # add multiple triplets to gold_dict for one sentence
-                    temp = {k: defaultdict(list) for k in name_mapping.keys()}
-                    for i, tok in enumerate(sen):
-                        label = tok[7].split("-")[0]
-                        if label == "O":
-                            continue
-                        # uncomment next elif clause if you want to ignore arg3+ annotations
-                        # elif label in ["A2", "A3", "A4", "A5", "A6"]:
-                        #     continue
-                        temp[label]["words"].append(tok[1])
-                        temp[label]["words_indexes"].append(i)
-
-                    # check if annotation misses objects (A1 and higher)
-                    if not temp["A1"]:
-                        logging.debug(f"skipping gold triplet without objects")
-                        logging.debug(f"{sen_idx=}, {temp=}")
-                        rm_sen_idx.add(str(sen_idx))
-                        no_obj_cnt += 1
-                        continue
+        Args:
+            sentences (Iterable[Tuple[Any, str, Any]]): the id and text of each
+                sentence and data that is passed through (e.g. its gold annotation)
+            max_extr: the maximum number of extractions per sentence
+            n_workers (int): the number of processes
+            shard_size (int): the number of sentences per shard
+            n_parse_workers (int): the number of threads sending requests to the
+                parser (per process)
+            max_in_flight (Optional[int]): the maximum number of pending parses
+                (per process)
+            ranked (bool): whether to record the rank of the pattern that produced
+                each extraction and the edge it matched (see
+                ranked_information_extraction)
+            extract_fn (Callable): the information extraction function, e.g.
+                newpotato.modifications.oie_patterns.information_extraction for
+                WiRe57, by default the one of oie_evaluation
+
+        Yields:
+            Tuple[Any, str, Any, Optional[Dict], Dict[str, int]]: the id, text and
+                data of each sentence, its extractions (None if the sentence cannot
+                be used) and the times of the parse, map and match stages in
+                nanoseconds
+        """
+        patterns = self.get_cascade()
+        ranks = None
+        if ranked:
+            # the rank of a pattern is its position in the patterns, i.e. by support
+            pattern_ranks = {pattern: i for i, pattern in enumerate(self.patterns)}
+            ranks = [pattern_ranks[pattern] for pattern in patterns]
+
+        if n_workers > 1:
+            yield from self._extract_in_parallel(
+                sentences,
+                patterns,
+                ranks,
+                max_extr,
+                n_workers,
+                shard_size,
+                n_parse_workers,
+                max_in_flight,
+                extract_fn,
+            )
+            return
+
+        items = (((sen_idx, data), sentence) for sen_idx, sentence, data in sentences)
+        parses = self.text_parser.parse_many(
+            items, n_workers=n_parse_workers, max_in_flight=max_in_flight
+        )
+        for (sen_idx, data), sentence, graphs, times in parses:
+            extractions, match_time = extract_from_parse(
+                sen_idx, sentence, graphs, patterns, max_extr, ranks, extract_fn
+            )
+            yield sen_idx, sentence, data, extractions, dict(times, match=match_time)
+
+    def _extract_in_parallel(
+        self,
+        sentences: Iterable[Tuple[Any, str, Any]],
+        patterns: List[Hyperedge],
+        ranks: Optional[List[int]],
+        max_extr,
+        n_workers: int,
+        shard_size: int,
+        n_parse_workers: int,
+        max_in_flight: Optional[int],
+        extract_fn: Callable,
+    ) -> Iterator[Tuple[Any, str, Any, Optional[Dict], Dict[str, int]]]:
+        sentences = iter(sentences)
+        pending = deque()
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=init_extraction_worker,
+            initargs=(
+                self.text_parser.url,
+                self.text_parser.vocab_path,
+                patterns,
+                max_extr,
+                ranks,
+                extract_fn,
+            ),
+        ) as executor:
+            while True:
+                shard = list(islice(sentences, shard_size))
+                if shard:
+                    texts = [(sen_idx, sentence) for sen_idx, sentence, _ in shard]
+                    future = executor.submit(
+                        extract_shard, texts, n_parse_workers, max_in_flight
+                    )
+                    pending.append((shard, future))
+                if not pending:
+                    break
+                # keep a bounded number of shards in flight, consume them in order
+                if shard and len(pending) < 2 * n_workers:
+                    continue
+                done, future = pending.popleft()
+                for (sen_idx, sentence, data), result in zip(done, future.result()):
+                    yield (sen_idx, sentence, data) + result
+
+    def generate_triplets_and_gold_data(
+        self,
+        input,
+        max_extr,
+        n_workers: int = 1,
+        shard_size: int = 100,
+        n_parse_workers: int = 8,
+        max_in_flight=None,
+        timer: Optional[StageTimer] = None,
+        ranked: bool = False,
+        extract_fn: Callable = information_extraction,
+    ):
+        """
+        Extract triplets from the sentences of an LSOIE TSV file and write them to
+        <input>_pred.jsonl, creating the gold data in <input>_gold.jsonl first if it
+        does not exist yet (otherwise the sentences are read from the gold data).
+        Both files have one {"id": ..., "tuples": [...]} object per line, in the
+        order of the sentences. Earlier versions wrote a single JSON object to
+        <input>_gold.json and <input>_pred.json instead; these are not reused, but
+        evaluate.wire_scorer can still score them.
+
+        The sentences are processed in a pipeline: they are read lazily, up to
+        max_in_flight sentences are sent to the parser by n_parse_workers threads
+        while earlier ones are extracted, and the gold and predicted triplets of each
+        sentence are written as soon as the sentence is done. Parses are not stored
+        in parsed_graphs, so memory use does not grow with the size of the file.
+        With more than one worker, shards of sentences are extracted in parallel
+        (see extract_sentences); the output files are the same as with one worker.
+
+        The time of each stage (parse, map, match, combine, serialize) is measured per
+        sentence and added to timer if one is given (see evaluate.benchmark).
+
+        If ranked is True, the extractions are written to <input>_ranked.jsonl
+        instead, with the rank of the pattern that produced them and the edge it
+        matched and without combining them, so that they can be filtered for any number of patterns
+        and extractions (see evaluate.sweep).
+
+        The triplets are extracted with extract_fn (see extract_sentences).
+
+        Returns:
+            Tuple[float, float, float]: raw triplets per second, evaluated (combined)
+                triplets per second and the average time in seconds that matching
+                the patterns takes per sentence; unlike in earlier versions, this
+                latency does not include parsing the sentence
+        """
+        goldfile = input.split(".")[0] + "_gold.jsonl"
+        predfile = input.split(".")[0] + ("_ranked.jsonl" if ranked else "_pred.jsonl")
+        create_gold = not os.path.exists(goldfile)
+
+        run = StageTimer()
+        total, skipped, sent_cnt, removed, no_obj_cnt = 0, 0, 0, 0, 0
+        with run.time_run(), ExitStack() as stack:
+            pred_f = stack.enter_context(open(predfile, "w", encoding="utf-8"))
+            if create_gold:
+                stream = stack.enter_context(open(input))
+                gold_f = stack.enter_context(open(goldfile, "w", encoding="utf-8"))
+                sentences = (
+                    (sen_idx, " ".join(words), blocks)
+                    for sen_idx, words, blocks in gen_lsoie_sentences(stream)
+                )
+            else:
+                gold = stack.enter_context(open(goldfile))
+                sentences = (
+                    (entry["id"], entry["sent"], None)
+                    for entry in map(json.loads, gold)
+                )
+
+            results = self.extract_sentences(
+                sentences,
+                max_extr,
+                n_workers=n_workers,
+                shard_size=shard_size,
+                n_parse_workers=n_parse_workers,
+                max_in_flight=max_in_flight,
+                ranked=ranked,
+                extract_fn=extract_fn,
+            )
+            for sen_idx, sentence, blocks, extractions, times in tqdm(results):
+                run.count("sentences")
+                if extractions is None:
+                    run.add_times({"parse": times["parse"], "map": times["map"]})
+                else:
+                    run.add_times(times)
+
+                # take biggest set of overlapping matches per sentence
+                combine_time, serialize_time = 0, 0
+                for k, v in (extractions or {}).items():
+                    start = time.perf_counter_ns()
+                    newv = v if ranked else combine_triplets(v)
+                    combine_time += time.perf_counter_ns() - start
+                    run.count("extractions", len(v))
+                    run.count("combined_extractions", len(newv))
+
+                    start = time.perf_counter_ns()
+                    pred_f.write(
+                        json.dumps({"id": str(k), "tuples": newv}, ensure_ascii=False)
+                        + "\n"
+                    )
+                    serialize_time += time.perf_counter_ns() - start
+
+                if extractions is not None:
+                    run.add("combine", combine_time)
+                if not create_gold:
+                    run.add("serialize", serialize_time)
+                    continue
+
+                sent_cnt += 1
+                total += len(blocks)
+                gold_dict, sen_no_obj_cnt = get_lsoie_gold_dict(
+                    sen_idx, sentence, blocks
+                )
+                no_obj_cnt += sen_no_obj_cnt
+                if extractions is None:
+                    skipped += 1
+                    logging.error(f"{skipped=}, {total=}")
+                # remove gold triplets of sentences with parsing errors or
+                # annotations without objects
+                if extractions is None or sen_no_obj_cnt > 0:
+                    removed += 1
+                    run.add("serialize", serialize_time)
+                    continue
 
-                    args_dict = {
-                        name_mapping.get(key, key): value
-                        for key, value in temp.items()
-                        if value
-                    }
-                    logging.debug(f"{sentence=}, {args_dict=}")
-                    gold_dict["tuples"].append(args_dict)
-
-                # add gold_dict to gold_list for very last sentence
-                gold_dict = combine_args(gold_dict)
-                gold_list.append(gold_dict)
-
-                # remove sentences
-                gold_list[:] = [d for d in gold_list if d["id"] not in rm_sen_idx]
-
-                # save gold dictionary to json file
-                save_dict = {input: gold_list}
-                with open(goldfile, "w", encoding="utf-8") as f:
-                    json.dump(save_dict, f, ensure_ascii=False, indent=4)
-
-                print(f"Original sentence count: {sent_cnt}")
-                print(f"Removed sentence count (due to parsing errors): {skipped}")
-                print(f"Removed sentence count (total): {len(rm_sen_idx)}")
-                print(f"Triplets without object count: {no_obj_cnt}")
-
-        # first extraction time measurement
-        extr_time = time.time() - start_time
-
-        # take biggest set of overlapping matches per sentence
-        filtered_extr = {}
-        filtered_extr_cnt = 0
-        extr_cnt = 0
-        for k, v in extractions.items():
-            extr_cnt += len(v)
-            newv = combine_triplets(v)
-            filtered_extr[k] = newv
-            filtered_extr_cnt += len(newv)
-            #
-            # filtered_extr[k] = v
-            # filtered_extr_cnt += len(v)
-
-        filtered_extr_time = time.time() - start_time
-
-        # save predictions to json file
-        output = input.split(".")[0] + "_pred.json"
-        with open(output, "w", encoding="utf-8") as f:
-            json.dump(filtered_extr, f, ensure_ascii=False, indent=4)
-
-        # efficiency metrics
-        raw_triplets_per_second = extr_cnt / extr_time
-        evaluated_triplets_per_second = filtered_extr_cnt / filtered_extr_time
-        avg_latency = sum(latencies) / len(latencies) if latencies else 0
+                start = time.perf_counter_ns()
+                gold_f.write(json.dumps(gold_dict, ensure_ascii=False) + "\n")
+                run.add("serialize", serialize_time + time.perf_counter_ns() - start)
+
+        if create_gold:
+            print(f"Original sentence count: {sent_cnt}")
+            print(f"Removed sentence count (due to parsing errors): {skipped}")
+            print(f"Removed sentence count (total): {removed}")
+            print(f"Triplets without object count: {no_obj_cnt}")
+
+        if timer is not None:
+            timer.update(run)
+
+        # efficiency metrics, the extraction time does not include combining the
+        # triplets
+        filtered_extr_time = run.wall_time * 1e-9
+        extr_time = filtered_extr_time - run.total("combine") * 1e-9
+        raw_triplets_per_second = run.counts["extractions"] / extr_time
+        evaluated_triplets_per_second = (
+            run.counts["combined_extractions"] / filtered_extr_time
+        )
+        avg_latency = run.mean("match") * 1e-9
 
         return raw_triplets_per_second, evaluated_triplets_per_second, avg_latency
 
 
+# names of the LSOIE labels in the gold data
+LSOIE_ARG_NAMES = {
+    "A0": "arg1",
+    "P": "rel",
+    "A1": "arg2",
+    "A2": "arg3",
+    "A3": "arg4",
+    "A4": "arg5",
+    "A5": "arg6",
+    "A6": "arg7",
+}
+
+
+def gen_lsoie_sentences(stream) -> Iterator[Tuple[int, List[str], List[List]]]:
+    """
+    Read the blocks of an LSOIE TSV file, one per annotated triplet, and group
+    consecutive blocks of the same sentence. A sentence gets the index of its first
+    block as its id.
+
+    Yields:
+        Tuple[int, List[str], List[List]]: the id, words and blocks of each sentence
+    """
+    sen_idx, sentence, words, blocks = None, None, None, []
+    for idx, block in enumerate(gen_tsv_sens(stream)):
+        block_words = [t[1] for t in block]
+        if blocks and " ".join(block_words) == sentence:
+            blocks.append(block)
+            continue
+        if blocks:
+            yield sen_idx, words, blocks
+        sen_idx, sentence, words, blocks = (
+            idx,
+            " ".join(block_words),
+            block_words,
+            [block],
+        )
+    if blocks:
+        yield sen_idx, words, blocks
+
+
+def get_lsoie_gold_dict(sen_idx, sentence: str, blocks: List[List]):
+    """
+    Create the gold dict of a sentence from its LSOIE blocks.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: the gold dict and the number of annotated
+            triplets without objects, which are left out
+    """
+    gold_dict = {
+        "id": str(sen_idx),
+        "sent": sentence,
+        "tokens": [t[1] for t in blocks[0]],
+        "tuples": list(),
+    }
+    no_obj_cnt = 0
+    for sen in blocks:
+        # add multiple triplets to gold_dict for one sentence
+        temp = {k: defaultdict(list) for k in LSOIE_ARG_NAMES.keys()}
+        for i, tok in enumerate(sen):
+            label = tok[7].split("-")[0]
+            if label == "O":
+                continue
+            # uncomment next elif clause if you want to ignore arg3+ annotations
+            # elif label in ["A2", "A3", "A4", "A5", "A6"]:
+            #     continue
+            temp[label]["words"].append(tok[1])
+            temp[label]["words_indexes"].append(i)
+
+        # check if annotation misses objects (A1 and higher)
+        if not temp["A1"]:
+            logging.debug(f"skipping gold triplet without objects")
+            logging.debug(f"{sen_idx=}, {temp=}")
+            no_obj_cnt += 1
+            continue
+
+        args_dict = {
+            LSOIE_ARG_NAMES.get(key, key): value for key, value in temp.items() if value
+        }
+        logging.debug(f"{sentence=}, {args_dict=}")
+        gold_dict["tuples"].append(args_dict)
+
+    return combine_args(gold_dict), no_obj_cnt
+
+
 # function to combine arg3-arg6 to "arg3+" and print gold tuples in the console
 def combine_args(gold_dict):
     keys_to_combine = ["arg3", "arg4", "arg5", "arg6", "arg7"]
@@ -893,9 +1432,225 @@ def combine_args(gold_dict):
     return gold_dict
 
 
+def ranked_information_extraction(
+    extractions,
+    graph,
+    sen_idx,
+    atom2word,
+    patterns,
+    max_extr,
+    ranks: List[int],
+    extract_fn: Callable = information_extraction,
+):
+    """
+    Same as extract_fn, but each extraction records the rank of the pattern that
+    produced it under "rank" and the edge that the pattern matched, as its position
+    in a pre-order traversal of the non-atomic edges of the graph, under "edge". This
+    is what evaluate.sweep.select_extractions needs to apply the cap of max_extr
+    extractions per edge to any subset of the patterns.
+
+    extract_fn is expected to match the patterns on every non-atomic edge of the
+    graph, an edge before its subedges and the patterns of an edge in their order,
+    and to limit the extractions of each edge to max_extr. Each pattern is run on
+    each edge on its own; the extractions of an edge itself are those of the edge
+    minus those of its subedges. Extractions are added by edge, then in the order of
+    the patterns, as extract_fn adds them.
+    """
+    # non-atomic edges in pre-order and the positions of their non-atomic subedges
+    edges, children = [], []
+
+    def add_edge(edge):
+        position = len(edges)
+        edges.append(edge)
+        children.append([])
+        for subedge in edge:
+            if subedge.not_atom:
+                children[position].append(add_edge(subedge))
+        return position
+
+    if graph.not_atom:
+        add_edge(graph)
+
+    by_edge = [[] for _ in edges]
+    for pattern, rank in zip(patterns, ranks):
+        # subedges come after their edge, so they are run first in reverse order
+        found = [None] * len(edges)
+        for position in reversed(range(len(edges))):
+            pattern_extractions = {}
+            extract_fn(
+                pattern_extractions,
+                edges[position],
+                sen_idx,
+                atom2word,
+                [pattern],
+                max_extr,
+            )
+            found[position] = [
+                (key, entry)
+                for key, entries in pattern_extractions.items()
+                for entry in entries
+            ]
+            own = list(found[position])
+            for child in children[position]:
+                for item in found[child]:
+                    if item in own:
+                        own.remove(item)
+            by_edge[position].extend(
+                (key, dict(entry, rank=rank, edge=position)) for key, entry in own
+            )
+
+    for items in by_edge:
+        for key, entry in items:
+            extractions.setdefault(key, []).append(entry)
+
+
+def extract_from_parse(
+    sen_idx,
+    sentence: str,
+    graphs: List[GraphParse],
+    patterns,
+    max_extr,
+    ranks: Optional[List[int]] = None,
+    extract_fn: Callable = information_extraction,
+) -> Tuple[Optional[Dict[str, List[Dict[str, Any]]]], int]:
+    """
+    Run information extraction with extract_fn on the parse of a sentence, with the
+    ranks of the patterns if they are given (see ranked_information_extraction).
+
+    Returns:
+        Tuple[Optional[Dict], int]: the extractions, None if the sentence cannot be
+            used (i.e. if it was split into two or modified by parsing), and the time
+            it took to extract them in nanoseconds
+    """
+    start = time.perf_counter_ns()
+    text_to_graph = {graph["text"]: graph for graph in graphs}
+    if len(text_to_graph) > 1:
+        logging.error(f"sentence split into two: {sentence}")
+        logging.error(f"{sen_idx=}, {text_to_graph=}")
+        logging.error("skipping")
+        return None, 0
+
+    logging.debug(f"{sentence=}, {text_to_graph=}")
+    try:
+        # rare problems with sentence modifications need this check
+        graph = text_to_graph[sentence]["main_edge"]
+    except KeyError:
+        logging.error(f"sentence not found after parsing")
+        logging.error(f"{sen_idx=}, {sentence=}")
+        logging.error("skipping")
+        return None, 0
+
+    atom2word = text_to_graph[sentence]["atom2word"]
+    logging.info("-" * 100)
+    logging.info(f"START of information extraction for {sen_idx=}:")
+    logging.info(f"{sen_idx=}, {sentence=}")
+    logging.info(f"{graph=}")
+    extractions = {}
+    if ranks is None:
+        extract_fn(extractions, graph, sen_idx, atom2word, patterns, max_extr)
+    else:
+        ranked_information_extraction(
+            extractions,
+            graph,
+            sen_idx,
+            atom2word,
+            patterns,
+            max_extr,
+            ranks,
+            extract_fn,
+        )
+    return extractions, time.perf_counter_ns() - start
+
+
+# parser client and extraction settings of a worker process, see extract_shard
+_worker_state = {}
+
+
+def init_extraction_worker(
+    parser_url: str,
+    vocab_path: str,
+    patterns,
+    max_extr,
+    ranks=None,
+    extract_fn: Callable = information_extraction,
+):
+    """
+    Set up a worker process of GraphbrainExtractor.extract_sentences, so that the
+    parser client and the patterns are created only once per process.
+    """
+    _worker_state["text_parser"] = GraphbrainParserClient(parser_url, vocab_path)
+    _worker_state["patterns"] = patterns
+    _worker_state["max_extr"] = max_extr
+    _worker_state["ranks"] = ranks
+    _worker_state["extract_fn"] = extract_fn
+
+
+def extract_shard(
+    sentences: List[Tuple[Any, str]],
+    n_parse_workers: int = 8,
+    max_in_flight: Optional[int] = None,
+) -> List[Tuple[Optional[Dict], Dict[str, int]]]:
+    """
+    Parse a shard of sentences and run information extraction on them in a worker
+    process set up by init_extraction_worker.
+
+    Returns:
+        List[Tuple[Optional[Dict], Dict[str, int]]]: the extractions and the times of
+            the parse, map and match stages of each sentence, in the order of the
+            shard
+    """
+    text_parser = _worker_state["text_parser"]
+    parses = text_parser.parse_many(
+        sentences, n_workers=n_parse_workers, max_in_flight=max_in_flight
+    )
+    results = []
+    for sen_idx, sentence, graphs, times in parses:
+        extractions, match_time = extract_from_parse(
+            sen_idx,
+            sentence,
+            graphs,
+            _worker_state["patterns"],
+            _worker_state["max_extr"],
+            _worker_state["ranks"],
+            _worker_state["extract_fn"],
+        )
+        results.append((extractions, dict(times, match=match_time)))
+    return results
+
+
+@lru_cache(maxsize=4096)
+def _char_counts(s: str) -> Counter:
+    return Counter(s)
+
+
+@lru_cache(maxsize=1024)
+def _get_matcher(s2: str) -> SequenceMatcher:
+    # SequenceMatcher indexes its second sequence, reuse it for every first sequence
+    matcher = SequenceMatcher(None)
+    matcher.set_seq2(s2)
+    return matcher
+
+
 # function to check similarity between two strings (based on character similarity)
 def is_similar(s1, s2, threshold=0.5):
-    return SequenceMatcher(None, s1, s2).ratio() >= threshold
+    """
+    Check if SequenceMatcher(None, s1, s2).ratio() >= threshold. The ratio is twice
+    the number of matching characters divided by the total length, so it is first
+    bounded by the length of the shorter string and by the number of characters the
+    strings have in common, which rules out most dissimilar pairs without matching.
+    """
+    if s1 == s2:
+        return 1.0 >= threshold
+    total = len(s1) + len(s2)
+    if 2.0 * min(len(s1), len(s2)) / total < threshold:
+        return False
+    common = sum((_char_counts(s1) & _char_counts(s2)).values())
+    if 2.0 * common / total < threshold:
+        return False
+
+    matcher = _get_matcher(s2)
+    matcher.set_seq1(s1)
+    return matcher.ratio() >= threshold
 
 
 # function to process each key in the dictionary
@@ -942,45 +1697,17 @@ def combine_triplets(entries):
     return list(grouped.values())
 
 
-def extract_elements(hyperedge) -> List[str]:
+def extract_elements(hyperedge: Hyperedge) -> List[Hyperedge]:
     """
     Extracts all elements from a hyperedge,
     including atoms (non-parenthesized elements)
     """
-    hyperedge = str(hyperedge)
-    # remove outer parentheses if present
-    if hyperedge.startswith("(") and hyperedge.endswith(")"):
-        hyperedge = hyperedge[1:-1]
-
-    elements = []
-    stack = []
-    start_idx = 0
-    i = 0
-    while i < len(hyperedge):
-        char = hyperedge[i]
-
-        if char == "(":
-            if not stack:
-                start_idx = i  # start of a top-level element
-            stack.append(char)
-        elif char == ")":
-            stack.pop()
-            if not stack:  # end of a top-level element
-                element = hyperedge[start_idx : i + 1]
-                elements.append(element)
-        elif not stack and char not in " ()":
-            # detecting atoms (words not inside parentheses)
-            match = re.match(r"[^\s()]+", hyperedge[i:])
-            if match:
-                elements.append(match.group(0))
-                # move forward to skip the matched atom
-                i += len(match.group(0)) - 1
-
-        i += 1
-    return elements
+    if hyperedge.atom:
+        return [hyperedge]
+    return list(hyperedge)
 
 
-def expand_subedges(top_level_elements: List[str]) -> List[List[str]]:
+def expand_subedges(top_level_elements: List[Hyperedge]) -> List:
     """
     Extracts the next level of elements
     but keeps 'var' objects as whole
@@ -988,7 +1715,7 @@ def expand_subedges(top_level_elements: List[str]) -> List[List[str]]:
     elements = []
     for element in top_level_elements:
         # keep "var" objects intact
-        if element.startswith("(var "):
+        if is_variable(element):
             elements.append(element)
         else:
             # check for nested components
@@ -1002,7 +1729,7 @@ def expand_subedges(top_level_elements: List[str]) -> List[List[str]]:
     return elements
 
 
-def get_levels(hyperedge, expand=False) -> List:
+def get_levels(hyperedge: Hyperedge, expand=False) -> List:
     top_level_elements = extract_elements(hyperedge)
     logging.debug(f"{top_level_elements=}")
 
@@ -1046,34 +1773,32 @@ def edge2pattern(edge, root=False, subtype=False):
     pattern = "{}/{}".format(root_str, et)
     ar = edge.argroles()
     if ar == "" or et in ["C", "R", "S"]:
-        return hedge(pattern)
+        return Atom((pattern,))
     else:
-        return hedge("{}.{}".format(pattern, ar))
+        return Atom(("{}.{}".format(pattern, ar),))
 
 
 # function to generalise each hyperedge with functional patterns
 # generalisation approach: using var as root and adding main type (mtype) of edge after /
 # only consider recursive expansion to depth 2 for simplicity
 def generalize_edge(hlist):
-    final_result = ["("]
+    final_result = []
     for item in hlist:
         if type(item) == list:
-            final_result.append("(")
+            subpattern = []
             for i in item:
                 newitem = edge2pattern(i)
                 if newitem is None:
                     return None
-                final_result.append(newitem.to_str())
-            final_result.append(")")
+                subpattern.append(newitem)
+            final_result.append(Hyperedge(subpattern))
         else:
             newitem = edge2pattern(item)
             if newitem is None:
                 return None
-            final_result.append(newitem.to_str())
+            final_result.append(newitem)
 
-    final_result.append(")")
-    final_result = " ".join(final_result)
-    return hedge(final_result)
+    return Hyperedge(final_result)
 
 
 def check_pattern(pattern, vars):
@@ -1,5 +1,9 @@
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import requests
 import spacy
@@ -29,8 +33,18 @@ class GraphParse(dict):
         'word2atom': {0: adam/Cp.s/en, 1: loves/Pd.so.|f--3s-/en, 2: andi/Cp.s/en}
     }
 
+    The index from atom strings to token IDs used by edge2toks is built on first
+    access of atom_index and kept with the graph.
     """
 
+    @property
+    def atom_index(self) -> Dict[str, List[int]]:
+        index = getattr(self, "_atom_index", None)
+        if index is None:
+            index = get_atom_index(self)
+            self._atom_index = index
+        return index
+
     @staticmethod
     def from_json(data, spacy_vocab):
         graph = GraphParse()
@@ -68,6 +82,70 @@ class GraphParse(dict):
         }
 
 
+def get_atom_index(graph: Dict[str, Any]) -> Dict[str, List[int]]:
+    """
+    Map the string of each atom of a graph to the sorted IDs of the tokens it stands
+    for. Atoms of repeated words (e.g. "the/Md/en") map to more than one token.
+    """
+    if isinstance(graph, GraphParse):
+        return graph.atom_index
+
+    index = defaultdict(list)
+    for atom, word in graph["atom2word"].items():
+        index[atom.to_str()].append(word[1])
+
+    return {atom_str: sorted(tok_ids) for atom_str, tok_ids in index.items()}
+
+
+def get_shortest_span(
+    toks: Set[int], to_disambiguate: Iterable[List[int]]
+) -> Tuple[int, ...]:
+    """
+    Choose one token for each ambiguous atom so that the tokens covered, together
+    with the unambiguous ones, span the shortest range of the sentence.
+
+    The shortest range covering a candidate of each atom is found with a sliding
+    window over all candidates, in O(n log n) time for n candidates instead of
+    enumerating all combinations. As before, ties are broken towards the smallest
+    token IDs: the leftmost range is used and an atom occurring k times in the edge
+    takes the first k of its candidates in the range.
+
+    Args:
+        toks (Set[int]): the IDs of the tokens of unambiguous atoms
+        to_disambiguate (Iterable[List[int]]): candidate token IDs of each ambiguous atom
+
+    Returns:
+        Tuple[int, ...]: the sorted IDs of the tokens covered
+    """
+    groups = Counter(tuple(sorted(set(cands))) for cands in to_disambiguate)
+    required = list(groups) + ([(min(toks),), (max(toks),)] if toks else [])
+    cands = sorted((tok, i) for i, group in enumerate(required) for tok in group)
+
+    counts = [0] * len(required)
+    n_covered, left = 0, 0
+    best = None
+    for tok, i in cands:
+        if counts[i] == 0:
+            n_covered += 1
+        counts[i] += 1
+        while n_covered == len(required):
+            first_tok, j = cands[left]
+            if best is None or tok - first_tok < best[1] - best[0]:
+                best = (first_tok, tok)
+            counts[j] -= 1
+            if counts[j] == 0:
+                n_covered -= 1
+            left += 1
+
+    start, end = best
+    chosen = set(toks)
+    for group, n in groups.items():
+        i = bisect_left(group, start)
+        chosen.update(tok for tok in group[i : i + n] if tok <= end)
+
+    return tuple(sorted(chosen))
+
+
 class GraphbrainParser:
     """A class to handle text parsing using Graphbrain."""
 
@@ -159,6 +237,7 @@ class GraphbrainParserClient:
     ):
         self.vocab = Vocab().from_disk(spacy_vocab_path)
         logging.info(f"loaded spacy vocab from {spacy_vocab_path=}")
+        self.vocab_path = spacy_vocab_path
         self.url = parser_url
         parser_params = self.get_params()
         logging.info(f"connected to parser, {parser_url=}, {parser_params=}")
@@ -178,12 +257,65 @@ class GraphbrainParserClient:
     def get_vocab(self):
         return self.vocab
 
-    def parse(self, text):
+    def parse_json(self, text):
         response = requests.request("POST", f"{self.url}/parse", json={"text": text})
-        json_graphs = response.json()["graphs"]
+        return response.json()["graphs"]
+
+    def parse(self, text):
+        json_graphs = self.parse_json(text)
         graphs = [GraphParse.from_json(graph, self.vocab) for graph in json_graphs]
         return graphs
 
+    def parse_many(
+        self,
+        items: Iterable[Tuple[Any, str]],
+        n_workers: int = 8,
+        max_in_flight: Optional[int] = None,
+    ) -> Iterator[Tuple[Any, str, List[GraphParse], Dict[str, int]]]:
+        """
+        Parse a stream of texts with several requests to the parser in flight, so
+        that parsing overlaps with the processing of earlier results.
+
+        Items are read lazily, at most max_in_flight (by default twice n_workers)
+        texts are sent ahead of the results consumed. The parses are converted to
+        GraphParse objects in the consuming thread. The time spent on the request
+        ("parse") and on the conversion ("map") is measured for each text.
+
+        Args:
+            items (Iterable[Tuple[Any, str]]): keys and the texts to parse
+            n_workers (int): the number of threads sending requests
+            max_in_flight (Optional[int]): the maximum number of pending texts
+
+        Yields:
+            Tuple[Any, str, List[GraphParse], Dict[str, int]]: the key, text, graphs
+                and times (in nanoseconds) of each item, in the order of the items
+        """
+        if max_in_flight is None:
+            max_in_flight = 2 * n_workers
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for key, text in items:
+                future = executor.submit(self._timed_parse_json, text)
+                pending.append((key, text, future))
+                if len(pending) >= max_in_flight:
+                    yield self._get_parse(*pending.popleft())
+
+            while pending:
+                yield self._get_parse(*pending.popleft())
+
+    def _timed_parse_json(self, text):
+        start = time.perf_counter_ns()
+        json_graphs = self.parse_json(text)
+        return json_graphs, time.perf_counter_ns() - start
+
+    def _get_parse(self, key, text, future):
+        json_graphs, parse_time = future.result()
+        start = time.perf_counter_ns()
+        graphs = [GraphParse.from_json(graph, self.vocab) for graph in json_graphs]
+        times = {"parse": parse_time, "map": time.perf_counter_ns() - start}
+        return key, text, graphs, times
+
 
 def test_parser():
     import sys
@@ -137,9 +137,9 @@ class HITLManager:
             "n_rules": self.extractor.get_n_rules(),
         }
 
-    def get_rules(self, top_n=20):
+    def get_rules(self, top_n=20, **kwargs):
         return self.extractor.get_rules(
-            text_to_triplets=self.text_to_triplets, top_n=top_n
+            text_to_triplets=self.text_to_triplets, top_n=top_n, **kwargs
         )
 
     # def print_rules(self, top_n):
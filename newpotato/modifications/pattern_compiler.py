@@ -0,0 +1,397 @@
+import itertools
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Union
+
+from graphbrain import hedge
+from graphbrain.hyperedge import Hyperedge
+from graphbrain.patterns.matcher import Matcher
+from graphbrain.patterns.properties import FUNS, is_fun_pattern, is_pattern
+from graphbrain.patterns.utils import _defun_pattern_argroles, _normalize_fun_patterns
+from graphbrain.patterns.variables import _assign_edge_to_var, _varname
+
+# a compiled (sub)pattern: takes an edge and the current variables and returns the
+# list of variable assignments, like graphbrain's Matcher.match
+MatchFn = Callable[[Hyperedge, Dict], List[Dict]]
+
+
+def _never(edge: Hyperedge) -> bool:
+    return False
+
+
+def compile_atomic_check(atomic_pattern: Hyperedge) -> Callable[[Hyperedge], bool]:
+    """
+    Compile an atomic pattern into a function that checks whether an edge matches it.
+
+    Equivalent to graphbrain's _matches_atomic_pattern, but the structure code, type,
+    argroles and remaining parts of the pattern are parsed only once.
+    """
+    ap_parts = atomic_pattern.parts()
+    if len(ap_parts) == 0 or len(ap_parts[0]) == 0:
+        return _never
+
+    # structural match
+    struct_code = ap_parts[0][0]
+    if struct_code == ".":
+        struct = "atom"
+    elif atomic_pattern.parens:
+        struct = "edge"
+    elif struct_code != "*" and not struct_code.isupper():
+        struct = "root"
+    else:
+        struct = None
+    ap_root = atomic_pattern.root()
+
+    ap_type, ap_role = None, []
+    ordered_argroles, argroles_reqs = None, []
+    rest_role, rest_parts = [], []
+    if len(ap_parts) > 1:
+        ap_role = atomic_pattern.role()
+        ap_type = ap_role[0]
+        pos = 1
+        if len(ap_role) > 1:
+            if ap_type[0] in {"B", "P"}:
+                ap_argroles_parts = ap_role[1].split("-")
+                if len(ap_argroles_parts) == 1:
+                    ap_argroles_parts.append("")
+                ap_negroles = ap_argroles_parts[1]
+                ap_argroles_posopt = ap_argroles_parts[0]
+                if len(ap_argroles_posopt) > 0 and ap_argroles_posopt[0] == "{":
+                    ap_posroles = ap_argroles_posopt[1:-1].split(",")[0]
+                    for argrole in set(ap_posroles) | set(ap_negroles):
+                        min_count = ap_posroles.count(argrole)
+                        fixed = ap_negroles.count(argrole) > 0
+                        argroles_reqs.append((argrole, min_count, fixed))
+                else:
+                    ordered_argroles = ap_argroles_posopt.replace(",", "")
+                pos = 2
+            rest_role = [(i, ap_role[i]) for i in range(pos, len(ap_role))]
+            pos = len(ap_role)
+        rest_parts = [(i, ap_parts[i]) for i in range(pos, len(ap_parts))]
+
+    n_type, n_role, n_parts = len(ap_type or ""), len(ap_role), len(ap_parts)
+
+    def check(edge: Hyperedge) -> bool:
+        if struct == "atom":
+            if edge.not_atom:
+                return False
+        elif struct == "edge":
+            if edge.atom:
+                return False
+        elif struct == "root":
+            if edge.not_atom or edge.root() != ap_root:
+                return False
+
+        if ap_type is None:
+            return True
+
+        if edge.type()[:n_type] != ap_type:
+            return False
+
+        e_atom = edge.inner_atom()
+        if n_role > 1:
+            e_role = e_atom.role()
+            if len(e_role) < n_role:
+                return False
+
+            if ordered_argroles is not None:
+                e_argroles = e_role[1]
+                if len(e_argroles) > len(ordered_argroles):
+                    return False
+                return ordered_argroles.startswith(e_argroles)
+
+            if argroles_reqs:
+                e_argroles = e_role[1]
+                for argrole, min_count, fixed in argroles_reqs:
+                    count = e_argroles.count(argrole)
+                    if count < min_count or (fixed and count > min_count):
+                        return False
+
+            for i, part in rest_role:
+                if e_role[i] != part:
+                    return False
+
+        if n_parts > 2:
+            e_parts = e_atom.parts()
+            if len(e_parts) < n_parts:
+                return False
+            for i, part in rest_parts:
+                if e_parts[i] != part:
+                    return False
+
+        return True
+
+    return check
+
+
+def _is_fun_edge(edge: Hyperedge) -> bool:
+    return edge.not_atom and str(edge[0]) in FUNS
+
+
+def _compile_atom(pattern: Hyperedge) -> MatchFn:
+    check = compile_atomic_check(pattern)
+    varname = _varname(pattern) if is_pattern(pattern) else ""
+
+    def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+        if _is_fun_edge(edge) or not check(edge):
+            return []
+        if varname:
+            return [{**curvars, **_assign_edge_to_var(curvars, varname, edge)}]
+        return [{**curvars}]
+
+    return match
+
+
+def _compile_fun(pattern: Hyperedge) -> MatchFn:
+    fun = pattern[0].root()
+
+    if fun == "var":
+        if len(pattern) != 3:
+            raise RuntimeError("var pattern function must have two arguments")
+        sub = _compile(pattern[1])
+        var_name = pattern[2].root()
+
+        def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+            if (
+                edge.not_atom
+                and str(edge[0]) == "var"
+                and len(edge) == 3
+                and str(edge[2]) == var_name
+            ):
+                edge = edge[1]
+            this_var = _assign_edge_to_var(curvars, var_name, edge)
+            return sub(edge, {**curvars, **this_var})
+
+        return match
+
+    if fun == "atoms":
+        atom_matchers = [_compile(atom_pattern) for atom_pattern in pattern[1:]]
+
+        def match_atoms(i, atoms, curvars, matched_atoms):
+            if i == len(atom_matchers):
+                return [curvars]
+            results = []
+            for atom in atoms:
+                if atom in matched_atoms:
+                    continue
+                for variables in atom_matchers[i](atom, curvars):
+                    results += match_atoms(
+                        i + 1, atoms, {**curvars, **variables}, matched_atoms + [atom]
+                    )
+            return results
+
+        def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+            return match_atoms(0, edge.atoms(), curvars, [])
+
+        return match
+
+    if fun == "any":
+        alternatives = [_compile(alternative) for alternative in pattern[1:]]
+
+        def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+            for alternative in alternatives:
+                matches = alternative(edge, curvars)
+                if len(matches) > 0:
+                    return matches
+            return []
+
+        return match
+
+    # lemma patterns need a hypergraph to look up lemmas
+    def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+        raise RuntimeError("Lemma pattern function requires hypergraph.")
+
+    return match
+
+
+def _compile_by_order(pattern: Hyperedge) -> MatchFn:
+    items = []
+    for pitem in pattern:
+        if pitem.atom:
+            check = compile_atomic_check(pitem)
+            varname = _varname(pitem)
+            varname = varname if len(varname) > 0 and varname[0].isupper() else ""
+            items.append((check, varname))
+        else:
+            items.append((_compile(pitem), None))
+
+    def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+        result = [{}]
+        for i, (item_match, varname) in enumerate(items):
+            eitem = edge[i]
+            _result = []
+            for variables in result:
+                if varname is None:
+                    _result += item_match(eitem, {**curvars, **variables})
+                elif item_match(eitem):
+                    if varname:
+                        variables[varname] = _assign_edge_to_var(
+                            {**curvars, **variables}, varname, eitem
+                        )[varname]
+                    _result.append(variables)
+            result = _result
+        return result
+
+    return match
+
+
+def _compile_by_argroles(
+    pattern: Hyperedge, argroles: str, argroles_opt: str
+) -> MatchFn:
+    role_counts = Counter(argroles_opt).most_common()
+    unknown_roles = (len(pattern) - 1) - len(argroles_opt)
+    if unknown_roles > 0:
+        role_counts.append(("*", unknown_roles))
+    role_counts = [("X", 1)] + role_counts
+    min_vars = len(argroles)
+
+    defun_pattern = _defun_pattern_argroles(pattern)
+    steps = []
+    for argrole, n in role_counts:
+        if argrole == "X":
+            pitems = [pattern[0]]
+        elif argrole == "*":
+            pitems = pattern[-n:]
+        else:
+            pitems = defun_pattern.edges_with_argrole(argrole)
+        steps.append((argrole, n, [_compile(pitem) for pitem in pitems]))
+    connector = steps[0][2][0]
+
+    def match_step(edge, i, matched, curvars):
+        if i == len(steps):
+            return [curvars]
+
+        argrole, n, pitems = steps[i]
+        if argrole == "X":
+            eitems = [edge[0]]
+        elif argrole == "*":
+            eitems = [e for e in edge if e not in matched]
+        else:
+            eitems = edge.edges_with_argrole(argrole)
+
+        if len(eitems) < n:
+            return [curvars] if len(curvars) >= min_vars else []
+
+        result = []
+        for perm in itertools.permutations(eitems, r=n):
+            perm_result = [{}]
+            for eitem, pitem in zip(perm, pitems):
+                item_result = []
+                for variables in perm_result:
+                    item_result += pitem(eitem, {**curvars, **variables})
+                perm_result = item_result
+                if len(item_result) == 0:
+                    break
+
+            for variables in perm_result:
+                result += match_step(
+                    edge, i + 1, matched + perm, {**curvars, **variables}
+                )
+
+        return result
+
+    def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+        if not connector(edge[0], curvars):
+            return []
+        return match_step(edge, 0, (), curvars)
+
+    return match
+
+
+def _compile_edge(pattern: Hyperedge) -> MatchFn:
+    original = pattern
+    min_len = len(pattern)
+    max_len = min_len
+    # open-ended?
+    if pattern[-1].to_str() == "...":
+        pattern = hedge(pattern[:-1])
+        min_len -= 1
+        max_len = float("inf")
+
+    argroles_posopt = _defun_pattern_argroles(pattern)[0].argroles().split("-")[0]
+    if len(argroles_posopt) > 0 and argroles_posopt[0] == "{":
+        match_by_order = False
+        argroles_posopt = argroles_posopt[1:-1]
+    else:
+        match_by_order = True
+    argroles = argroles_posopt.split(",")[0]
+    argroles_opt = argroles_posopt.replace(",", "")
+
+    if len(argroles) > 0:
+        min_len = 1 + len(argroles)
+        max_len = float("inf")
+    else:
+        match_by_order = True
+
+    if match_by_order:
+        match_items = _compile_by_order(pattern)
+    else:
+        match_items = _compile_by_argroles(pattern, argroles, argroles_opt)
+
+    def match(edge: Hyperedge, curvars: Dict) -> List[Dict]:
+        if edge.atom:
+            # atoms are indexed as strings, leave these corner cases to graphbrain
+            return Matcher(edge, original, curvars=curvars).results
+        if _is_fun_edge(edge):
+            return []
+        if len(edge) < min_len or len(edge) > max_len:
+            return []
+
+        unique_vars = []
+        for variables in match_items(edge, curvars):
+            v = {**curvars, **variables}
+            if v not in unique_vars:
+                unique_vars.append(v)
+        return unique_vars
+
+    return match
+
+
+def _compile(pattern: Hyperedge) -> MatchFn:
+    if is_fun_pattern(pattern):
+        return _compile_fun(pattern)
+    if pattern.atom:
+        return _compile_atom(pattern)
+    return _compile_edge(pattern)
+
+
+class CompiledPattern:
+    """A graphbrain pattern compiled into a matcher closure.
+
+    Calling a compiled pattern on an edge returns the same list of variable assignments
+    as graphbrain's match_pattern(edge, pattern), but atomic patterns, argroles and
+    variable names are parsed once at compile time instead of on every match. It
+    follows upstream graphbrain, not the fork in newpotato.modifications.patterns
+    that GraphbrainExtractor matches its rules with.
+
+    Attributes:
+        pattern (Hyperedge): the original pattern
+    """
+
+    def __init__(self, pattern: Union[Hyperedge, str]):
+        if isinstance(pattern, str):
+            pattern = hedge(pattern.strip())
+        self.pattern = pattern
+        self._match = _compile(_normalize_fun_patterns(pattern))
+
+    def __call__(
+        self, edge: Union[Hyperedge, str], curvars: Optional[Dict] = None
+    ) -> List[Dict]:
+        return self._match(hedge(edge), {} if curvars is None else curvars)
+
+    def __repr__(self):
+        return f"CompiledPattern({self.pattern.to_str()!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: Union[Hyperedge, str]) -> CompiledPattern:
+    """
+    Compile a graphbrain pattern. Compiled patterns are cached.
+
+    Args:
+        pattern (Union[Hyperedge, str]): the pattern, e.g. (REL/P.{so} ARG1/C ARG2)
+
+    Returns:
+        CompiledPattern: a callable that matches edges against the pattern
+    """
+    return CompiledPattern(pattern)
@@ -0,0 +1,174 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from graphbrain import hedge
+from graphbrain.hyperedge import Hyperedge
+from graphbrain.patterns.properties import is_fun_pattern
+
+
+def to_pattern(pattern: Union[Hyperedge, str]) -> Hyperedge:
+    """
+    Parse a pattern, e.g. a line of a pattern file, into a Hyperedge.
+    """
+    if isinstance(pattern, str):
+        return hedge(pattern.strip())
+    return pattern
+
+
+@dataclass
+class PatternStats:
+    """A class to hold statistics of a pattern on annotated sentences.
+
+    Attributes:
+        support (int): how often the pattern was counted during learning
+        n_matches (int): the number of matches on the annotated sentences
+        n_correct (int): the number of matches that are annotated triplets
+    """
+
+    support: int = 0
+    n_matches: int = 0
+    n_correct: int = 0
+
+    @property
+    def precision(self) -> float:
+        """
+        The expected precision of the pattern, i.e. the share of correct matches
+        with add-one smoothing, so that patterns with few matches are not ranked
+        above patterns that are almost always correct.
+        """
+        return (self.n_correct + 1) / (self.n_matches + 2)
+
+
+def order_by_precision(
+    patterns: Iterable[Hyperedge], stats: Dict[Hyperedge, PatternStats]
+) -> List[Hyperedge]:
+    """
+    Order patterns by descending expected precision, then by descending support.
+    Ties (e.g. when there are no statistics) keep the original order.
+    """
+    default = PatternStats()
+
+    def key(pattern):
+        pattern_stats = stats.get(pattern, default)
+        return -pattern_stats.precision, -pattern_stats.support
+
+    return sorted(patterns, key=key)
+
+
+def pattern_head(pattern: Hyperedge) -> Optional[Tuple[str, str]]:
+    """
+    Get the index key of a pattern: the main type of its connector and the argument
+    roles that unordered argroles require (e.g. ("P", "os") for (REL/P.{so} ...)).
+
+    Patterns whose connector can match edges of any type (atomic and functional
+    patterns, variables without a type, edge wildcards) have no key.
+    """
+    if pattern.atom or is_fun_pattern(pattern):
+        return None
+
+    connector = pattern[0]
+    if not connector.atom or connector.parens:
+        return None
+
+    role = connector.role()
+    if len(connector.parts()) < 2 or len(role[0]) == 0:
+        return None
+
+    posroles = ""
+    if len(role) > 1 and role[0][0] in {"B", "P"} and role[1].startswith("{"):
+        posroles = role[1].split("-")[0][1:-1].split(",")[0]
+
+    return role[0][0], "".join(sorted(posroles))
+
+
+def edge_head(edge: Hyperedge) -> Optional[Tuple[str, Counter]]:
+    """
+    Get the main type of the connector of an edge and the counts of its argument roles.
+    """
+    if edge.atom:
+        return None
+
+    e_type = edge[0].type()
+    e_role = edge[0].inner_atom().role()
+    argroles = Counter(e_role[1]) if len(e_role) > 1 else Counter()
+    return e_type[0], argroles
+
+
+def _has_argroles(argroles: Counter, required: str) -> bool:
+    return all(argroles[role] >= n for role, n in Counter(required).items())
+
+
+def could_match(pattern: Union[Hyperedge, str], edge: Hyperedge) -> bool:
+    """
+    Check whether the head of an edge is compatible with the head of a pattern.
+    """
+    head = pattern_head(to_pattern(pattern))
+    if head is None:
+        return True
+
+    e_head = edge_head(edge)
+    if e_head is None:
+        return True
+
+    return e_head[0] == head[0] and _has_argroles(e_head[1], head[1])
+
+
+class PatternIndex:
+    """A class to hold a list of graphbrain patterns parsed once and indexed by their
+    head, so that an edge is only matched against patterns that could match it.
+
+    Patterns are bucketed by the main type of their connector and, within a type, by
+    the argument roles their connector requires. Patterns without a head key can match
+    any edge and are returned for all of them. Patterns are always returned in their
+    original order, so that the order of matches does not change.
+
+    Attributes:
+        patterns (List[Hyperedge]): the parsed patterns, in their original order
+        heads (Dict[str, Dict[str, List[int]]]): positions of patterns by connector
+            type and required argument roles
+        wildcards (List[int]): positions of patterns without a head key
+    """
+
+    def __init__(self, patterns: Iterable[Union[Hyperedge, str]]):
+        self.patterns = [to_pattern(pattern) for pattern in patterns]
+        self.heads = defaultdict(lambda: defaultdict(list))
+        self.wildcards = []
+        for i, pattern in enumerate(self.patterns):
+            head = pattern_head(pattern)
+            if head is None:
+                self.wildcards.append(i)
+            else:
+                e_type, argroles = head
+                self.heads[e_type][argroles].append(i)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def _get_positions(self, edge: Hyperedge) -> List[int]:
+        head = edge_head(edge)
+        if head is None:
+            return list(range(len(self.patterns)))
+
+        e_type, argroles = head
+        positions = list(self.wildcards)
+        for required, type_positions in self.heads.get(e_type, {}).items():
+            if _has_argroles(argroles, required):
+                positions += type_positions
+
+        return sorted(positions)
+
+    def get_patterns(self, edge: Hyperedge) -> List[Hyperedge]:
+        """
+        Get the patterns that could match an edge, in their original order.
+
+        Args:
+            edge (Hyperedge): the edge to be matched
+
+        Returns:
+            List[Hyperedge]: the candidate patterns
+        """
+        return [self.patterns[i] for i in self._get_positions(edge)]
@@ -1,10 +1,15 @@
+import heapq
 import logging
 from collections import Counter
+from functools import lru_cache
 from itertools import combinations, permutations, product
 
 import graphbrain.constants as const
 from graphbrain import hedge
 
+# maximum number of partial argument pairings expanded by common_pattern_argroles
+PAIRING_SEARCH_BUDGET = 1000
+
 
 def edge2rolemap(edge):
     argroles = edge[0].argroles()
@@ -56,6 +61,7 @@ def rolemap_pairings(rm1, rm2):
         yield rm1_, rm2_
 
 
+@lru_cache(maxsize=4096)
 def atom_pattern_counts(edge):
     if edge.atom:
         parts = edge.parts()
@@ -167,20 +173,141 @@ def remove_variables(edge):
         return hedge([remove_variables(subedge) for subedge in edge])
 
 
-def common_pattern_argroles(edge1, edge2):
+def _pairing_weights(args1, args2, budget):
+    # specificity of the common pattern of each pair of arguments, None if there is none
+    weights = []
+    for arg1 in args1:
+        row = []
+        for arg2 in args2:
+            pattern = _common_pattern(arg1, arg2, budget)
+            row.append(None if pattern is None else atom_pattern_counts(pattern))
+        weights.append(row)
+    return weights
+
+
+def _add_counts(counts1, counts2):
+    return tuple(c1 + c2 for c1, c2 in zip(counts1, counts2))
+
+
+def _search_pairings(slots, budget):
+    """
+    Best-first search for the pairing of arguments with the most specific common
+    pattern. Each slot is a list with the weights of pairing one argument with each of
+    its candidates (None if they have no common pattern), slots of the same group may
+    not share candidates. The bound of a partial pairing adds the best weight of every
+    open slot to the weights chosen so far, so complete pairings are generated from the
+    most specific to the most general one, ties in the order of the choices.
+
+    At most budget partial pairings are expanded. When the budget runs out, the
+    remaining partial pairings are completed greedily, the most promising one first,
+    skipping those that run into a dead end.
+    """
+    best = []
+    for _, weights in slots:
+        valid = [weight for weight in weights if weight is not None]
+        if not valid:
+            return
+        best.append(max(valid))
+
+    rest = [(0, 0, 0)]
+    for weight in reversed(best):
+        rest.insert(0, _add_counts(weight, rest[0]))
+
+    def push(heap, score, choices):
+        bound = _add_counts(score, rest[len(choices)])
+        heapq.heappush(heap, (tuple(-c for c in bound), choices, score))
+
+    def children(choices, score):
+        group, weights = slots[len(choices)]
+        used = {
+            choice
+            for (slot_group, _), choice in zip(slots, choices)
+            if slot_group == group
+        }
+        for choice, weight in enumerate(weights):
+            if weight is not None and choice not in used:
+                yield choices + (choice,), _add_counts(score, weight)
+
+    heap = []
+    push(heap, (0, 0, 0), ())
+    n_expanded = 0
+    while heap:
+        _, choices, score = heapq.heappop(heap)
+        if len(choices) < len(slots) and n_expanded == budget:
+            while len(choices) < len(slots):
+                candidates = list(children(choices, score))
+                if not candidates:
+                    break
+                choices, score = max(candidates, key=lambda child: child[1])
+            if len(choices) < len(slots):
+                logging.debug("greedy completion of pairing failed, trying the next")
+                continue
+        if len(choices) == len(slots):
+            yield choices
+            continue
+        n_expanded += 1
+        if n_expanded == budget:
+            logging.debug("pairing search budget exhausted, completing greedily")
+        for child, child_score in children(choices, score):
+            push(heap, child_score, child)
+
+
+def common_pattern_argroles(edge1, edge2, budget=PAIRING_SEARCH_BUDGET):
+    """
+    Find the most specific common pattern of two edges with argument roles, pairing
+    arguments with the same role.
+
+    The common patterns of all pairs of arguments with the same role are computed once
+    (memoized by _common_pattern), then the pairings are searched best-first with a
+    budget of expanded partial pairings (see _search_pairings), instead of enumerating
+    all of them. With k arguments per edge, each call costs O(k^2) common patterns of
+    argument pairs and O(budget * k * log(budget * k)) for the search, plus O(k^2) for
+    each of the at most budget * k greedy completions once the budget runs out. Since
+    _common_pattern is memoized, finding the common pattern of edges with n and m
+    subedges (at any depth) takes at most n * m such calls.
+    """
     rm1 = edge2rolemap(edge1)
     rm2 = edge2rolemap(edge2)
+    roles = sorted(set(rm1.keys()) & set(rm2.keys()))
+
+    # one slot per argument of the edge with fewer arguments for a role
+    slots = []
+    for role in roles:
+        args1, args2 = rm1[role], rm2[role]
+        weights = _pairing_weights(args1, args2, budget)
+        if len(args2) <= len(args1):
+            for j in range(len(args2)):
+                slots.append((role, [row[j] for row in weights]))
+        else:
+            for i in range(len(args1)):
+                slots.append((role, weights[i]))
 
     _vars = all_variables(edge1) | all_variables(edge2)
-    best_pattern = None
-    for rm1_, rm2_ in rolemap_pairings(rm1, rm2):
+    for choices in _search_pairings(slots, budget):
+        rm1_, rm2_ = {}, {}
+        choices = iter(choices)
+        for role in roles:
+            args1, args2 = rm1[role], rm2[role]
+            if len(args2) <= len(args1):
+                pairs = [(next(choices), j) for j in range(len(args2))]
+            else:
+                pairs = sorted(
+                    [(i, next(choices)) for i in range(len(args1))],
+                    key=lambda pair: pair[1],
+                )
+            rm1_[role] = [args1[i] for i, _ in pairs]
+            rm2_[role] = [args2[j] for _, j in pairs]
+
         edge1_ = rolemap2edge(edge1[0], rm1_)
         edge2_ = rolemap2edge(edge2[0], rm2_)
         print(f"recursion with argroles - start")
-        subedges = [_common_pattern(se1, se2) for se1, se2 in zip(edge1_, edge2_)]
+        subedges = [
+            _common_pattern(se1, se2, budget) for se1, se2 in zip(edge1_, edge2_)
+        ]
         print(f"recursion with argroles - end")
         if any(subedge is None for subedge in subedges):
-            continue
+            # the common pattern of the predicates does not depend on the pairing
+            return None
         argroles = edge1_[0].argroles()
         if argroles == "":
             # deal with (*/P.{} or */B.{})
@@ -190,13 +317,9 @@ def common_pattern_argroles(edge1, edge2):
             pattern = pattern.replace_argroles("{{{}}}".format(edge1_[0].argroles()))
 
         if _vars == all_variables(pattern):
-            if best_pattern is None or more_general(best_pattern, pattern):
-                best_pattern = pattern
+            return pattern.normalized()
 
-    if best_pattern is None:
-        return None
-
-    return best_pattern.normalized()
+    return None
 
 
 def common_type(edges):
@@ -256,7 +379,8 @@ def contains_argroles(edge):
     return edge.not_atom and edge[0].argroles() != ""
 
 
-def _common_pattern(edge1, edge2):
+@lru_cache(maxsize=4096)
+def _common_pattern(edge1, edge2, budget=PAIRING_SEARCH_BUDGET):
     print(f"{edge1=}, {edge2=}")
     nedge1 = edge1
     nedge2 = edge2
@@ -293,7 +417,7 @@ def _common_pattern(edge1, edge2):
         else:
             vedge2 = nedge2
         print(f"recursion with variables, {vedge1=} and {vedge2=}")
-        vedge = _common_pattern(vedge1, vedge2)
+        vedge = _common_pattern(vedge1, vedge2, budget)
         if vedge is None or contains_variable(vedge):
             print(
                 "No common pattern or common pattern contains variable; vedge: ", vedge
@@ -310,7 +434,7 @@ def _common_pattern(edge1, edge2):
     else:
         if contains_argroles(nedge1) and contains_argroles(nedge2):
             if nedge1.mt == nedge2.mt:
-                common_pattern = common_pattern_argroles(nedge1, nedge2)
+                common_pattern = common_pattern_argroles(nedge1, nedge2, budget)
                 if common_pattern:
                     print("edges have same mtype > common_pattern_argroles()")
                     return common_pattern
@@ -328,7 +452,7 @@ def _common_pattern(edge1, edge2):
         ):
             print("recursion with subedges")
             subedges = [
-                _common_pattern(subedge1, subedge2)
+                _common_pattern(subedge1, subedge2, budget)
                 for subedge1, subedge2 in zip(nedge1, nedge2)
             ]
             if any(subedge is None for subedge in subedges):
@@ -350,8 +474,13 @@ def _common_pattern(edge1, edge2):
                 return hedge("*")
 
 
-def common_pattern(edge1, edge2):
-    edge = _common_pattern(edge1, edge2)
+def common_pattern(edge1, edge2, budget=PAIRING_SEARCH_BUDGET):
+    """
+    Find the most specific pattern matching both edges, keeping their variables.
+    Common patterns of pairs of subedges are memoized, and pairings of arguments are
+    searched with a budget, see common_pattern_argroles for the resulting bound.
+    """
+    edge = _common_pattern(edge1, edge2, budget)
     if is_valid(edge):
         return edge
     else:
@@ -399,6 +528,7 @@ def _merge_patterns(edge1, edge2):
     return hedge(merged_edge)
 
 
+@lru_cache(maxsize=4096)
 def merge_patterns(edge1, edge2):
     edge = _merge_patterns(edge1, edge2)
     if is_valid(edge):
@@ -425,7 +555,64 @@ def apply_variable(edge, var_name, var_edge):
     return edge, False
 
 
+def _apply_variables(edge, edge_to_vars, var_names, found, applied, threshold=-1):
+    var_ids = edge_to_vars.get(edge, ())
+    found.update(var_ids)
+    # a variable applied to an edge replaces the variables applied inside it before
+    var_ids = [i for i in var_ids if i > threshold]
+    if var_ids:
+        threshold = max(var_ids)
+
+    if edge.not_atom:
+        subedges = [
+            _apply_variables(
+                subedge, edge_to_vars, var_names, found, applied, threshold
+            )
+            for subedge in edge
+        ]
+        if any(vedge is not subedge for vedge, subedge in zip(subedges, edge)):
+            edge = hedge(subedges)
+
+    if var_ids:
+        applied.add(threshold)
+        return hedge(("var", edge, var_names[threshold]))
+    return edge
+
+
 def apply_variables(edge, variables):
+    """
+    Apply all variables to an edge in a single traversal. Each variable maps its name
+    to an edge (or a list of alternative edges), every subedge equal to it is wrapped
+    as (var subedge name). The result is the same as applying the variables one by one
+    with apply_variable.
+
+    Returns None if a variable matches no subedge, or if all its matches are replaced
+    by another variable matching the same edge or one containing it.
+    """
+    if contains_variable(edge):
+        return _apply_variables_one_by_one(edge, variables)
+
+    var_names = list(variables)
+    edge_to_vars = {}
+    for i, var_edge in enumerate(variables.values()):
+        for alternative in var_edge if type(var_edge) == list else [var_edge]:
+            edge_to_vars.setdefault(alternative, []).append(i)
+
+    found, applied = set(), set()
+    new_edge = _apply_variables(edge, edge_to_vars, var_names, found, applied)
+    if len(found) != len(var_names):
+        missing = [name for i, name in enumerate(var_names) if i not in found]
+        logging.debug(f"{edge=}, variables not found: {missing}")
+        return None
+    if len(applied) != len(var_names):
+        ambiguous = [name for i, name in enumerate(var_names) if i not in applied]
+        logging.debug(f"{edge=}, variables replaced by others: {ambiguous}")
+        return None
+
+    return new_edge
+
+
+def _apply_variables_one_by_one(edge, variables):
     new_edge = edge
     for var_name, var_edge in variables.items():
         logging.debug(f"{edge=}, {var_name=}, {var_edge=}")
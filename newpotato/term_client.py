@@ -1,7 +1,5 @@
 import argparse
-import json
 import logging
-import os
 
 logging.basicConfig(
     format="%(asctime)s : %(module)s (%(lineno)s) - %(levelname)s - %(message)s",
@@ -16,7 +14,11 @@ from rich.table import Table
 from tqdm import tqdm
 
 # from newpotato.evaluate.eval_hitl import HITLEvaluator
+from newpotato.evaluate.benchmark import benchmark_extraction, benchmark_max_extr
+from newpotato.evaluate.results_store import ResultsStore
+from newpotato.evaluate.sweep import sweep_predictions
 from newpotato.evaluate.wire_functions import *
+from newpotato.evaluate.wire_scorer import iter_sentence_pairs, score_predictions
 from newpotato.hitl_marina import HITLManager
 
 # from newpotato.modifications.oie_patterns import *
@@ -128,9 +130,11 @@ class NPTerminalClient:
         triplets = self.hitl.get_true_triplets()
         self.print_triplets(triplets, max_n=10)
 
-    def print_rules(self, top_n=20):
+    def print_rules(self, top_n=20, n_workers=1, chunk_size=None):
         if self.hitl.extractor.patterns is None:
-            rules = self.hitl.get_rules(top_n)
+            rules = self.hitl.get_rules(
+                top_n, n_workers=n_workers, chunk_size=chunk_size
+            )
         else:
             rules = self.hitl.extractor.patterns
         console.print("[bold green]Extracted Rules:[/bold green]")
@@ -153,7 +157,7 @@ class NPTerminalClient:
         console.print(table)
 
     # function to evaluate patterns on unseen data
-    def evaluate(self, data=None):
+    def evaluate(self, data=None, n_workers=1, shard_size=100, warm_runs=0):
         if self.hitl.extractor.patterns is None:
             console.print("[bold cyan]Enter path to patterns file:[/bold cyan]")
             fn = input("> ")
@@ -179,61 +183,127 @@ class NPTerminalClient:
             console.print("[bold red]Please enter an integer > 0![/bold red]")
             return
 
-        if data:
-            raw_rate, evaluated_rate, avg_latency = (
-                self.hitl.extractor.generate_triplets_and_gold_data(
-                    input=data, max_extr=int(max_extr)
-                )
-            )
-        else:
+        if not data:
             console.print("[bold cyan]Enter path to test data:[/bold cyan]")
             data = input("> ")
 
-            try:
-                raw_rate, evaluated_rate, avg_latency = (
-                    self.hitl.extractor.generate_triplets_and_gold_data(
-                        input=data, max_extr=int(max_extr)
-                    )
-                )
-            except FileNotFoundError:
-                console.print(f"[bold red]No such file or directory: {data}[/bold red]")
-            else:
-                return
+        try:
+            benchmark = benchmark_extraction(
+                self.hitl.extractor,
+                data,
+                int(max_extr),
+                n_warm_runs=warm_runs,
+                n_workers=n_workers,
+                shard_size=shard_size,
+            )
+        except FileNotFoundError:
+            console.print(f"[bold red]No such file or directory: {data}[/bold red]")
+            return
 
+        raw_rate = benchmark["raw_rate"]
+        evaluated_rate = benchmark["evaluated_rate"]
+        avg_latency = benchmark["avg_latency"]
         console.print(f"Raw triplets per second: {raw_rate:.2f}")
         console.print(f"Evaluated triplets per second: {evaluated_rate:.2f}")
-        console.print(f"Average latency per sentence: {avg_latency:.6f} seconds")
-
-        # TODO: name of output file as argument
-        # load json file with results if it exists
-        json_file = "evaluation_results.json"
-        if os.path.exists(json_file):
-            with open(json_file, "r") as f:
-                try:
-                    results_dict = json.load(f)
-                except json.JSONDecodeError:
-                    results_dict = {}
-        else:
-            results_dict = {}
+        console.print(f"Average match latency per sentence: {avg_latency:.6f} seconds")
+        self.print_benchmark(benchmark)
 
         # evaluate triplets with WiRe57 scorer
         console.print("[bold cyan]evaluation with wire scorer[/bold cyan]")
-        gold_data = data.split(".")[0] + "_gold.json"
-        pred_data = data.split(".")[0] + "_pred.json"
-        reference = json.load(open(gold_data))
-        # gold_data = dict of documents, each doc a list of sents with a "tuples" attribute,
-        # which is the list of reference tuples
-        gold = {s["id"]: s["tuples"] for doc in reference.values() for s in doc}
-        all_predictions = json.load(open(pred_data))
-        predictions_by_OIE = split_tuples_by_extractor(gold.keys(), all_predictions)
-        systems = predictions_by_OIE.keys()
+        gold_data = data.split(".")[0] + "_gold.jsonl"
+        pred_data = data.split(".")[0] + "_pred.jsonl"
+        # one sentence per line, with a "tuples" attribute holding the reference
+        # tuples, streamed and scored by n_workers processes
+        result_per_system, sorted_reports = self.score_systems(
+            iter_sentence_pairs(gold_data, pred_data), n_workers=n_workers
+        )
+        print("\n" + "\n\n".join(sorted_reports))
+
+        console.print("[bold cyan]Enter remark for documentation:[/bold cyan]")
+        remark = input("> ")
+
+        results = {
+            "nr_of_patterns": len(self.hitl.extractor.patterns),
+            "max_nr_of_extractions": int(max_extr),
+            "results": result_per_system,
+            "remark": remark,
+            "raw_rate": raw_rate,
+            "evaluated_rate": evaluated_rate,
+            "avg_latency": avg_latency,
+            "benchmark": {
+                run: benchmark[run] for run in ("cold", "warm") if run in benchmark
+            },
+        }
+        self.save_results(data, [results])
+
+    def sweep(self, data, pattern_counts, max_extrs, n_workers=1, shard_size=100):
+        """
+        Evaluate all combinations of the number of patterns and the maximum number of
+        extractions with a single extraction pass over the test data (see
+        evaluate.sweep), e.g. for plot_results.py.
+        """
+        extractor = self.hitl.extractor
+        if extractor.get_n_rules() < max(pattern_counts):
+            console.print(
+                f"[bold red]{max(pattern_counts)} patterns are needed for the sweep, "
+                f"but only {extractor.get_n_rules()} are loaded![/bold red]"
+            )
+            return
+
+        console.print("[bold cyan]inferring ranked triplets[/bold cyan]")
+        raw_rate, _, avg_latency = extractor.generate_triplets_and_gold_data(
+            input=data,
+            max_extr=max(max_extrs),
+            n_workers=n_workers,
+            shard_size=shard_size,
+            ranked=True,
+        )
+        console.print(f"Raw triplets per second: {raw_rate:.2f}")
+        console.print(f"Average match latency per sentence: {avg_latency:.6f} seconds")
+
+        gold = load_tuples(data.split(".")[0] + "_gold.jsonl")
+        ranked = load_tuples(data.split(".")[0] + "_ranked.jsonl")
+        all_results = []
+        grid = sweep_predictions(ranked, pattern_counts, max_extrs)
+        for (n_patterns, max_extr), all_predictions in grid:
+            console.print(
+                f"[bold cyan]{n_patterns} patterns, {max_extr} extractions[/bold cyan]"
+            )
+            pairs = ((s, gold[s], all_predictions.get(s, [])) for s in gold)
+            result_per_system, sorted_reports = self.score_systems(
+                pairs, n_workers=n_workers
+            )
+            print("\n\n".join(sorted_reports))
+            all_results.append(
+                {
+                    "nr_of_patterns": n_patterns,
+                    "max_nr_of_extractions": max_extr,
+                    "results": result_per_system,
+                }
+            )
+        self.save_results(data, all_results)
+
+    def score_systems(self, pairs, n_workers=1):
+        """
+        Score the predictions of each system with the WiRe57 scorer (see
+        evaluate.wire_scorer.score_predictions).
+
+        Args:
+            pairs (Iterable[SentencePair]): the sentence id, gold tuples and predicted
+                tuples of each sentence
+            n_workers (int): the number of worker processes
+
+        Returns:
+            Tuple[Dict, List[str]]: the results of each system and the reports of
+                the systems, by descending F1 score
+        """
         reports = {}
         result_per_system = {}
 
-        for e in systems:
+        scores = score_predictions(pairs, n_workers=n_workers)
+        for e, (metrics, raw_match_scores) in scores.items():
             report = ""
             logging.info(f"Evaluating {e} system ...")
-            metrics, raw_match_scores = eval_system(gold, predictions_by_OIE[e])
             # with open("raw_scores/" + e + "_prec_scores.dat", "w") as f:
             #     f.write(str(raw_match_scores[0]))
             # with open("raw_scores/" + e + "_rec_scores.dat", "w") as f:
@@ -284,34 +354,68 @@ class NPTerminalClient:
                 },
             }
         sorted_reports = [a[1] for a in sorted(reports.items(), reverse=True)]
-        print("\n" + "\n\n".join(sorted_reports))
+        return result_per_system, sorted_reports
 
-        console.print("[bold cyan]Enter remark for documentation:[/bold cyan]")
-        remark = input("> ")
+    def save_results(self, data, all_results):
+        # TODO: name of output file as argument
+        # append to the results store, which imports evaluation_results.json once
+        store = ResultsStore()
+        store.append(data, all_results)
 
-        results = {
-            "nr_of_patterns": len(self.hitl.extractor.patterns),
-            "max_nr_of_extractions": int(max_extr),
-            "results": result_per_system,
-            "remark": remark,
-            "raw_rate": raw_rate,
-            "evaluated_rate": evaluated_rate,
-            "avg_latency": avg_latency,
-        }
+        print(
+            f"Saved new results for '{data}'. Total evaluations stored: {store.count(dataset=data)}"
+        )
 
-        # Append to existing key or create a new list
-        if data in results_dict:
-            results_dict[data].append(results)
-        else:
-            results_dict[data] = [results]
+    def print_benchmark(self, benchmark):
+        table = Table(show_header=True, header_style="bold magenta")
+        for column in ("Run", "Stage", "p50 (ms)", "p90 (ms)", "p99 (ms)", "max (ms)"):
+            table.add_column(column)
+        for run in ("cold", "warm"):
+            if run not in benchmark:
+                continue
+            for stage, stats in benchmark[run]["stages"].items():
+                table.add_row(
+                    run,
+                    stage,
+                    *(
+                        f"{stats[key]:.3f}"
+                        for key in ("p50_ms", "p90_ms", "p99_ms", "max_ms")
+                    ),
+                )
+        console.print(table)
 
-        # Save the updated data back to the file
-        with open(json_file, "w") as f:
-            json.dump(results_dict, f, indent=4)
+    def benchmark_max_extr(
+        self, data, max_extrs, n_workers=1, shard_size=100, warm_runs=1
+    ):
+        """
+        Benchmark the extraction on the test data for each maximum number of
+        extractions and print the latency of the match stage (see
+        evaluate.benchmark.benchmark_max_extr).
+        """
+        if self.hitl.extractor.patterns is None:
+            console.print("[bold red]No patterns loaded![/bold red]")
+            return
 
-        print(
-            f"Saved new results for '{data}'. Total evaluations stored: {len(results_dict[data])}"
+        benchmarks = benchmark_max_extr(
+            self.hitl.extractor,
+            data,
+            max_extrs,
+            n_warm_runs=warm_runs,
+            n_workers=n_workers,
+            shard_size=shard_size,
         )
+        run = "warm" if warm_runs > 0 else "cold"
+        table = Table(show_header=True, header_style="bold magenta")
+        for column in ("Max. extractions", "mean (ms)", "p50 (ms)", "p90 (ms)"):
+            table.add_column(column)
+        for max_extr, benchmark in benchmarks.items():
+            stats = benchmark[run]["stages"]["match"]
+            table.add_row(
+                str(max_extr),
+                *(f"{stats[key]:.3f}" for key in ("mean_ms", "p50_ms", "p90_ms")),
+            )
+        console.print(f"[bold cyan]match stage, {run} runs[/bold cyan]")
+        console.print(table)
 
     def print_graphs(self):
         table = Table(show_header=True, header_style="bold magenta")
@@ -467,11 +571,40 @@ class NPTerminalClient:
 
         if args.get_rules:
             console.print("[cyan]getting rules[/cyan]")
-            self.print_rules(args.rules_cnt)
+            self.print_rules(
+                args.rules_cnt,
+                n_workers=args.rules_workers,
+                chunk_size=args.rules_chunk_size,
+            )
 
         if args.evaluate:
             console.print("[cyan]starting evaluation[/cyan]")
-            self.evaluate(args.evaluate)
+            self.evaluate(
+                args.evaluate,
+                n_workers=args.eval_workers,
+                shard_size=args.eval_shard_size,
+                warm_runs=args.eval_warm_runs,
+            )
+
+        if args.sweep:
+            console.print("[cyan]starting sweep[/cyan]")
+            self.sweep(
+                args.sweep,
+                args.sweep_patterns,
+                args.sweep_max_extr,
+                n_workers=args.eval_workers,
+                shard_size=args.eval_shard_size,
+            )
+
+        if args.benchmark:
+            console.print("[cyan]starting benchmark[/cyan]")
+            self.benchmark_max_extr(
+                args.benchmark,
+                args.benchmark_max_extr,
+                n_workers=args.eval_workers,
+                shard_size=args.eval_shard_size,
+                warm_runs=args.eval_warm_runs,
+            )
 
         if args.save_patterns:
             self.hitl.extractor.save_patterns(args.save_patterns)
@@ -497,7 +630,23 @@ def get_args():
     parser.add_argument("-i", "--interactive", action="store_true")
     parser.add_argument("-r", "--get_rules", action="store_true")
     parser.add_argument("-rc", "--rules_cnt", default=20, type=int)
+    parser.add_argument("-rw", "--rules_workers", default=1, type=int)
+    parser.add_argument("-rcs", "--rules_chunk_size", default=None, type=int)
     parser.add_argument("-e", "--evaluate", default=None, type=str)
+    parser.add_argument("-ew", "--eval_workers", default=1, type=int)
+    parser.add_argument("-ess", "--eval_shard_size", default=100, type=int)
+    parser.add_argument("-ewr", "--eval_warm_runs", default=0, type=int)
+    parser.add_argument("-sw", "--sweep", default=None, type=str)
+    parser.add_argument(
+        "-swp", "--sweep_patterns", default=[5, 10, 15, 20], type=int, nargs="+"
+    )
+    parser.add_argument(
+        "-swe", "--sweep_max_extr", default=[1, 2, 3, 4, 5], type=int, nargs="+"
+    )
+    parser.add_argument("-b", "--benchmark", default=None, type=str)
+    parser.add_argument(
+        "-bme", "--benchmark_max_extr", default=[1, 2, 3, 4, 5], type=int, nargs="+"
+    )
     parser.add_argument("-l", "--load_state", default=None, type=str)
     parser.add_argument("-lp", "--load_patterns", default=None, type=str)
     parser.add_argument("-u", "--upload_text", default=None, type=str)
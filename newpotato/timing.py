@@ -0,0 +1,98 @@
+import math
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+# stages of the extraction pipeline, in the order in which they run
+STAGES = ("parse", "map", "match", "combine", "serialize")
+
+
+def percentile(sorted_values: List[int], q: float) -> int:
+    """
+    Get the q-th percentile (nearest rank) of a sorted list of values.
+    """
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageTimer:
+    """A class to collect the durations of the stages of an extraction run.
+
+    All durations are measured with time.perf_counter_ns and stored per sentence, so
+    that the summary can report percentiles and not only means.
+
+    Attributes:
+        durations (Dict[str, List[int]]): the durations of each stage in nanoseconds
+        counts (Counter): counts of processed items, e.g. sentences and extractions
+        wall_time (int): the total time of the run in nanoseconds
+    """
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self.counts = Counter()
+        self.wall_time = 0
+
+    def add(self, stage: str, duration: int):
+        self.durations[stage].append(duration)
+
+    def add_times(self, times: Dict[str, int]):
+        for stage, duration in times.items():
+            self.add(stage, duration)
+
+    @contextmanager
+    def time_run(self):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.wall_time += time.perf_counter_ns() - start
+
+    def count(self, key: str, n: int = 1):
+        self.counts[key] += n
+
+    def total(self, stage: str) -> int:
+        return sum(self.durations.get(stage, []))
+
+    def mean(self, stage: str) -> float:
+        durations = self.durations.get(stage, [])
+        return sum(durations) / len(durations) if durations else 0.0
+
+    def update(self, other: "StageTimer"):
+        """
+        Add the durations and counts of another run, e.g. of a repeated warm run.
+        """
+        for stage, durations in other.durations.items():
+            self.durations[stage] += durations
+        self.counts.update(other.counts)
+        self.wall_time += other.wall_time
+
+    def stage_summary(self, stage: str) -> Dict[str, float]:
+        durations = sorted(self.durations.get(stage, []))
+        to_ms = 1e-6
+        return {
+            "count": len(durations),
+            "total_ms": sum(durations) * to_ms,
+            "mean_ms": self.mean(stage) * to_ms,
+            "p50_ms": percentile(durations, 50) * to_ms,
+            "p90_ms": percentile(durations, 90) * to_ms,
+            "p99_ms": percentile(durations, 99) * to_ms,
+            "max_ms": (durations[-1] if durations else 0) * to_ms,
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the run as a JSON-serializable dict.
+        """
+        stages = list(STAGES) + sorted(set(self.durations) - set(STAGES))
+        wall_s = self.wall_time * 1e-9
+        return {
+            "wall_s": wall_s,
+            "counts": dict(self.counts),
+            "sentences_per_second": (
+                self.counts["sentences"] / wall_s if wall_s else 0.0
+            ),
+            "stages": {stage: self.stage_summary(stage) for stage in stages},
+        }
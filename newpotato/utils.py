@@ -3,10 +3,11 @@ import operator
 import logging
 import re
 from functools import reduce
-from typing import Tuple
+from typing import Tuple, Union
 
 from stanza.models.common.doc import Sentence
 
+from newpotato.compact_graph import CompactUDGraph
 from newpotato.datatypes import Triplet
 
 
@@ -132,7 +133,9 @@ def get_triplet_from_annotation(
 
 
 def get_toks_from_txt(
-    words_txt: str, sen: Sentence, ignore_brackets: bool = False
+    words_txt: str,
+    sen: Union[Sentence, CompactUDGraph],
+    ignore_brackets: bool = False,
 ) -> Tuple[int, ...]:
     """
     Map a substring of a sentence to its tokens. Used to parse annotations of triplets
@@ -140,16 +143,20 @@ def get_toks_from_txt(
 
     Args:
         words_txt (str): the substring of the sentence
-        sen (Sentence): stanza sentence
+        sen (Union[Sentence, CompactUDGraph]): stanza sentence or compact graph
         ignore_brackets (bool): whether to remove brackets from the text before matching (required for ORE annotation)
 
     Returns:
         Tuple[int, ...] the tokens of the sentence corresponding to the substring
     """
+    if isinstance(sen, CompactUDGraph):
+        tokens, start_chars = sen.tokens, sen.start_chars
+    else:
+        tokens = [tok.text for tok in sen.tokens]
+        start_chars = [tok.start_char for tok in sen.tokens]
+
     logging.debug(f"{words_txt=}, {sen.text=}")
-    logging.debug(
-        f"enumerated tokens: {[(i, tok.text) for i, tok in enumerate(sen.tokens)]}"
-    )
+    logging.debug(f"enumerated tokens: {list(enumerate(tokens))}")
     if ignore_brackets:
         pattern = re.escape(re.sub('["()]', "", words_txt))
     else:
@@ -171,10 +178,12 @@ def get_toks_from_txt(
     logging.debug(f"span: {(start, end)}")
 
     tok_i, tok_j = None, None
-    for i, token in enumerate(sen.tokens):
-        if token.start_char == start:
+    for i, start_char in enumerate(start_chars):
+        if start_char is None:
+            continue
+        if start_char == start:
             tok_i = i
-        if token.start_char >= end:
+        if start_char >= end:
             tok_j = i
             break
     if tok_i is None:
@@ -183,7 +192,7 @@ def get_toks_from_txt(
         )
         raise AnnotatedWordsNotFoundError()
     if tok_j is None:
-        tok_j = len(sen.tokens)
+        tok_j = len(tokens)
 
     tok_ids_to_return = tuple(range(tok_i, tok_j))
     logging.debug(f"{tok_ids_to_return=}")
@@ -1,12 +1,13 @@
 import inspect
 import json
 
-import graphbrain.patterns as pattrn
 from graphbrain import *
 from graphbrain.hyperedge import UniqueAtom, hedge
 from graphbrain.parsers import *
 from graphbrain.utils.conjunctions import conjunctions_decomposition, predicate
 
+from newpotato.modifications.pattern_compiler import compile_pattern
+
 # The 10 patterns that are shown in Table 4 and discussed in section 4.2.
 # PATTERNS = [
 #     "(REL/P.so,x ARG1 ARG2 ARG3+)",
@@ -40,6 +41,9 @@ PATTERNS = [
 ]
 
 
+COMPILED_PATTERNS = [compile_pattern(pattern) for pattern in PATTERNS]
+
+
 # Directories & files
 DIR = "WiRe57/data"
 EXTR_MANUAL = "WiRe57_343-manual-oie.json"
@@ -157,9 +161,33 @@ def add_to_extractions(extractions, edge, sent_id, arg1, rel, arg2, arg3):
             extractions[extraction]["data"]["arg3+"] = arg3
 
 
-def find_tuples(extractions, edge, sent_id, atom2word):
-    for pattern in PATTERNS:
-        for match in pattrn.match_pattern(edge, pattern):
+class SentenceMemo:
+    """Decompositions and pattern matches of the edges of one sentence, shared across
+    the levels of information_extraction.
+
+    Edges are keyed by their structure and the identity of their atoms, since labels
+    are looked up in atom2word by atom identity.
+
+    Attributes:
+        decompositions (Dict[Tuple, List[Hyperedge]]): main conjunctions of the
+            conjunction decomposition of each edge
+        tuples (Dict[Tuple, List[Tuple]]): labels of (arg1, rel, arg2, arg3) matched
+            in each edge
+    """
+
+    def __init__(self):
+        self.decompositions = {}
+        self.tuples = {}
+
+
+def _edge_key(edge):
+    return edge, tuple(id(atom) for atom in edge.all_atoms())
+
+
+def match_tuples(edge, atom2word):
+    tuples = []
+    for matcher in COMPILED_PATTERNS:
+        for match in matcher(edge):
             arg1 = match["ARG1"]
             arg2 = match["ARG2"]
             if "ARG3..." in match:
@@ -180,19 +208,47 @@ def find_tuples(extractions, edge, sent_id, atom2word):
             arg1 = label(arg1, atom2word)
             arg2 = label(arg2, atom2word)
 
-            add_to_extractions(extractions, edge, sent_id, arg1, rel, arg2, arg3)
+            tuples.append((arg1, rel, arg2, arg3))
+    return tuples
+
+
+def find_tuples(extractions, edge, sent_id, atom2word, memo=None):
+    if memo is None:
+        tuples = match_tuples(edge, atom2word)
+    else:
+        key = _edge_key(edge)
+        if key not in memo.tuples:
+            memo.tuples[key] = match_tuples(edge, atom2word)
+        tuples = memo.tuples[key]
+
+    for arg1, rel, arg2, arg3 in tuples:
+        # copy arg3, add_to_extractions may extend it
+        add_to_extractions(extractions, edge, sent_id, arg1, rel, arg2, list(arg3))
+
+
+def decompose(edge, memo=None):
+    if memo is None:
+        return [
+            main_conjunction(decomposed)
+            for decomposed in conjunctions_decomposition(edge, concepts=True)
+        ]
+    key = _edge_key(edge)
+    if key not in memo.decompositions:
+        memo.decompositions[key] = decompose(edge)
+    return memo.decompositions[key]
 
 
-def information_extraction(extractions, main_edge, sent_id, atom2word):
+def information_extraction(extractions, main_edge, sent_id, atom2word, memo=None):
+    if memo is None:
+        memo = SentenceMemo()
     if main_edge.is_atom():
         return
     if main_edge.type()[0] == "R":
         # edges = conjunctions_resolution(main_edge, atom2word)
-        edges = conjunctions_decomposition(main_edge, concepts=True)
-        for edge in edges:
-            find_tuples(extractions, main_conjunction(edge), sent_id, atom2word)
+        for edge in decompose(main_edge, memo):
+            find_tuples(extractions, edge, sent_id, atom2word, memo)
     for edge in main_edge:
-        information_extraction(extractions, edge, sent_id, atom2word)
+        information_extraction(extractions, edge, sent_id, atom2word, memo)
 
 
 def parse_sent(extractions, parser, sent, sent_id):
@@ -201,7 +257,9 @@ def parse_sent(extractions, parser, sent, sent_id):
         main_edge = parse["main_edge"]
         atom2word = parse["atom2word"]
         if main_edge:
-            information_extraction(extractions, main_edge, sent_id, atom2word)
+            information_extraction(
+                extractions, main_edge, sent_id, atom2word, SentenceMemo()
+            )
 
 
 if __name__ == "__main__":
@@ -1,14 +1,22 @@
-import json
 from collections import Counter
 
 import matplotlib.colors as mcolors
 import matplotlib.pyplot as plt
 import numpy as np
 
-# load JSON file
-json_file = "evaluation_results.json"
-with open(json_file, "r") as f:
-    data_dict = json.load(f)
+from newpotato.evaluate.results_store import ResultsStore
+
+# load results by input file from the results store
+# results without a configuration (nr_of_patterns IS NULL) are left out
+store = ResultsStore()
+data_dict = {
+    input_file: [
+        eval_data
+        for eval_data in store.query(dataset=input_file)
+        if eval_data.get("nr_of_patterns") is not None
+    ]
+    for input_file in store.datasets()
+}
 
 # choose which precision-recall values to plot ("total", "matches_only", "exact_match")
 category = "total"
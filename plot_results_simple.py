@@ -1,13 +1,21 @@
-import json
 import random
 from collections import Counter
 
 import matplotlib.pyplot as plt
 
-# Load JSON file
-json_file = "evaluation_results.json"
-with open(json_file, "r") as f:
-    data_dict = json.load(f)
+from newpotato.evaluate.results_store import ResultsStore
+
+# Load results by input file from the results store
+# results without a configuration (nr_of_patterns IS NULL) are left out
+store = ResultsStore()
+data_dict = {
+    input_file: [
+        eval_data
+        for eval_data in store.query(dataset=input_file)
+        if eval_data.get("nr_of_patterns") is not None
+    ]
+    for input_file in store.datasets()
+}
 
 category = "total"  # Choose which precision-recall values to plot ("total", "matches_only", "exact_match")
 
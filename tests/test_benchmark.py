@@ -0,0 +1,79 @@
+import json
+import os
+
+from newpotato.evaluate.benchmark import benchmark_extraction, benchmark_max_extr
+from newpotato.timing import STAGES, StageTimer, percentile
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 90) == 90
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([7], 1) == 7
+    assert percentile([], 50) == 0
+
+
+def test_stage_timer():
+    cold, warm = StageTimer(), StageTimer()
+    for i in range(1, 11):
+        cold.add_times({"parse": i * 1_000_000, "match": 2_000_000})
+        cold.count("sentences")
+    warm.add("parse", 5_000_000)
+    warm.count("sentences")
+    warm.wall_time = 1_000_000_000
+
+    cold.update(warm)
+    summary = cold.summary()
+    # the summary is machine-readable and lists the pipeline stages first
+    assert json.loads(json.dumps(summary)) == summary
+    assert list(summary["stages"])[: len(STAGES)] == list(STAGES)
+    assert summary["counts"] == {"sentences": 11}
+    assert summary["sentences_per_second"] == 11
+
+    parse = summary["stages"]["parse"]
+    assert parse["count"] == 11
+    assert parse["p50_ms"] == 5
+    assert parse["max_ms"] == 10
+    assert summary["stages"]["match"]["mean_ms"] == 2
+    assert summary["stages"]["combine"]["count"] == 0
+
+
+class GoldWritingExtractor:
+    """Writes the gold data like generate_triplets_and_gold_data and records the
+    runs."""
+
+    def __init__(self):
+        self.runs = []
+        self.cascade_index = None
+
+    def generate_triplets_and_gold_data(self, input, max_extr, timer=None):
+        goldfile = input.split(".")[0] + "_gold.jsonl"
+        self.runs.append((os.path.exists(goldfile), timer is not None))
+        with open(goldfile, "w") as f:
+            f.write("{}\n")
+        return 1.0, 1.0, 0.1
+
+    def get_n_rules(self):
+        return 3
+
+
+def test_benchmark_extraction_creates_gold_first(tmp_path):
+    extractor = GoldWritingExtractor()
+    report = benchmark_extraction(extractor, str(tmp_path / "test.tsv"), 2, 2)
+    # an untimed run creates the gold data, all timed runs read it
+    assert extractor.runs == [(False, False), (True, True), (True, True), (True, True)]
+    assert report["warm"]["runs"] == 2
+
+    extractor.runs = []
+    benchmark_extraction(extractor, str(tmp_path / "test.tsv"), 2)
+    assert extractor.runs == [(True, True)]
+
+
+def test_benchmark_max_extr(tmp_path):
+    extractor = GoldWritingExtractor()
+    benchmarks = benchmark_max_extr(extractor, str(tmp_path / "test.tsv"), [3, 1])
+    assert list(benchmarks) == [1, 3]
+    assert [b["max_extr"] for b in benchmarks.values()] == [1, 3]
+    assert all(b["warm"]["runs"] == 1 for b in benchmarks.values())
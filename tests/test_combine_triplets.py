@@ -0,0 +1,88 @@
+import json
+import random
+from difflib import SequenceMatcher
+
+from newpotato.extractors.graphbrain_extractor_PC import combine_triplets, is_similar
+
+
+def is_similar_by_ratio(s1, s2, threshold=0.5):
+    return SequenceMatcher(None, s1, s2).ratio() >= threshold
+
+
+def combine_triplets_by_ratio(entries):
+    grouped = {}
+    for entry in entries:
+        group_key = (entry["arg1"], entry["rel"])
+        if group_key not in grouped:
+            grouped[group_key] = {
+                k: v for k, v in entry.items() if k not in ["arg2", "arg3+"]
+            }
+            grouped[group_key]["arg2"] = entry["arg2"]
+            grouped[group_key]["arg3+"] = list(entry.get("arg3+", []))
+        else:
+            group = grouped[group_key]
+            if not is_similar_by_ratio(group["arg2"], entry["arg2"]):
+                if not any(
+                    is_similar_by_ratio(entry["arg2"], existing)
+                    for existing in group["arg3+"]
+                ):
+                    group["arg3+"].append(entry["arg2"])
+            for new_arg in entry.get("arg3+", []):
+                if not is_similar_by_ratio(new_arg, group["arg2"]) and not any(
+                    is_similar_by_ratio(new_arg, existing)
+                    for existing in group["arg3+"]
+                ):
+                    group["arg3+"].append(new_arg)
+
+    for val in grouped.values():
+        if not val["arg3+"]:
+            del val["arg3+"]
+    return list(grouped.values())
+
+
+def get_entries(rng):
+    with open("data/opc_gold.jsonl") as f:
+        sens = [json.loads(line) for line in f]
+
+    args = [
+        arg for sen in sens for triplet in sen["triplets"] for arg in triplet["args"]
+    ]
+    for sen in sens:
+        entries = []
+        for triplet in sen["triplets"]:
+            arg1, *rest = triplet["args"] + [""]
+            for arg2 in [rest[0]] + rng.sample(args, 5):
+                entries.append(
+                    {
+                        "arg1": arg1,
+                        "rel": triplet["rel"],
+                        "arg2": arg2,
+                        "arg3+": rest[1:-1] + rng.sample(args, rng.randint(0, 3)),
+                        "extractor": "shg",
+                        "score": 1.0,
+                    }
+                )
+        rng.shuffle(entries)
+        yield entries
+
+
+def test_is_similar():
+    rng = random.Random(0)
+    with open("data/opc_gold.jsonl") as f:
+        args = [
+            arg
+            for line in f
+            for triplet in json.loads(line)["triplets"]
+            for arg in [triplet["rel"]] + triplet["args"]
+        ]
+    for _ in range(5000):
+        s1, s2 = rng.choice(args), rng.choice(args)
+        assert is_similar(s1, s2) == is_similar_by_ratio(s1, s2)
+    assert is_similar("", "")
+
+
+def test_combine_triplets():
+    rng = random.Random(42)
+    for entries in get_entries(rng):
+        expected = combine_triplets_by_ratio(json.loads(json.dumps(entries)))
+        assert combine_triplets(entries) == expected
@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from networkx.utils import graphs_equal
+from tuw_nlp.graph.ud_graph import UDGraph
+
+from newpotato.compact_graph import (
+    DEPREL,
+    HEAD,
+    LEMMA,
+    N_COLUMNS,
+    NO_HEAD,
+    ROOT_ID,
+    TOKEN,
+    UPOS,
+    VOCAB,
+    CompactUDGraph,
+)
+from newpotato.utils import get_toks_from_txt
+
+
+def test_compact_graph():
+    with open("data/drugs_sample.hitl") as f:
+        data = json.load(f)
+
+    for item in data["extractor_data"]["parsed_graphs"]:
+        graph = UDGraph.from_json(item["graph"])
+        compact_graph = CompactUDGraph.from_json(item["graph"])
+
+        assert compact_graph.tokens == graph.tokens
+        assert compact_graph.lemmas == [w.lemma for w in graph.stanza_sen.words]
+        assert graphs_equal(compact_graph.G, graph.G)
+
+        new_graph = UDGraph.from_json(compact_graph.to_json())
+        assert graphs_equal(new_graph.G, graph.G)
+
+
+def test_slim_graph():
+    with open("data/drugs_sample.hitl") as f:
+        data = json.load(f)
+
+    for item in data["extractor_data"]["parsed_graphs"]:
+        graph = UDGraph.from_json(item["graph"])
+        slim_graph = CompactUDGraph.from_json(item["graph"], slim=True)
+
+        assert slim_graph.slim
+        assert slim_graph.lemmas == [w.lemma for w in graph.stanza_sen.words]
+        assert slim_graph.start_chars == [w.start_char for w in graph.stanza_sen.words]
+        assert graphs_equal(UDGraph.from_json(slim_graph.to_json()).G, graph.G)
+
+        word = graph.tokens[-2]
+        assert get_toks_from_txt(word, slim_graph) == get_toks_from_txt(
+            word, graph.stanza_sen
+        )
+
+
+def get_strings(graph):
+    return graph.tokens, graph.lemmas, graph.upos, graph.deprels, graph.heads.tolist()
+
+
+def test_pickle_in_spawned_process():
+    # strings that only the vocab of this process knows
+    for i in range(100):
+        VOCAB.get_id(f"string {i}")
+    words = [("Adam", "adam", "PROPN"), ("loves", "love", "VERB"), ("Andi", None, "X")]
+    data = np.full((len(words), N_COLUMNS), -1, dtype=np.int32)
+    data[:, HEAD] = [1, ROOT_ID, NO_HEAD]
+    for i, (token, lemma, upos) in enumerate(words):
+        data[i, TOKEN] = VOCAB.get_id(token)
+        data[i, LEMMA] = VOCAB.get_id(lemma)
+        data[i, UPOS] = VOCAB.get_id(upos)
+    data[0, DEPREL] = VOCAB.get_id("NSUBJ")
+    data[1, DEPREL] = VOCAB.get_id("ROOT")
+    graph = CompactUDGraph(data, text="Adam loves Andi")
+
+    copy = pickle.loads(pickle.dumps(graph))
+    assert np.array_equal(copy.data, graph.data)
+    assert copy.text == graph.text
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        assert executor.submit(get_strings, graph).result() == get_strings(graph)
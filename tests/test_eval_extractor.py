@@ -0,0 +1,48 @@
+import pytest
+
+from newpotato.datatypes import Triplet
+from newpotato.evaluate.eval_extractor import (
+    kfold_splits,
+    run_folds,
+    summarize_folds,
+)
+
+
+class DummyExtractor:
+    """Predicts the triplet of a sentence if its last word was seen in training."""
+
+    def get_rules(self, text_to_triplets):
+        self.words = {sen.split()[-1] for sen in text_to_triplets}
+
+    def infer_triplets(self, sen):
+        if sen.split()[-1] in self.words:
+            return [Triplet((0,), ((1,), (2,)))]
+        return []
+
+
+def test_kfold_splits():
+    gold_data = {f"sentence {i}": [] for i in range(23)}
+    splits = kfold_splits(gold_data, 5)
+    assert [len(val_data) for _, val_data in splits] == [4, 5, 4, 5, 5]
+    for train_data, val_data in splits:
+        assert not train_data.keys() & val_data.keys()
+        assert train_data.keys() | val_data.keys() == gold_data.keys()
+    assert [sen for _, val_data in splits for sen in val_data] == list(gold_data)
+
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_run_folds(tmp_path, n_workers):
+    gold_data = {
+        f"sentence {i} {i % 4}": [(Triplet((0,), ((1,), (2,))), True)]
+        for i in range(40)
+    }
+    fold_results = run_folds(
+        DummyExtractor(), gold_data, 4, n_workers=n_workers, events_dir=tmp_path
+    )
+    assert [res["n_docs"] for res in fold_results] == [10] * 4
+    assert all(res["recall"] == 1.0 for res in fold_results)
+    assert len((tmp_path / "events_3.tsv").read_text().splitlines()) == 10
+
+    summary = summarize_folds(fold_results)
+    assert summary["recall_mean"] == 1.0
+    assert summary["recall_var"] == 0.0
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+from newpotato.datatypes import Triplet
+from newpotato.evaluate.evaluate import Evaluator
+
+
+class DummyEvaluator(Evaluator):
+    """Predicts the gold triplets of every third sentence and a wrong triplet for
+    every other sentence."""
+
+    def __init__(self, n_sens, **kwargs):
+        super(DummyEvaluator, self).__init__(**kwargs)
+        self.n_sens = n_sens
+
+    def infer_triplets(self, sen):
+        i = int(sen.split()[-1])
+        if i % 3 == 0:
+            return self.get_golds(i)
+        return [Triplet((0,), ((i % 2 + 1,), (3,)))]
+
+    def get_golds(self, i):
+        return [Triplet((0,), ((1,), (2,))), Triplet((0,), ((1,), (i % 4 + 3,)))]
+
+    def gen_texts_with_gold_triplets(self):
+        for i in range(self.n_sens):
+            yield f"sentence {i}", self.get_golds(i)
+
+
+def get_events_tsv(evaluator):
+    stream = io.StringIO()
+    evaluator.write_events(stream)
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("n_workers,chunk_size", [(2, 7), (3, 100)])
+def test_parallel_evaluator(n_workers, chunk_size):
+    serial = DummyEvaluator(50)
+    events = list(serial.get_events())
+    results = serial.get_results()
+    assert results["n_docs"] == 50
+    assert results["docs_corr"] == 17
+
+    evaluator = DummyEvaluator(50, n_workers=n_workers, chunk_size=chunk_size)
+    assert list(evaluator.get_events()) == events
+    assert evaluator.get_results() == results
+
+
+def test_streaming_evaluator():
+    serial = DummyEvaluator(20)
+    events_tsv = get_events_tsv(serial)
+    assert len(events_tsv.splitlines()) == 20
+
+    evaluator = DummyEvaluator(20, n_workers=2, chunk_size=3, keep_events=False)
+    assert get_events_tsv(evaluator) == events_tsv
+    assert evaluator.events is None
+    assert evaluator.get_counts() == serial.get_counts()
+
+
+def test_events_not_kept():
+    evaluator = DummyEvaluator(10, keep_events=False)
+    with pytest.raises(ValueError):
+        evaluator.get_events()
+
+    evaluator.get_results()
+    with pytest.raises(ValueError):
+        evaluator.write_events(io.StringIO())
@@ -0,0 +1,153 @@
+import pytest
+
+from newpotato.datatypes import SentenceFeatures
+from newpotato.extractors.extractor import Extractor
+
+
+class SplitExtractor(Extractor):
+    """A minimal extractor whose graphs are the tokens of each sentence."""
+
+    def _parse_text(self, text, **kwargs):
+        for sen in text.split(". "):
+            yield sen, sen.split()
+
+
+class FeatureSplitExtractor(SplitExtractor):
+    def _get_features(self, graph):
+        return SentenceFeatures(graph)
+
+
+class IndexedSplitExtractor(SplitExtractor):
+    """Rules are phrases, which match the positions where they occur."""
+
+    def __init__(self):
+        super(IndexedSplitExtractor, self).__init__()
+        self.matched_sens = []
+
+    def _get_index_features(self, graph):
+        return {word.lower() for word in graph}
+
+    def _get_pattern_features(self, pattern, **kwargs):
+        return {word.lower() for word in pattern.split()}
+
+    def _match_rule(self, pattern, graph, **kwargs):
+        self.matched_sens.append(" ".join(graph))
+        words = [word.lower() for word in pattern.split()]
+        lowered = [word.lower() for word in graph]
+        return [
+            i
+            for i in range(len(graph) - len(words) + 1)
+            if lowered[i : i + len(words)] == words
+        ]
+
+
+class ViewSplitExtractor(IndexedSplitExtractor):
+    def __init__(self):
+        super(ViewSplitExtractor, self).__init__()
+        self.rules = []
+        self.version = None
+
+    def get_rule_keys(self):
+        return self.rules
+
+    def _get_view_version(self):
+        return self.version
+
+    def _eval_rule(self, rule, sen, graph):
+        return self._match_rule(rule, graph)
+
+
+def test_store_graph_without_features():
+    extractor = SplitExtractor()
+    graphs = extractor.get_graphs("Adam loves Andi. Andi loves Adam")
+    assert graphs == {
+        "Adam loves Andi": ["Adam", "loves", "Andi"],
+        "Andi loves Adam": ["Andi", "loves", "Adam"],
+    }
+    assert extractor.sen_features == {}
+    with pytest.raises(NotImplementedError):
+        extractor.get_features("Adam loves Andi")
+
+
+def test_store_graph_with_features():
+    extractor = FeatureSplitExtractor()
+    extractor.get_graphs("Adam loves Andi")
+    assert extractor.sen_features.keys() == {"Adam loves Andi"}
+    assert extractor.get_features("Adam loves Andi").lowered == [
+        "adam",
+        "loves",
+        "andi",
+    ]
+
+
+def test_candidate_sentences_without_index_features():
+    extractor = SplitExtractor()
+    extractor.get_graphs("Adam loves Andi. Andi loves Adam")
+    assert extractor.feature_index == {}
+    assert extractor.indexed_sens == {"Adam loves Andi", "Andi loves Adam"}
+    assert extractor.candidate_sentences("loves") == {
+        "Adam loves Andi",
+        "Andi loves Adam",
+    }
+
+
+def test_preview_rule():
+    extractor = IndexedSplitExtractor()
+    extractor.get_graphs("Adam loves Andi. Andi loves Adam. Bob hates Andi")
+    assert extractor.preview_rule("loves andi") == {"Adam loves Andi": [1]}
+    # the rule is only matched on the sentences containing all of its words
+    assert sorted(extractor.matched_sens) == ["Adam loves Andi", "Andi loves Adam"]
+    assert extractor.preview_rule("loves Bob") == {}
+
+
+def test_update_view():
+    extractor = ViewSplitExtractor()
+    extractor.get_graphs("Adam loves Andi. Andi loves Adam. Bob hates Andi")
+    extractor.rules = ["loves"]
+    extractor.materialize_view()
+    assert extractor.view == {
+        "Adam loves Andi": {"loves": [1]},
+        "Andi loves Adam": {"loves": [1]},
+    }
+
+    # a new rule is only run on the sentences that contain its words
+    extractor.matched_sens = []
+    extractor.rules = ["loves", "hates andi", "adam"]
+    extractor.update_view()
+    assert sorted(extractor.matched_sens) == [
+        "Adam loves Andi",
+        "Andi loves Adam",
+        "Bob hates Andi",
+    ]
+    assert extractor.get_view("Adam loves Andi") == [("loves", [1]), ("adam", [0])]
+    assert extractor.get_view("Bob hates Andi") == [("hates andi", [1])]
+
+    # removing rules runs nothing and only changes the sentences they matched
+    extractor.matched_sens = []
+    extractor.rules = ["hates andi"]
+    extractor.update_view()
+    assert extractor.matched_sens == []
+    assert extractor.view == {
+        "Adam loves Andi": {},
+        "Andi loves Adam": {},
+        "Bob hates Andi": {"hates andi": [1]},
+    }
+
+
+def test_view_version():
+    extractor = ViewSplitExtractor()
+    extractor.get_graphs("Adam loves Andi. Andi loves Adam")
+    extractor.rules = ["loves"]
+    extractor.materialize_view()
+
+    # the rules are the same, but the view is reset when the version changes
+    extractor.version = 1
+    extractor.matched_sens = []
+    extractor.update_view()
+    assert extractor.view == {}
+    assert extractor.view_sens == set()
+    assert extractor.view_version == 1
+    assert extractor.matched_sens == []
+
+    assert extractor.get_view("Adam loves Andi") == [("loves", [1])]
+    assert extractor.matched_sens == ["Adam loves Andi"]
@@ -1,5 +1,10 @@
+import json
+
 from rich.console import Console
+from tuw_nlp.text.utils import tuple_if_list
 
+from newpotato.compact_graph import CompactUDGraph
+from newpotato.extractors.extractor import Extractor
 from newpotato.extractors.graph_extractor import GraphBasedExtractor
 from newpotato.datatypes import Triplet
 
@@ -18,5 +23,70 @@ def test_graph_extractor():
     ex.print_rules(console)
 
 
+def get_sample_extractor():
+    with open("data/drugs_sample.hitl") as f:
+        data = json.load(f)
+
+    # the graphs are stored directly, so no parser is needed
+    ex = GraphBasedExtractor.__new__(GraphBasedExtractor)
+    Extractor.__init__(ex)
+    for item in data["extractor_data"]["parsed_graphs"]:
+        graph = CompactUDGraph.from_json(item["graph"], slim=True)
+        ex._store_graph(tuple_if_list(item["text"]), graph)
+    ex.load_patterns("data/drugs_sample.patterns")
+    return ex
+
+
+def test_candidate_sentences():
+    ex = get_sample_extractor()
+
+    # predicates are matched by lemma, arguments and triplets by upos
+    for patterns, attrs in (
+        (ex.pred_graphs, None),
+        (ex.all_arg_graphs, ("upos",)),
+        (ex.triplet_graphs, ("upos",)),
+    ):
+        for pattern in patterns:
+            matched = {
+                sen
+                for sen, graph in ex.parsed_graphs.items()
+                if len(ex._match_rule(pattern, graph, attrs=attrs)) > 0
+            }
+            assert matched <= ex.candidate_sentences(pattern, attrs=attrs)
+            assert ex.preview_rule(pattern, attrs=attrs).keys() == matched
+
+
+def test_infer_triplets_from_view():
+    ex = get_sample_extractor()
+
+    def check_view():
+        for text in ex.parsed_graphs:
+            assert [
+                (sen, triplet) for sen, _, triplet in ex._infer_triplets_from_view(text)
+            ] == list(ex._infer_triplets(text))
+
+    ex.materialize_view()
+    check_view()
+
+    # triplet patterns are removed from and added to the view incrementally
+    key, count = ex.triplet_graphs.most_common(1)[0]
+    del ex.triplet_graphs[key]
+    ex._get_matchers()
+    check_view()
+    assert ex.view_sens == set(ex.parsed_graphs)
+    ex.triplet_graphs[key] = count
+    ex._get_matchers()
+    check_view()
+    assert ex.view_sens == set(ex.parsed_graphs)
+
+    # candidate predicates change for all triplet patterns, the view is reset
+    pred, _ = ex.pred_graphs.most_common(1)[0]
+    del ex.pred_graphs[pred]
+    ex._get_matchers()
+    ex.update_view()
+    assert ex.view_sens == set()
+    check_view()
+
+
 if __name__ == "__main__":
     test_graph_extractor()
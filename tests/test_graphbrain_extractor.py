@@ -0,0 +1,286 @@
+import json
+import threading
+
+from graphbrain import hedge
+from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+import newpotato.extractors.graphbrain_extractor_PC as pc
+from newpotato.extractors.extractor import Extractor
+from newpotato.extractors.graphbrain_extractor_PC import (
+    GraphbrainExtractor,
+    GraphbrainMappedTriplet,
+)
+from newpotato.extractors.graphbrain_parser import GraphbrainParserClient
+
+PATTERNS = [
+    "(REL/P.{sox} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{so} ARG1/C ARG2)",
+    "(likes/P.{so} ARG1/C ARG2)",
+    "((not/M REL/P.{sc}) ARG1/C ARG2)",
+    "(+/B.{ma} (ARG1/C...) (ARG2/C...))",
+    "(+/B.{ma} ARG1/C berlin/C)",
+    "(REL1/P.{sx}-oc ARG1/C (in/T ARG2))",
+    "(REL/P.{so} (var ARG1/C X) ARG2)",
+    "(*/J ...)",
+]
+
+EDGES = [
+    "(likes/Pd.so mary/Cp.s astronomy/Cc.o)",
+    "((not/M is/P.sc) bob/C sad/C)",
+    "(+/B.ma city/C berlin/C)",
+    "(and/J (likes/P.so a/C b/C) (plays/P.so a/C c/C))",
+    "(gave/Pd.sox x/C y/C (to/T z/C))",
+    "(lives/Pd.sx x/C (in/T berlin/C))",
+    "(plays/Pd.so bob/Cp.s chess/Cc.o)",
+]
+
+# main edges and the variables of one annotated triplet of each
+ANNOTATED = [
+    (
+        "(likes/Pd.so mary/Cp.s astronomy/Cc.o)",
+        {"REL": "likes/Pd.so", "ARG1": "mary/Cp.s", "ARG2": "astronomy/Cc.o"},
+    ),
+    (
+        "((not/M is/P.sc) bob/C sad/C)",
+        {"REL": "(not/M is/P.sc)", "ARG1": "bob/C", "ARG2": "sad/C"},
+    ),
+    (
+        "(gave/Pd.sox x/C y/C (to/T z/C))",
+        {"REL": "gave/Pd.sox", "ARG1": "x/C", "ARG2": "y/C"},
+    ),
+    (
+        "(lives/Pd.sx x/C (in/T berlin/C))",
+        {"REL": "lives/Pd.sx", "ARG1": "x/C", "ARG2": "berlin/C"},
+    ),
+    (
+        "(plays/Pd.so bob/Cp.s chess/Cc.o)",
+        {"REL": "plays/Pd.so", "ARG1": "bob/Cp.s", "ARG2": "chess/Cc.o"},
+    ),
+]
+
+# words and the labels of each annotated triplet, in the LSOIE format
+LSOIE_SENTENCES = [
+    ("Adam loves Andi", [("A0", "P", "A1"), ("A1", "P", "A0")]),
+    ("Bob hates Carl", [("A0", "P", "A1")]),
+    # split into two sentences by the parser
+    ("Adam loves Andi and Bob hates Carl", [("A0", "P", "A1", "O", "O", "O", "O")]),
+    # no object
+    ("Dan sees Eve", [("A0", "P", "O")]),
+] + [(f"Ann sees Bob{i}", [("A0", "P", "A1")]) for i in range(12)]
+
+
+def write_lsoie(fn, sentences):
+    with open(fn, "w") as f:
+        for text, triplets in sentences:
+            for labels in triplets:
+                for i, (word, label) in enumerate(zip(text.split(), labels)):
+                    f.write("\t".join([str(i), word] + ["_"] * 5 + [label + "-B"]))
+                    f.write("\n")
+                f.write("\n")
+
+
+class StubParserClient(GraphbrainParserClient):
+    """
+    Parses sentences of three words into (w1/Pd.so w0/Cp.s w2/Cc.o), sentences with
+    "and" are split into two. Records the texts that were sent to the parser.
+    """
+
+    def __init__(self, parser_url=None, spacy_vocab_path=None):
+        self.url = parser_url
+        self.vocab_path = spacy_vocab_path
+        self.vocab = Vocab()
+        self.lock = threading.Lock()
+        self.texts = []
+
+    def _parse_words(self, words):
+        atoms = [
+            f"{words[0].lower()}/Cp.s",
+            f"{words[1].lower()}/Pd.so",
+            f"{words[2].lower()}/Cc.o",
+        ]
+        main_edge = f"({atoms[1]} {atoms[0]} {atoms[2]})"
+        return {
+            "spacy_sentence": Doc(self.vocab, words=words).to_json(),
+            "text": " ".join(words),
+            "failed": False,
+            "extra_edges": [],
+            "main_edge": main_edge,
+            "resolved_corefs": main_edge,
+            "word2atom": {str(i): atom for i, atom in enumerate(atoms)},
+        }
+
+    def parse_json(self, text):
+        with self.lock:
+            self.texts.append(text)
+        words = text.split()
+        if "and" in words:
+            i = words.index("and")
+            return [self._parse_words(words[:i]), self._parse_words(words[i + 1 :])]
+        return [self._parse_words(words)]
+
+
+def extract_words(extractions, graph, sen_idx, atom2word, patterns, max_extr):
+    """An extract_fn that extracts the roots of the main edge for each pattern."""
+    for _ in patterns[:max_extr]:
+        extractions.setdefault(sen_idx, []).append(
+            {"arg1": graph[1].root(), "rel": graph[0].root(), "arg2": graph[2].root()}
+        )
+
+
+def get_extractor():
+    # the graphs are stored directly, so no parser is needed
+    extractor = GraphbrainExtractor.__new__(GraphbrainExtractor)
+    Extractor.__init__(extractor)
+    extractor.parsed_graphs = {edge: {"main_edge": hedge(edge)} for edge in EDGES}
+    return extractor
+
+
+def test_candidate_sentences():
+    extractor = get_extractor()
+    for pattern in map(hedge, PATTERNS):
+        matched = {
+            sen
+            for sen, graph in extractor.parsed_graphs.items()
+            if len(extractor._match_rule(pattern, graph)) > 0
+        }
+        candidates = extractor.candidate_sentences(pattern)
+        assert matched <= candidates
+        assert extractor.preview_rule(pattern).keys() == matched
+
+    assert extractor.candidate_sentences(hedge(PATTERNS[2])) == {
+        "(likes/Pd.so mary/Cp.s astronomy/Cc.o)",
+        "(and/J (likes/P.so a/C b/C) (plays/P.so a/C c/C))",
+    }
+
+
+def test_classify_sentence():
+    extractor = get_extractor()
+
+    def check_view():
+        for sen, graph in extractor.parsed_graphs.items():
+            assert extractor.classify_sentence(sen) == extractor.classify(
+                graph["main_edge"]
+            )
+
+    extractor.set_patterns(PATTERNS[:4])
+    check_view()
+    # patterns are added to and removed from the materialized view
+    extractor.set_patterns(PATTERNS[2:])
+    check_view()
+    extractor.set_patterns(PATTERNS[::-1])
+    check_view()
+
+
+def test_extract_rules_in_parallel():
+    extractor = get_extractor()
+    text_to_triplets = {
+        edge: [(GraphbrainMappedTriplet((), (), variables=variables), True)]
+        for edge, variables in ANNOTATED
+    }
+    patterns = extractor.extract_rules(text_to_triplets)
+    assert len(patterns) > 0
+    # one sentence per shard, the counts are merged in the order of the sentences
+    parallel_patterns = extractor.extract_rules(
+        text_to_triplets, n_workers=2, chunk_size=1
+    )
+    assert parallel_patterns.most_common() == patterns.most_common()
+
+
+def read_jsonl(fn):
+    with open(fn) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_generate_triplets_and_gold_data(tmp_path):
+    input = str(tmp_path / "lsoie.tsv")
+    write_lsoie(input, LSOIE_SENTENCES)
+    extractor = get_extractor()
+    extractor.text_parser = StubParserClient()
+    extractor.set_patterns(PATTERNS[:3])
+
+    # the first block of each sentence
+    sen_ids = [0, 2, 3, 4] + list(range(5, 17))
+    extracted = []
+
+    def extract_fn(extractions, graph, sen_idx, atom2word, patterns, max_extr):
+        position = sen_ids.index(sen_idx)
+        # sentences are read lazily and parsed at most max_in_flight ahead
+        assert len(extractor.text_parser.texts) <= position + 3
+        extracted.append(sen_idx)
+        extract_words(extractions, graph, sen_idx, atom2word, patterns, max_extr)
+
+    extractor.generate_triplets_and_gold_data(
+        input, 2, n_parse_workers=2, max_in_flight=3, extract_fn=extract_fn
+    )
+    # each sentence is parsed once, the requests may finish in any order
+    assert sorted(extractor.text_parser.texts) == sorted(
+        text for text, _ in LSOIE_SENTENCES
+    )
+    assert extracted == [sen_idx for sen_idx in sen_ids if sen_idx != 3]
+
+    # sentences that were split or have triplets without objects are left out
+    gold = read_jsonl(str(tmp_path / "lsoie_gold.jsonl"))
+    assert [entry["id"] for entry in gold] == ["0", "2"] + [
+        str(i) for i in range(5, 17)
+    ]
+    assert gold[1] == {
+        "id": "2",
+        "sent": "Bob hates Carl",
+        "tokens": ["Bob", "hates", "Carl"],
+        "tuples": [
+            {
+                "arg1": {"words": ["Bob"], "words_indexes": [0]},
+                "rel": {"words": ["hates"], "words_indexes": [1]},
+                "arg2": {"words": ["Carl"], "words_indexes": [2]},
+                "arg3+": [],
+            }
+        ],
+    }
+    assert len(gold[0]["tuples"]) == 2
+
+    # the predictions of each sentence are combined
+    pred = read_jsonl(str(tmp_path / "lsoie_pred.jsonl"))
+    assert [entry["id"] for entry in pred] == ["0", "2", "4"] + [
+        str(i) for i in range(5, 17)
+    ]
+    assert pred[1] == {
+        "id": "2",
+        "tuples": [{"arg1": "bob", "rel": "hates", "arg2": "carl"}],
+    }
+
+    # the sentences are read from the gold data once it exists
+    extractor.text_parser = StubParserClient()
+    extracted = []
+    sen_ids = [entry["id"] for entry in gold]
+    extractor.generate_triplets_and_gold_data(
+        input, 2, n_parse_workers=2, max_in_flight=3, extract_fn=extract_fn
+    )
+    assert extracted == sen_ids
+    assert read_jsonl(str(tmp_path / "lsoie_gold.jsonl")) == gold
+    assert read_jsonl(str(tmp_path / "lsoie_pred.jsonl")) == [
+        entry for entry in pred if entry["id"] != "4"
+    ]
+
+
+def test_generate_triplets_and_gold_data_in_parallel(tmp_path, monkeypatch):
+    # worker processes create their own (stub) parser clients
+    monkeypatch.setattr(pc, "GraphbrainParserClient", StubParserClient)
+    outputs = []
+    for n_workers in (1, 2):
+        input = str(tmp_path / f"lsoie{n_workers}.tsv")
+        write_lsoie(input, LSOIE_SENTENCES)
+        extractor = get_extractor()
+        extractor.text_parser = StubParserClient()
+        extractor.set_patterns(PATTERNS[:3])
+        extractor.generate_triplets_and_gold_data(
+            input, 2, n_workers=n_workers, shard_size=3, extract_fn=extract_words
+        )
+        output = []
+        for suffix in ("_gold.jsonl", "_pred.jsonl"):
+            with open(str(tmp_path / f"lsoie{n_workers}{suffix}"), "rb") as f:
+                output.append(f.read())
+        outputs.append(output)
+
+    assert outputs[0] == outputs[1]
+    assert all(len(data) > 0 for data in outputs[0])
@@ -0,0 +1,39 @@
+import random
+from itertools import product
+
+from newpotato.extractors.graphbrain_parser import get_shortest_span
+
+
+def get_shortest_span_by_product(toks, to_disambiguate):
+    hyp_sets = []
+    for cand in product(*to_disambiguate):
+        hyp_toks = sorted(toks | set(cand))
+        hyp_sets.append((hyp_toks[-1] - hyp_toks[0], hyp_toks))
+    return tuple(sorted(hyp_sets)[0][1])
+
+
+def test_shortest_span():
+    # 20 ** 30 combinations
+    the_toks = [5 * i + 1 for i in range(20)]
+    assert get_shortest_span({50}, [the_toks] * 30) == (50, 51)
+
+    rng = random.Random(42)
+    for _ in range(1000):
+        n_toks = rng.randint(2, 20)
+        tok_ids = rng.sample(range(n_toks), n_toks)
+        n_unambiguous = rng.randint(0, 3)
+        toks = set(tok_ids[:n_unambiguous])
+        rest = tok_ids[n_unambiguous:]
+
+        # each atom string maps to a disjoint set of tokens and may occur repeatedly
+        to_disambiguate = []
+        while len(rest) >= 2 and len(to_disambiguate) < 5:
+            size = rng.randint(2, min(4, len(rest)))
+            cands, rest = sorted(rest[:size]), rest[size:]
+            to_disambiguate += [cands] * rng.randint(1, 3)
+        if not to_disambiguate:
+            continue
+
+        assert get_shortest_span(toks, to_disambiguate) == get_shortest_span_by_product(
+            toks, to_disambiguate
+        )
@@ -0,0 +1,69 @@
+import json
+
+from graphbrain import hedge
+from graphbrain.patterns import match_pattern
+
+from newpotato.modifications.pattern_compiler import compile_pattern
+
+PATTERNS = [
+    "(REL/P.{scx} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{sox} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{srx} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{sax} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{pcx} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{pox} ARG1/C ARG2 ARG3...)",
+    "(REL/P.{[sp][cora]x} ARG1/C ARG2 ARG3...)",
+    "(+/B.{ma} (ARG1/C...) (ARG2/C...))",
+    "(+/B.{mm} (ARG1/C...) (ARG2/C...))",
+    "(REL1/P.{sx}-oc ARG1/C (REL2/T ARG2))",
+    "(REL1/P.{px} ARG1/C (REL2/T ARG2))",
+    "(REL1/P.{sc} ARG1/C (REL3/B REL2/C ARG2/C))",
+    "(REL/P.so ARG1 ARG2)",
+    "(REL/Pd.{so}-x ARG1 ARG2)",
+    "(*/J ...)",
+    "(X ...)",
+    "(* * *)",
+    "(*/M X/C)",
+    "(atoms and/J */P)",
+    "(any (*/B ...) (REL/P.{s} ARG1))",
+    "*X",
+    ".",
+]
+
+
+def get_edges(edge):
+    yield edge
+    if edge.not_atom:
+        for subedge in edge:
+            yield from get_edges(subedge)
+
+
+def get_results(match, edge):
+    try:
+        return match(edge)
+    except AttributeError as err:
+        # graphbrain fails on some atoms, the compiled patterns should as well
+        return type(err)
+
+
+def test_pattern_compiler():
+    with open("data/opc_fixed_hitl.json") as f:
+        data = json.load(f)
+
+    patterns = PATTERNS + [rule["pattern"] for rule in data["extractor_data"]["rules"]]
+    edges = [
+        edge
+        for graph in data["parsed_graphs"].values()
+        for edge in get_edges(hedge(graph["main_edge"]))
+    ]
+
+    n_matches = 0
+    for pattern in patterns:
+        compiled = compile_pattern(pattern)
+        for edge in edges:
+            results = get_results(lambda e: match_pattern(e, pattern), edge)
+            assert get_results(compiled, edge) == results
+            if isinstance(results, list):
+                n_matches += len(results)
+
+    assert n_matches > 0
@@ -0,0 +1,66 @@
+from graphbrain import hedge
+from graphbrain.patterns import match_pattern
+
+from newpotato.modifications.pattern_index import (
+    PatternIndex,
+    PatternStats,
+    order_by_precision,
+)
+
+PATTERNS = [
+    "(REL/P.{sox} ARG1/C ARG2 ARG3...)\n",
+    "(REL/P.{so} ARG1/C ARG2)\n",
+    "(REL/P.{sc} ARG1/C ARG2)\n",
+    "(+/B.{ma} (ARG1/C...) (ARG2/C...))\n",
+    "(REL1/P.{sx}-oc ARG1/C (REL2/T ARG2))\n",
+    "(*/J ...)\n",
+    "(ARG1/C...)\n",
+]
+
+EDGES = [
+    "(likes/Pd.so mary/Cp.s astronomy/Cc.o)",
+    "((not/M is/P.sc) bob/C sad/C)",
+    "(+/B.ma city/C berlin/C)",
+    "(and/J (likes/P.so a/C b/C) (plays/P.so a/C c/C))",
+    "(gave/Pd.sox x/C y/C (to/T z/C))",
+    "(lives/Pd.sx x/C (in/T berlin/C))",
+]
+
+
+def get_matches(edge, patterns):
+    return [
+        (pattern, match)
+        for pattern in patterns
+        for match in match_pattern(edge, pattern)
+        if match != {}
+    ]
+
+
+def test_pattern_index():
+    index = PatternIndex(PATTERNS)
+    assert index.patterns == [hedge(pattern.strip()) for pattern in PATTERNS]
+
+    for edge_str in EDGES:
+        edge = hedge(edge_str)
+        patterns = index.get_patterns(edge)
+        assert len(patterns) < len(index)
+        assert get_matches(edge, patterns) == get_matches(edge, index.patterns)
+
+
+def test_order_by_precision():
+    patterns = [hedge(pattern.strip()) for pattern in PATTERNS[:4]]
+    assert order_by_precision(patterns, {}) == patterns
+
+    stats = {
+        patterns[0]: PatternStats(support=10, n_matches=10, n_correct=2),
+        patterns[1]: PatternStats(support=5, n_matches=20, n_correct=19),
+        # a single correct match is not enough to rank first
+        patterns[2]: PatternStats(support=1, n_matches=1, n_correct=1),
+        patterns[3]: PatternStats(support=8, n_matches=20, n_correct=19),
+    }
+    assert order_by_precision(patterns, stats) == [
+        patterns[3],
+        patterns[1],
+        patterns[2],
+        patterns[0],
+    ]
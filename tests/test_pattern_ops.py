@@ -0,0 +1,112 @@
+import json
+import random
+
+from graphbrain import hedge
+
+from newpotato.modifications.pattern_ops import (
+    all_variables,
+    apply_variable,
+    apply_variables,
+    _search_pairings,
+    atom_pattern_counts,
+    common_pattern,
+    common_pattern_argroles,
+)
+
+
+def apply_variables_one_by_one(edge, variables):
+    for var_name, var_edge in variables.items():
+        edge, found = apply_variable(edge, var_name, var_edge)
+        if not found:
+            return None
+    if len(variables) != len(all_variables(edge)):
+        return None
+    return edge
+
+
+def get_edges(edge):
+    yield edge
+    if edge.not_atom:
+        for subedge in edge:
+            yield from get_edges(subedge)
+
+
+def test_apply_variables():
+    edge = hedge("(likes/Pd.so mary/Cp.s (the/Md astronomy/Cc.s))")
+    variables = {
+        "REL": hedge("likes/Pd.so"),
+        "ARG0": hedge("mary/Cp.s"),
+        "ARG1": hedge("(the/Md astronomy/Cc.s)"),
+    }
+    assert apply_variables(edge, variables) == hedge(
+        "((var likes/Pd.so REL) (var mary/Cp.s ARG0) (var (the/Md astronomy/Cc.s) ARG1))"
+    )
+    assert apply_variables(edge, {**variables, "ARG2": hedge("bob/Cp.s")}) is None
+    # ARG1 replaces ARG2, which is applied before it inside the same subedge
+    assert apply_variables(edge, {"ARG2": hedge("astronomy/Cc.s"), **variables}) is None
+
+    with open("data/opc_fixed_hitl.json") as f:
+        data = json.load(f)
+
+    rng = random.Random(42)
+    n_applied = 0
+    for graph in data["parsed_graphs"].values():
+        main_edge = hedge(graph["main_edge"])
+        edges = list(get_edges(main_edge))
+        for _ in range(20):
+            variables = {}
+            for i in range(rng.randint(1, 6)):
+                if rng.random() < 0.1:
+                    variables[f"ARG{i}"] = rng.sample(edges, 2)
+                else:
+                    variables[f"ARG{i}"] = rng.choice(edges)
+            vedge = apply_variables(main_edge, variables)
+            assert vedge == apply_variables_one_by_one(main_edge, variables)
+            n_applied += vedge is not None
+
+    assert n_applied > 0
+
+
+def test_common_pattern():
+    edge1 = hedge("(likes/Pd.so (var mary/Cp.s ARG0) (the/Md astronomy/Cc.s))")
+    edge2 = hedge("(likes/Pd.os (the/Md physics/Cc.s) (var mary/Cp.s ARG0))")
+    assert common_pattern(edge1, edge2) == hedge(
+        "(likes/Pd.{so} (var mary/Cp.s ARG0) (the/Md */Cc.s))"
+    )
+
+    # the most specific pairing of arguments with the same role is found
+    edge1 = hedge("(gives/Pd.sxx mary/Cp.s (a/Md book/Cc.s) (to/T bob/Cp.s))")
+    edge2 = hedge("(gives/Pd.sxx mary/Cp.s (to/T bob/Cp.s) (a/Md pen/Cc.s))")
+    pattern = hedge("(gives/Pd.{sxx} mary/Cp.s (to/T bob/Cp.s) (a/Md */Cc.s))")
+    assert common_pattern(edge1, edge2) == pattern
+    assert common_pattern(edge1, edge2, budget=0) == pattern
+
+    # 12! pairings of arguments
+    args = [f"(the/Md thing{i}/Cc.s)" for i in range(12)]
+    edge1 = hedge(f"(has/Pd.{'x' * 12} {' '.join(args)})")
+    edge2 = hedge(f"(has/Pd.{'x' * 12} {' '.join(reversed(args))})")
+    assert atom_pattern_counts(common_pattern(edge1, edge2)) == atom_pattern_counts(
+        edge1
+    )
+
+
+def test_search_pairings_budget():
+    # the best candidate of the first slot is the only one of the second slot
+    slots = [("x", [(0, 2, 0), (0, 1, 0)]), ("x", [(0, 1, 0), None])]
+    assert list(_search_pairings(slots, budget=10)) == [(1, 0)]
+    assert list(_search_pairings(slots, budget=1)) == [(1, 0)]
+
+    # when a pairing is rejected, the next ones are still generated
+    slots = [("s", [(0, 2, 0), (0, 1, 0)]), ("o", [(0, 1, 0)])]
+    assert list(_search_pairings(slots, budget=10)) == [(0, 0), (1, 0)]
+    assert list(_search_pairings(slots, budget=1)) == [(0, 0), (1, 0)]
+
+    edge1 = hedge(
+        "(lives/Pd.sxx (var x/Cp.s ARG0) (in/T (var berlin/Cp.s ARG1)) (since/T 2000/C))"
+    )
+    edge2 = hedge(
+        "(works/Pd.sxx (var y/Cp.s ARG0) (since/T 1999/C) (in/T (var vienna/Cp.s ARG1)))"
+    )
+    pattern = common_pattern_argroles(edge1, edge2)
+    assert pattern is not None
+    assert common_pattern_argroles(edge1, edge2, budget=1) == pattern
@@ -0,0 +1,73 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from newpotato.evaluate.results_store import ResultsStore
+
+
+def get_result(n_patterns, max_extr, remark=""):
+    return {
+        "nr_of_patterns": n_patterns,
+        "max_nr_of_extractions": max_extr,
+        "results": {"shg": {"total": {"precision": 0.5, "recall": 0.25}}},
+        "remark": remark,
+    }
+
+
+def append_results(path, dataset, n_patterns):
+    store = ResultsStore(path, legacy_json=None)
+    for max_extr in range(1, 6):
+        store.append(dataset, [get_result(n_patterns, max_extr)])
+
+
+def test_results_store(tmp_path):
+    legacy_json = tmp_path / "evaluation_results.json"
+    legacy = {"a.tsv": [get_result(5, 1, "old"), get_result(10, 1)]}
+    legacy_json.write_text(json.dumps(legacy))
+
+    path = str(tmp_path / "results.db")
+    store = ResultsStore(path, legacy_json=str(legacy_json))
+    assert store.query() == legacy["a.tsv"]
+
+    # the results file is only imported into a new store
+    store = ResultsStore(path, legacy_json=str(legacy_json))
+    store.append("b.tsv", [get_result(5, 2), get_result(5, 3)])
+    store.append("a.tsv", [get_result(5, 1, "new")])
+    assert store.datasets() == ["a.tsv", "b.tsv"]
+    assert store.count() == 5
+    assert store.count(dataset="b.tsv") == 2
+    assert store.query(dataset="a.tsv", nr_of_patterns=5) == [
+        get_result(5, 1, "old"),
+        get_result(5, 1, "new"),
+    ]
+    assert store.query(max_nr_of_extractions=3) == [get_result(5, 3)]
+
+
+def test_parallel_appends(tmp_path):
+    path = str(tmp_path / "results.db")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(append_results, path, f"{i % 2}.tsv", i) for i in range(8)
+        ]
+        for future in futures:
+            future.result()
+
+    store = ResultsStore(path, legacy_json=None)
+    assert store.count() == 40
+    assert store.count(dataset="1.tsv", nr_of_patterns=3) == 5
+
+
+def test_invalid_legacy_results(tmp_path):
+    legacy_json = tmp_path / "evaluation_results.json"
+    legacy_json.write_text('{"a.tsv": [')
+
+    path = str(tmp_path / "results.db")
+    with pytest.raises(ValueError):
+        ResultsStore(path, legacy_json=str(legacy_json))
+
+    # the results are imported once the file is fixed
+    legacy = {"a.tsv": [get_result(5, 1)]}
+    legacy_json.write_text(json.dumps(legacy))
+    store = ResultsStore(path, legacy_json=str(legacy_json))
+    assert store.query(dataset="a.tsv") == legacy["a.tsv"]
@@ -0,0 +1,136 @@
+from graphbrain import hedge
+from graphbrain.patterns import match_pattern
+
+from newpotato.evaluate.sweep import select_extractions, sweep_predictions
+from newpotato.extractors.graphbrain_extractor_PC import (
+    combine_triplets,
+    extract_from_parse,
+)
+
+
+def entry(arg1, rel, arg2, rank, edge):
+    return {
+        "arg1": arg1,
+        "rel": rel,
+        "arg2": arg2,
+        "extractor": "shg",
+        "rank": rank,
+        "edge": edge,
+    }
+
+
+# ranked extractions by edge, then in the order of the cascade, which is not the
+# order by support
+RANKED = {
+    "0": [
+        entry("mary", "likes", "cats", 2, 0),
+        entry("mary", "likes", "dogs", 0, 0),
+        entry("bob", "runs", "home", 1, 1),
+    ],
+    "1": [entry("the city", "is", "big", 3, 0)],
+}
+
+
+def test_select_extractions():
+    entries = RANKED["0"]
+    assert select_extractions(entries, 1, 5) == [
+        {"arg1": "mary", "rel": "likes", "arg2": "dogs", "extractor": "shg"}
+    ]
+    assert [e["arg2"] for e in select_extractions(entries, 3, 5)] == [
+        "cats",
+        "dogs",
+        "home",
+    ]
+    # max_extr limits the extractions of each edge
+    assert [e["arg2"] for e in select_extractions(entries, 3, 1)] == ["cats", "home"]
+    assert [e["arg2"] for e in select_extractions(entries, 2, 1)] == ["dogs", "home"]
+    assert select_extractions(entries, 0, 5) == []
+
+
+def test_sweep_predictions():
+    grid = dict(sweep_predictions(RANKED, [4, 2], [1, 3]))
+    assert list(grid) == [(2, 1), (2, 3), (4, 1), (4, 3)]
+
+    assert grid[(2, 1)] == {
+        "0": [
+            {"arg1": "mary", "rel": "likes", "arg2": "dogs", "extractor": "shg"},
+            {"arg1": "bob", "rel": "runs", "arg2": "home", "extractor": "shg"},
+        ]
+    }
+    assert grid[(4, 3)] == {
+        sen_id: combine_triplets(select_extractions(entries, 4, 3))
+        for sen_id, entries in RANKED.items()
+    }
+    # arguments of the same predicate are combined
+    assert grid[(4, 3)]["0"][0]["arg3+"] == ["dogs"]
+
+
+def extract_matches(extractions, edge, sen_idx, atom2word, patterns, max_extr):
+    """
+    An extract_fn that matches the patterns on the edge, then on its subedges, and
+    keeps the first max_extr matches of each edge.
+    """
+    if edge.atom:
+        return
+    n_extr = 0
+    for pattern in patterns:
+        for match in match_pattern(edge, pattern):
+            if n_extr < max_extr:
+                extractions.setdefault(sen_idx, []).append(
+                    {
+                        "arg1": str(match["ARG1"]),
+                        "rel": str(edge[0]),
+                        "arg2": str(match["ARG2"]),
+                        "pattern": str(pattern),
+                    }
+                )
+                n_extr += 1
+    for subedge in edge:
+        extract_matches(extractions, subedge, sen_idx, atom2word, patterns, max_extr)
+
+
+def test_sweep_predictions_match_runs():
+    text = "Mary says that Bob likes cats and Ann likes dogs"
+    graphs = [
+        {
+            "text": text,
+            "main_edge": hedge(
+                "(says/Pd.sr mary/Cp.s (and/J (likes/Pd.so bob/Cp.s cats/Cc.o)"
+                " (likes/Pd.so ann/Cp.s dogs/Cc.o)))"
+            ),
+            "atom2word": {},
+        }
+    ]
+    # the cascade and the rank of each of its patterns, i.e. the order by support
+    cascade = [
+        hedge("(likes/P.{so} ARG1/C ARG2/C)"),
+        hedge("(REL/P.{sr} ARG1/C ARG2)"),
+        hedge("(REL/P ARG1/C ARG2)"),
+        hedge("(REL/P.{so} ARG1/C ARG2/C)"),
+    ]
+    ranks = [3, 0, 1, 2]
+    max_extrs = [1, 2, 3]
+
+    ranked, _ = extract_from_parse(
+        "0", text, graphs, cascade, max(max_extrs), ranks, extract_matches
+    )
+    grid = dict(sweep_predictions(ranked, range(1, 5), max_extrs))
+
+    for (n_patterns, max_extr), predictions in grid.items():
+        top_patterns = [p for p, rank in zip(cascade, ranks) if rank < n_patterns]
+        extractions, _ = extract_from_parse(
+            "0", text, graphs, top_patterns, max_extr, extract_fn=extract_matches
+        )
+        expected = {
+            sen_id: combine_triplets(entries) for sen_id, entries in extractions.items()
+        }
+        assert predictions == expected
+
+    # the patterns share the cap of each edge and are taken in the order of the
+    # cascade
+    assert [e["pattern"] for e in select_extractions(ranked["0"], 4, 1)] == [
+        str(cascade[1]),
+        str(cascade[0]),
+        str(cascade[0]),
+    ]
+    assert len(select_extractions(ranked["0"], 4, 2)) == 6
@@ -0,0 +1,151 @@
+import random
+
+import pytest
+
+from newpotato.evaluate.wire_functions import (
+    aggregate_scores_greedily,
+    eval_system,
+    f1,
+    sentence_match,
+    tuple_exact_match,
+    tuple_match,
+)
+
+WORDS = ["the", "city", "is", "big", "mary", "likes", "cats", "in", "of", "a"]
+
+
+def aggregate_scores_by_rescanning(scores):
+    matches = []
+    while True:
+        max_s = 0
+        gold, pred = None, None
+        for i in range(len(scores)):
+            if i in [m[0] for m in matches]:
+                continue
+            for j, pred_s in enumerate(scores[i]):
+                if j in [m[1] for m in matches]:
+                    continue
+                if pred_s and f1(*pred_s) > max_s:
+                    max_s = f1(*pred_s)
+                    gold, pred = i, j
+        if max_s == 0:
+            break
+        matches.append([gold, pred])
+    prec_scores = [scores[i][j][0] for i, j in matches]
+    rec_scores = [scores[i][j][1] for i, j in matches]
+    return {
+        "precision": [sum(prec_scores), len(scores[0])],
+        "recall": [sum(rec_scores), len(scores)],
+        "precision_of_matches": prec_scores,
+        "recall_of_matches": rec_scores,
+    }
+
+
+def sentence_match_by_pairs(gold, predicted):
+    exact = [[tuple_exact_match(pt, gt) for pt in predicted] for gt in gold]
+    scores = [[tuple_match(pt, gt) for pt in predicted] for gt in gold]
+    metrics = aggregate_scores_by_rescanning(scores)
+    metrics["exact_match_recall"] = [sum(any(row) for row in exact), len(exact)]
+    if len(exact[0]) == 0:
+        metrics["exact_match_precision"] = [0, 0]
+    else:
+        metrics["exact_match_precision"] = [
+            sum(any(row[j] for row in exact) for j in range(len(exact[0]))),
+            len(exact[0]),
+        ]
+    return metrics
+
+
+def get_gold_part(rng, n_min=1):
+    words = rng.choices(WORDS, k=rng.randint(n_min, 4))
+    indexes = [
+        "inf" if rng.random() < 0.15 else i for i, _ in enumerate(words, start=3)
+    ]
+    return {"words": words, "words_indexes": indexes}
+
+
+def get_gold_tuple(rng):
+    gt = {part: get_gold_part(rng) for part in ["arg1", "rel", "arg2"]}
+    gt["arg3+"] = [get_gold_part(rng) for _ in range(rng.choice([0, 0, 1, 2]))]
+    return gt
+
+
+def get_predicted_tuple(rng, gold):
+    # copy parts of a gold tuple, so that there are partial and exact matches
+    gt = rng.choice(gold)
+    t = {"extractor": "shg"}
+    for part in ["arg1", "rel", "arg2"]:
+        if rng.random() < 0.6:
+            t[part] = " ".join(gt[part]["words"])
+        else:
+            t[part] = " ".join(rng.choices(WORDS, k=rng.randint(0, 3)))
+    arg3 = [" ".join(a["words"]) for a in gt["arg3+"]]
+    if rng.random() < 0.3:
+        arg3.append(" ".join(rng.choices(WORDS, k=2)))
+    if arg3 and rng.random() < 0.8:
+        t["arg3+"] = arg3
+    return t
+
+
+def get_sentence_match(match, gold, predicted):
+    try:
+        return match(gold, predicted)
+    except ZeroDivisionError as err:
+        return type(err)
+
+
+def test_sentence_match():
+    rng = random.Random(42)
+    n_matches = 0
+    for _ in range(2000):
+        gold = [get_gold_tuple(rng) for _ in range(rng.randint(1, 5))]
+        predicted = [get_predicted_tuple(rng, gold) for _ in range(rng.randint(0, 6))]
+        metrics = get_sentence_match(sentence_match, gold, predicted)
+        assert metrics == get_sentence_match(sentence_match_by_pairs, gold, predicted)
+        if isinstance(metrics, dict):
+            n_matches += len(metrics["precision_of_matches"])
+
+    assert n_matches > 1000
+
+
+def test_aggregate_scores_greedily():
+    # ties are broken by the position of the pair
+    scores = [[[0.5, 0.5], [1.0, 0.5]], [[1.0, 0.5], False], [[0.5, 0.5], [0.2, 1]]]
+    assert aggregate_scores_greedily(scores) == aggregate_scores_by_rescanning(scores)
+
+
+def test_eval_system():
+    rng = random.Random(0)
+    gold, predictions = {}, {}
+    for s in range(200):
+        gold[s] = [get_gold_tuple(rng) for _ in range(rng.randint(1, 4))]
+        predictions[s] = [
+            get_predicted_tuple(rng, gold[s]) for _ in range(rng.randint(0, 4))
+        ]
+    # make sure that no tuple pair divides by zero
+    for s in gold:
+        for gt in gold[s]:
+            for part in ["arg1", "rel", "arg2"]:
+                gt[part]["words_indexes"] = list(range(len(gt[part]["words"])))
+        for t in predictions[s]:
+            for part in ["arg1", "rel", "arg2"]:
+                t[part] = t[part] or "the"
+
+    metrics, raw_match_scores = eval_system(gold, predictions)
+    assert metrics["matches"] == len(raw_match_scores[0]) > 0
+    assert 0 < metrics["precision"] <= 1
+    assert 0 < metrics["recall"] <= 1
+
+
+@pytest.mark.parametrize("n_pred", [0, 3])
+def test_sentence_match_no_matches(n_pred):
+    gold = [
+        {
+            "arg1": {"words": ["x"], "words_indexes": [0]},
+            "rel": {"words": ["y"], "words_indexes": [1]},
+            "arg2": {"words": ["z"], "words_indexes": [2]},
+            "arg3+": [],
+        }
+    ]
+    predicted = [{"arg1": "a", "rel": "b", "arg2": "c"}] * n_pred
+    assert sentence_match(gold, predicted) == sentence_match_by_pairs(gold, predicted)
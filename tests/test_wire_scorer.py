@@ -0,0 +1,102 @@
+import json
+import random
+
+import pytest
+
+from newpotato.evaluate.wire_functions import eval_system, split_tuples_by_extractor
+from newpotato.evaluate.wire_scorer import iter_sentence_pairs, score_files
+
+WORDS = ["the", "city", "is", "big", "mary", "likes", "cats", "in", "of", "a"]
+
+
+def get_gold_tuple(rng):
+    gt = {}
+    for part in ["arg1", "rel", "arg2"]:
+        words = rng.choices(WORDS, k=rng.randint(1, 3))
+        gt[part] = {"words": words, "words_indexes": list(range(len(words)))}
+    gt["arg3+"] = []
+    return gt
+
+
+def get_predicted_tuple(rng):
+    t = {
+        part: " ".join(rng.choices(WORDS, k=rng.randint(1, 3)))
+        for part in ["arg1", "rel", "arg2"]
+    }
+    t["extractor"] = rng.choice(["shg", "other"])
+    return t
+
+
+def write_jsonl(fn, tuples):
+    with open(fn, "w") as f:
+        for sen_id, sen_tuples in tuples.items():
+            f.write(json.dumps({"id": sen_id, "tuples": sen_tuples}) + "\n")
+
+
+@pytest.fixture
+def data(tmp_path):
+    rng = random.Random(0)
+    gold, predictions = {}, {}
+    for s in range(300):
+        gold[str(s)] = [get_gold_tuple(rng) for _ in range(rng.randint(1, 4))]
+    # predictions of sentences without gold tuples and gold sentences without
+    # predictions
+    for s in range(-3, 310):
+        if rng.random() < 0.8:
+            n_pred = rng.randint(1, 4)
+            predictions[str(s)] = [get_predicted_tuple(rng) for _ in range(n_pred)]
+    write_jsonl(tmp_path / "gold.jsonl", gold)
+    write_jsonl(tmp_path / "pred.jsonl", predictions)
+    return tmp_path, gold, predictions
+
+
+@pytest.mark.parametrize("n_workers,shard_size", [(1, 1000), (1, 7), (2, 13)])
+def test_score_files(data, n_workers, shard_size):
+    tmp_path, gold, predictions = data
+    predictions_by_OIE = split_tuples_by_extractor(gold.keys(), predictions)
+    expected = {e: eval_system(gold, predictions_by_OIE[e]) for e in ["other", "shg"]}
+
+    scores = score_files(
+        str(tmp_path / "gold.jsonl"),
+        str(tmp_path / "pred.jsonl"),
+        n_workers=n_workers,
+        shard_size=shard_size,
+        keep_raw_scores=True,
+    )
+    assert scores == expected
+
+    scores = score_files(str(tmp_path / "gold.jsonl"), str(tmp_path / "pred.jsonl"))
+    assert scores == {e: (metrics, None) for e, (metrics, _) in expected.items()}
+
+
+def test_iter_sentence_pairs_order(data):
+    tmp_path, gold, predictions = data
+    pairs = list(
+        iter_sentence_pairs(str(tmp_path / "gold.jsonl"), str(tmp_path / "pred.jsonl"))
+    )
+    assert [sen_id for sen_id, _, _ in pairs] == list(gold)
+    assert all(pred == predictions.get(sen_id, []) for sen_id, _, pred in pairs)
+
+    items = list(predictions.items())
+    items[5], items[50] = items[50], items[5]
+    write_jsonl(tmp_path / "shuffled.jsonl", dict(items))
+    with pytest.raises(ValueError):
+        list(
+            iter_sentence_pairs(
+                str(tmp_path / "gold.jsonl"), str(tmp_path / "shuffled.jsonl")
+            )
+        )
+
+
+def test_iter_sentence_pairs_json(tmp_path):
+    # the WiRe57 reference format and predictions by sentence id, in another order
+    gold = {"doc": [{"id": "s1", "tuples": ["g1"]}, {"id": "s2", "tuples": ["g2"]}]}
+    predictions = {"s2": ["p2"], "s3": ["p3"], "s1": ["p1"]}
+    for fn, data in (("gold.json", gold), ("pred.json", predictions)):
+        with open(tmp_path / fn, "w") as f:
+            json.dump(data, f)
+
+    pairs = iter_sentence_pairs(
+        str(tmp_path / "gold.json"), str(tmp_path / "pred.json")
+    )
+    assert list(pairs) == [("s1", ["g1"], ["p1"]), ("s2", ["g2"], ["p2"])]